@@ -0,0 +1,182 @@
+"""
+Batch planner: runs identical items once, groups the rest by provider,
+routed agent and shared context, fetches that context once per group and
+fans out only the final generation
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from app.agents.result_cache import ResultCache
+from app.agents.routing import normalize_topic
+from app.core.config import get_settings
+from app.core.deadline import deadline_scope
+from app.core.timing import timed_stage
+
+if TYPE_CHECKING:
+    from app.agents.orchestrator import AgentOrchestrator, RoutingDecision
+
+settings = get_settings()
+
+
+@dataclass
+class PlannedItem:
+    """A distinct request of the batch and the batch positions it answers"""
+    request: dict
+    provider: str
+    positions: List[int]
+    routing: Optional["RoutingDecision"] = None
+
+
+@dataclass
+class BatchGroup:
+    """Items with the same provider, routed agent and shared-context key"""
+    provider: str
+    agent_type: Any
+    context_key: str
+    items: List[PlannedItem] = field(default_factory=list)
+    shared_context: Optional[dict] = None
+
+
+class BatchPlanner:
+    """
+    Plans a batch instead of running process_request blindly per item.
+
+    - Identical items (same fields and provider) run once; their duplicates
+      get a copy of the result marked "deduplicated"
+    - Each distinct item is routed up front (keyword routing unless
+      smart_routing) and passed to the orchestrator with its decision
+    - Items are grouped by provider, routed agent and the agent's
+      shared_context_key(topic): the financial agent shares one market
+      snapshot per batch, the science agent one retrieval per topic
+    - Groups with several items fetch that context once
+      (agent.fetch_shared_context) and hand it to every generation; if the
+      fetch fails each item falls back to its own retrieval
+    - Every item runs on the orchestrator for its own llm_provider
+    """
+
+    def __init__(
+        self,
+        get_orchestrator: Callable[[str], "AgentOrchestrator"],
+        max_concurrent: int = 3,
+        smart_routing: Optional[bool] = None,
+        default_provider: Optional[str] = None
+    ):
+        self.get_orchestrator = get_orchestrator
+        self.max_concurrent = max_concurrent
+        self.smart_routing = settings.BATCH_SMART_ROUTING if smart_routing is None else smart_routing
+        self.default_provider = default_provider or settings.DEFAULT_LLM_PROVIDER
+        self.stats: Dict[str, int] = {}
+
+    def dedupe(self, requests: List[dict]) -> List[PlannedItem]:
+        """Distinct items in batch order, each with the positions it answers"""
+        items: Dict[str, PlannedItem] = {}
+        for position, request in enumerate(requests):
+            request = dict(request)
+            provider = request.pop("llm_provider", None) or self.default_provider
+            key = ResultCache.make_key(llm_provider=provider, **request)
+            item = items.get(key)
+            if item is None:
+                items[key] = PlannedItem(request=request, provider=provider, positions=[position])
+            else:
+                item.positions.append(position)
+        return list(items.values())
+
+    async def _route(self, item: PlannedItem):
+        """Routing decision for an item (None: the orchestrator routes it itself)"""
+        request = item.request
+        try:
+            item.routing = await self.get_orchestrator(item.provider)._route(
+                request["topic"],
+                request["platform"],
+                request.get("content_type"),
+                request.get("additional_context") or "",
+                self.smart_routing
+            )
+        except Exception as e:
+            print(f"Batch routing failed for '{request.get('topic')}': {e}")
+
+    def group(self, items: List[PlannedItem]) -> List[BatchGroup]:
+        """Groups by (provider, routed agent, shared-context key), in batch order"""
+        groups: Dict[Tuple[str, Any, str], BatchGroup] = {}
+        for item in items:
+            agent_type = item.routing.agent_type if item.routing is not None else None
+            agent = self.get_orchestrator(item.provider).agents.get(agent_type)
+            topic = item.request["topic"]
+            if agent is not None and hasattr(agent, "shared_context_key"):
+                context_key = agent.shared_context_key(topic)
+            else:
+                context_key = normalize_topic(topic)
+            key = (item.provider, agent_type, context_key)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = BatchGroup(item.provider, agent_type, context_key)
+            group.items.append(item)
+        return list(groups.values())
+
+    def _shares_context(self, group: BatchGroup) -> bool:
+        agent = self.get_orchestrator(group.provider).agents.get(group.agent_type)
+        return len(group.items) > 1 and agent is not None and hasattr(agent, "fetch_shared_context")
+
+    async def _fetch_shared_context(self, group: BatchGroup):
+        """Fetch the group's context once, within the tightest deadline of its items"""
+        orchestrator = self.get_orchestrator(group.provider)
+        agent = orchestrator.agents[group.agent_type]
+        deadlines = [
+            orchestrator._deadline_seconds(item.request.get("deadline_seconds")) for item in group.items
+        ]
+        deadlines = [seconds for seconds in deadlines if seconds]
+        try:
+            with deadline_scope(min(deadlines) if deadlines else None):
+                group.shared_context = await timed_stage(
+                    "shared_context", agent.fetch_shared_context(group.items[0].request["topic"])
+                )
+        except Exception as e:
+            print(f"Batch shared context failed for {group.agent_type}: {e}")
+
+    async def _generate(self, item: PlannedItem, group: BatchGroup, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            try:
+                return await self.get_orchestrator(item.provider).process_request(
+                    **item.request,
+                    smart_routing=self.smart_routing,
+                    routing=item.routing,
+                    shared_context=group.shared_context
+                )
+            except Exception as e:
+                return {"error": str(e), **item.request, "llm_provider": item.provider}
+
+    async def _run_group(self, group: BatchGroup, semaphore: asyncio.Semaphore) -> List[dict]:
+        if self._shares_context(group):
+            async with semaphore:
+                await self._fetch_shared_context(group)
+        return await asyncio.gather(*(self._generate(item, group, semaphore) for item in group.items))
+
+    async def run(self, requests: List[dict]) -> List[dict]:
+        """
+        Run the batch; results come back in the same order as the requests
+        (stats of the plan in self.stats)
+        """
+        items = self.dedupe(requests)
+        await asyncio.gather(*(self._route(item) for item in items))
+        groups = self.group(items)
+
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        group_results = await asyncio.gather(*(self._run_group(group, semaphore) for group in groups))
+
+        results: List[Optional[dict]] = [None] * len(requests)
+        for group, group_result in zip(groups, group_results):
+            for item, result in zip(group.items, group_result):
+                first, *duplicates = item.positions
+                results[first] = result
+                for position in duplicates:
+                    results[position] = {**result, "deduplicated": True}
+
+        self.stats = {
+            "items": len(requests),
+            "unique": len(items),
+            "deduplicated": len(requests) - len(items),
+            "groups": len(groups),
+            "shared_context_fetches": sum(group.shared_context is not None for group in groups),
+        }
+        return results
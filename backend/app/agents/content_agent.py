@@ -1,8 +1,10 @@
 """
 Agente para contenido general
 """
+from typing import Optional
 from app.services.llm_service import LLMService
-from app.core.prompts import build_content_prompt
+from app.core.prompts import build_content_prompt, get_max_tokens
+from app.core.timing import timed_stage
 
 
 class ContentAgent: 
@@ -13,7 +15,7 @@ class ContentAgent:
     def __init__(self, llm_provider:  str = "groq"):
         self.llm_service = LLMService(provider=llm_provider)
     
-    async def generate(
+    async def prepare(
         self,
         topic: str,
         platform:  str,
@@ -23,7 +25,7 @@ class ContentAgent:
         additional_context: str = "",
         **kwargs
     ) -> dict:
-        """Genera contenido general"""
+        """Construye el prompt y los metadatos del resultado, sin llamar al LLM"""
         
         prompt = build_content_prompt(
             topic=topic,
@@ -34,12 +36,42 @@ class ContentAgent:
             language=language
         )
         
-        content = await self.llm_service.generate(prompt)
-        
         return {
-            "content": content,
+            "prompt": prompt,
             "topic": topic,
             "platform":  platform,
             "audience": audience,
-            "language": language
-        }
\ No newline at end of file
+            "language": language,
+            "max_tokens": get_max_tokens(platform)
+        }
+    
+    async def generate(
+        self,
+        topic: str,
+        platform:  str,
+        audience: str,
+        language: str = "Spanish",
+        tone: str = "",
+        additional_context: str = "",
+        **kwargs
+    ) -> dict:
+        """Genera contenido general"""
+        
+        prepared = await timed_stage("prepare", self.prepare(
+            topic=topic,
+            platform=platform,
+            audience=audience,
+            language=language,
+            tone=tone,
+            additional_context=additional_context
+        ))
+        prompt = prepared.pop("prompt")
+        max_tokens = prepared.pop("max_tokens")
+        
+        content = await self.llm_service.generate(prompt, max_tokens=max_tokens)
+        
+        return {"content": content, **prepared}
+    
+    def stream(self, prompt: str, max_tokens: Optional[int] = None):
+        """Stream de tokens para un prompt ya preparado con prepare()"""
+        return self.llm_service.stream(prompt, max_tokens=max_tokens)
@@ -2,8 +2,13 @@
 Agente para contenido financiero con datos en tiempo real via MCP
 """
 import sys
+from typing import Any, Optional, Tuple
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from app.core.deadline import optional_stage
+from app.core.prompts import get_context_budget, get_max_tokens
+from app.core.timing import timed_stage
+from app.core.tokens import TokenBudgeter
 from app.services.llm_service import LLMService
 
 
@@ -41,15 +46,8 @@ Incluye siempre:  "Este contenido es informativo y no constituye asesoramiento f
     def __init__(self, llm_provider: str = "groq"):
         self.llm_service = LLMService(provider=llm_provider)
     
-    async def generate(
-        self,
-        topic: str,
-        platform:  str,
-        audience: str,
-        language: str = "Spanish",
-        **kwargs
-    ) -> dict:
-        """Genera contenido financiero conectando al servidor MCP"""
+    async def _fetch_market_data(self) -> Optional[Tuple[str, str]]:
+        """Resumen de mercado y noticias via MCP: (resumen crudo, noticias) o None"""
         
         # Configuración del servidor MCP (subproceso local)
         server_params = StdioServerParameters(
@@ -58,9 +56,6 @@ Incluye siempre:  "Este contenido es informativo y no constituye asesoramiento f
             env=None
         )
 
-        market_context_str = ""
-        market_summary_data = {}
-
         try:
             async with stdio_client(server_params) as (read, write):
                 async with ClientSession(read, write) as session:
@@ -75,14 +70,68 @@ Incluye siempre:  "Este contenido es informativo y no constituye asesoramiento f
                     # 2. Noticias (si aplica)
                     news_result = await session.call_tool("get_financial_news", arguments={"limit": 3})
                     news_data = news_result.content[0].text
-
-                    # Construir string de contexto (simulando lo que hacía el servicio antes)
-                    # Nota: El servidor MCP devuelve los dicts serializados, aquí los usamos para el prompt
-                    market_context_str = f"Market Summary: {market_summary_data}\n\nNews: {news_data}"
+                    return market_summary_data, news_data
 
         except Exception as e:
             print(f"Error MCP: {e}")
+            return None
+    
+    def _market_context(
+        self,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str,
+        market_data: Tuple[str, str]
+    ) -> Tuple[str, Any]:
+        """Contexto de mercado para el prompt a partir de los datos MCP: (contexto, resumen crudo)"""
+        market_summary_data, news_data = market_data
+        
+        # Construir string de contexto dentro del presupuesto de tokens de la plataforma
+        # Nota: El servidor MCP devuelve los dicts serializados, aquí los usamos para el prompt
+        budget = get_context_budget(
+            platform, self.FINANCIAL_PROMPT, topic, language, platform, audience
+        )
+        packed = TokenBudgeter(budget).pack({
+            "summary": [f"Market Summary: {market_summary_data}"],
+            "news": [f"News: {news_data}"]
+        })
+        return f"{packed['summary']}\n\n{packed['news']}", market_summary_data
+    
+    def shared_context_key(self, topic: str) -> str:
+        """El resumen de mercado no depende del tema: un lote lo comparte entero"""
+        return "market"
+    
+    async def fetch_shared_context(self, topic: str) -> dict:
+        """Datos de mercado (una sola llamada MCP) para varias peticiones de un lote"""
+        market_data = await optional_stage("mcp", self._fetch_market_data())
+        return {"market_data": market_data} if market_data is not None else {}
+    
+    async def prepare(
+        self,
+        topic: str,
+        platform:  str,
+        audience: str,
+        language: str = "Spanish",
+        shared_context: Optional[dict] = None,
+        **kwargs
+    ) -> dict:
+        """
+        Obtiene los datos de mercado via MCP y construye el prompt, sin llamar al LLM.
+        shared_context: datos ya obtenidos con fetch_shared_context() (lotes)
+        """
+        # Con datos compartidos (ya obtenidos dentro de su etapa "mcp") no se lanza MCP
+        market_data = (shared_context or {}).get("market_data")
+        if market_data is None:
+            # MCP es opcional: sin tiempo suficiente en el deadline se genera sin datos en vivo
+            market_data = await optional_stage("mcp", self._fetch_market_data())
+        if market_data is None:
             market_context_str = "No se pudieron obtener datos financieros en tiempo real via MCP."
+            market_summary_data = {}
+        else:
+            market_context_str, market_summary_data = self._market_context(
+                topic, platform, audience, language, market_data
+            )
 
         
         prompt = self.FINANCIAL_PROMPT.format(
@@ -93,12 +142,40 @@ Incluye siempre:  "Este contenido es informativo y no constituye asesoramiento f
             audience=audience
         )
         
-        content = await self.llm_service.generate(prompt)
-        
         return {
-            "content": content,
+            "prompt": prompt,
             "topic": topic,
             "platform": platform,
             "market_summary": market_summary_data, # Retornamos los datos crudos del MCP
-            "data_timestamp": "Real-time (MCP)"
+            "data_timestamp": "Real-time (MCP)",
+            "max_tokens": get_max_tokens(platform)
         }
+    
+    async def generate(
+        self,
+        topic: str,
+        platform:  str,
+        audience: str,
+        language: str = "Spanish",
+        shared_context: Optional[dict] = None,
+        **kwargs
+    ) -> dict:
+        """Genera contenido financiero conectando al servidor MCP"""
+        
+        prepared = await timed_stage("prepare", self.prepare(
+            topic=topic,
+            platform=platform,
+            audience=audience,
+            language=language,
+            shared_context=shared_context
+        ))
+        prompt = prepared.pop("prompt")
+        max_tokens = prepared.pop("max_tokens")
+        
+        content = await self.llm_service.generate(prompt, max_tokens=max_tokens)
+        
+        return {"content": content, **prepared}
+    
+    def stream(self, prompt: str, max_tokens: Optional[int] = None):
+        """Stream de tokens para un prompt ya preparado con prepare()"""
+        return self.llm_service.stream(prompt, max_tokens=max_tokens)
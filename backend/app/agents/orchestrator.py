@@ -9,20 +9,36 @@ Features:
 - Post-processing pipeline
 """
 from enum import Enum
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Awaitable, Callable, AsyncIterator, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 import asyncio
 import time
-import hashlib
 import json
 from functools import lru_cache
+from collections import OrderedDict
 
+from app.agents.batch_planner import BatchPlanner
 from app.agents.content_agent import ContentAgent
 from app.agents.financial_agent import FinancialAgent
 from app.agents.science_agent import ScienceAgent
+from app.agents.result_cache import ResultCache, TieredResultCache, get_shared_result_backend
+from app.agents.routing import CentroidRouter, KeywordMatcher, RoutingCache, normalize_topic
+from app.agents.semantic_cache import SemanticCache
+from app.core.config import get_settings
+from app.core.metrics import DROPPED_STAGES, REQUEST_LATENCY, REQUESTS, STAGE_LATENCY
+from app.core.singleflight import SingleFlight
+from app.core.timing import current_timings, stage, timed_stage, timing_scope
+from app.core.deadline import (
+    Deadline, DeadlineExceeded, current_deadline, deadline_scope, drop_stage, optional_stage,
+    remaining_time, replace_deadline, required_stage, stage_allowed
+)
+from app.rag.vector_store import get_embedding_model, is_embedding_model_loaded
 from app.services.image_service import ImageService
 from app.services.llm_service import LLMService
+from app.services.rate_limiter import RateLimitError
+
+settings = get_settings()
 
 
 class AgentType(str, Enum):
@@ -56,6 +72,8 @@ class OrchestrationResult:
     fallback_used: bool = False
     image_url: Optional[str] = None
     sources: Optional[List[dict]] = None
+    dropped_stages: List[str] = field(default_factory=list)
+    stage_timings_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
     metadata: Dict[str, Any] = field(default_factory=dict)
     
     def to_dict(self) -> dict:
@@ -71,6 +89,8 @@ class OrchestrationResult:
             "fallback_used": self.fallback_used,
             "image_url": self.image_url,
             "sources": self.sources,
+            "dropped_stages": self.dropped_stages,
+            "stage_timings_ms": self.stage_timings_ms,
             **self.metadata
         }
 
@@ -84,38 +104,6 @@ class RoutingDecision:
     alternative_agents: List[AgentType] = field(default_factory=list)
 
 
-class RequestCache:
-    """Simple in-memory cache for request results"""
-    
-    def __init__(self, max_size: int = 100, ttl_seconds: int = 3600):
-        self._cache: Dict[str, tuple] = {}  # hash -> (result, timestamp)
-        self.max_size = max_size
-        self.ttl_seconds = ttl_seconds
-    
-    def _hash_request(self, topic: str, platform: str, audience: str, language: str) -> str:
-        key = f"{topic}:{platform}:{audience}:{language}"
-        return hashlib.md5(key.encode()).hexdigest()
-    
-    def get(self, topic: str, platform: str, audience: str, language: str) -> Optional[dict]:
-        key = self._hash_request(topic, platform, audience, language)
-        if key in self._cache:
-            result, timestamp = self._cache[key]
-            if time.time() - timestamp < self.ttl_seconds:
-                return result
-            else:
-                del self._cache[key]
-        return None
-    
-    def set(self, topic: str, platform: str, audience: str, language: str, result: dict):
-        # Evict old entries if cache is full
-        if len(self._cache) >= self.max_size:
-            oldest_key = min(self._cache, key=lambda k: self._cache[k][1])
-            del self._cache[oldest_key]
-        
-        key = self._hash_request(topic, platform, audience, language)
-        self._cache[key] = (result, time.time())
-
-
 class OrchestrationMetrics:
     """Track orchestration metrics"""
     
@@ -127,9 +115,18 @@ class OrchestrationMetrics:
         self.cache_misses = 0
         self.errors = 0
         self.fallbacks_used = 0
+        self.coalesced = 0
+        self.deadline_exceeded = 0
+        self.dropped_stages: Dict[str, int] = {}
+        self.speculative_runs = 0
+        self.speculative_agreements = 0
+        self.speculation_saved_ms = 0.0
+        self.speculation_wasted_ms = 0.0
     
     def record_request(self, agent_type: AgentType, processing_time_ms: float, 
-                       cache_hit: bool = False, fallback: bool = False, error: bool = False):
+                       cache_hit: bool = False, fallback: bool = False, error: bool = False,
+                       dropped_stages: Optional[List[str]] = None, deadline_exceeded: bool = False,
+                       coalesced: bool = False):
         self.total_requests += 1
         self.agent_usage[agent_type.value] = self.agent_usage.get(agent_type.value, 0) + 1
         
@@ -147,8 +144,59 @@ class OrchestrationMetrics:
         if fallback:
             self.fallbacks_used += 1
         
+        if coalesced:
+            self.coalesced += 1
+        
         if error:
             self.errors += 1
+        
+        if deadline_exceeded:
+            self.deadline_exceeded += 1
+        
+        for stage in dropped_stages or []:
+            self.dropped_stages[stage] = self.dropped_stages.get(stage, 0) + 1
+            DROPPED_STAGES.inc(stage)
+        
+        # Process-wide histograms and counters (Prometheus endpoint)
+        if deadline_exceeded:
+            outcome = "deadline_exceeded"
+        elif error:
+            outcome = "error"
+        elif cache_hit:
+            outcome = "cache_hit"
+        elif coalesced:
+            outcome = "coalesced"
+        else:
+            outcome = "generated"
+        REQUEST_LATENCY.observe(processing_time_ms / 1000, agent_type.value, outcome)
+        REQUESTS.inc(agent_type.value, outcome)
+    
+    def record_speculation(self, agreed: bool, saved_ms: float = 0.0, wasted_ms: float = 0.0):
+        """Outcome of a speculative run: routing latency hidden, or agent work thrown away"""
+        self.speculative_runs += 1
+        if agreed:
+            self.speculative_agreements += 1
+        self.speculation_saved_ms += saved_ms
+        self.speculation_wasted_ms += wasted_ms
+    
+    @classmethod
+    def combine(cls, metrics: List["OrchestrationMetrics"]) -> "OrchestrationMetrics":
+        """Totals over several orchestrators (e.g. one per LLM provider)"""
+        combined = cls()
+        for m in metrics:
+            combined.total_requests += m.total_requests
+            combined.avg_processing_time_ms += m.avg_processing_time_ms * m.total_requests
+            for agent, count in m.agent_usage.items():
+                combined.agent_usage[agent] = combined.agent_usage.get(agent, 0) + count
+            for stage, count in m.dropped_stages.items():
+                combined.dropped_stages[stage] = combined.dropped_stages.get(stage, 0) + count
+            for name in (
+                "cache_hits", "cache_misses", "errors", "fallbacks_used", "coalesced", "deadline_exceeded",
+                "speculative_runs", "speculative_agreements", "speculation_saved_ms", "speculation_wasted_ms"
+            ):
+                setattr(combined, name, getattr(combined, name) + getattr(m, name))
+        combined.avg_processing_time_ms /= max(combined.total_requests, 1)
+        return combined
     
     def get_stats(self) -> dict:
         return {
@@ -157,7 +205,22 @@ class OrchestrationMetrics:
             "avg_processing_time_ms": round(self.avg_processing_time_ms, 2),
             "cache_hit_rate": round(self.cache_hits / max(self.total_requests, 1) * 100, 2),
             "error_rate": round(self.errors / max(self.total_requests, 1) * 100, 2),
-            "fallback_rate": round(self.fallbacks_used / max(self.total_requests, 1) * 100, 2)
+            "fallback_rate": round(self.fallbacks_used / max(self.total_requests, 1) * 100, 2),
+            "coalesced_rate": round(self.coalesced / max(self.total_requests, 1) * 100, 2),
+            "deadline_exceeded": self.deadline_exceeded,
+            "dropped_stages": self.dropped_stages,
+            # Process-wide p50/p95/p99 (the mean above hides the tail)
+            "latency": {
+                "requests": REQUEST_LATENCY.get_stats(),
+                "stages": STAGE_LATENCY.get_stats()
+            },
+            "speculation": {
+                "runs": self.speculative_runs,
+                "agreement_rate": round(self.speculative_agreements / max(self.speculative_runs, 1) * 100, 2),
+                "saved_ms_total": round(self.speculation_saved_ms, 2),
+                "avg_saved_ms": round(self.speculation_saved_ms / max(self.speculative_agreements, 1), 2),
+                "wasted_ms_total": round(self.speculation_wasted_ms, 2)
+            }
         }
 
 
@@ -167,9 +230,10 @@ class AgentOrchestrator:
     
     Features:
     - Smart LLM-based routing with confidence scores
+    - Speculative execution of the keyword-routed agent while the LLM routes
     - Keyword-based fallback routing
     - Agent chaining for complex requests
-    - Request caching
+    - Request caching, with concurrent identical requests coalesced
     - Metrics and monitoring
     - Retry logic with fallback agents
     - Post-processing pipeline
@@ -215,6 +279,14 @@ class AgentOrchestrator:
         )
     }
     
+    # Recent topic embeddings kept per orchestrator
+    TOPIC_VECTOR_CACHE_SIZE = 256
+    
+    # Keyword router compiled once from the capabilities above
+    KEYWORD_MATCHER = KeywordMatcher({
+        agent_type: capability.keywords for agent_type, capability in AGENT_CAPABILITIES.items()
+    })
+    
     ROUTING_PROMPT = """You are a request router for a content generation system. Analyze the user's topic and decide which specialized agent should handle it.
 
 Available agents:
@@ -234,10 +306,16 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         llm_provider: str = "groq",
         enable_smart_routing: bool = True,
         enable_caching: bool = True,
+        enable_semantic_cache: bool = True,
+        enable_speculative_routing: Optional[bool] = None,
         max_retries: int = 2
     ):
         self.llm_provider = llm_provider
         self.enable_smart_routing = enable_smart_routing
+        self.enable_speculative_routing = (
+            settings.SPECULATIVE_ROUTING_ENABLED if enable_speculative_routing is None
+            else enable_speculative_routing
+        )
         self.enable_caching = enable_caching
         self.max_retries = max_retries
         
@@ -251,9 +329,40 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         # LLM service for routing decisions
         self.router_llm = LLMService(provider=llm_provider)
         
+        # Shared embedding model (only used once another component loaded it)
+        encode = lambda text: get_embedding_model().encode(text)
+        
         # Cache and metrics
-        self.cache = RequestCache() if enable_caching else None
+        # Per-process L1 in front of the L2 shared by every worker
+        self.cache = TieredResultCache(
+            ResultCache(
+                max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+                ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+                compress=settings.RESULT_CACHE_COMPRESS,
+                early_refresh_beta=settings.RESULT_CACHE_EARLY_REFRESH_BETA
+            ),
+            l2=get_shared_result_backend()
+        ) if enable_caching else None
+        self.semantic_cache = SemanticCache(
+            embed=encode,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+        ) if enable_caching and enable_semantic_cache and settings.SEMANTIC_CACHE_ENABLED else None
+        # LLM routing decisions by normalized topic (shared by every request path)
+        self.routing_cache = RoutingCache() if enable_caching else None
+        # Local embedding router in front of the LLM router (learns from its decisions)
+        self.centroid_router = CentroidRouter(encode, seeds={
+            agent_type: [capability.description, *capability.keywords, *capability.strengths]
+            for agent_type, capability in self.AGENT_CAPABILITIES.items()
+        }) if enable_smart_routing and settings.CENTROID_ROUTING_ENABLED else None
+        # Recent topic embeddings (cache lookup, routing and learning share one encode)
+        self._topic_vectors: "OrderedDict[str, Any]" = OrderedDict()
         self.metrics = OrchestrationMetrics()
+        # In-flight requests by cache key (concurrent duplicates share the work)
+        self.inflight = SingleFlight()
+        # Deadline of each in-flight execution: the loosest of its waiters
+        self._flight_deadlines: Dict[str, Optional[Deadline]] = {}
         
         # Post-processing hooks
         self._post_processors: List[Callable] = []
@@ -262,6 +371,11 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         """Add a post-processing function to the pipeline"""
         self._post_processors.append(processor)
     
+    @staticmethod
+    def _deadline_seconds(deadline_seconds: Optional[float]) -> float:
+        """Request time budget: the one given or REQUEST_DEADLINE_SECONDS"""
+        return settings.REQUEST_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    
     async def _smart_route(self, topic: str, platform: str, context: str = "") -> RoutingDecision:
         """Use LLM to intelligently route the request"""
         try:
@@ -271,7 +385,7 @@ Respond with ONLY a JSON object (no markdown, no explanation):
                 context=context or "None provided"
             )
             
-            response = await self.router_llm.generate(prompt)
+            response = await self.router_llm.generate(prompt, call_type="routing", batchable=True)
             
             # Parse JSON response
             import re
@@ -286,25 +400,61 @@ Respond with ONLY a JSON object (no markdown, no explanation):
                     "CONTENT": AgentType.CONTENT
                 }.get(agent_str, AgentType.CONTENT)
                 
-                return RoutingDecision(
+                decision = RoutingDecision(
                     agent_type=agent_type,
                     confidence=float(data.get("confidence", 0.7)),
                     reason=data.get("reason", "LLM routing decision"),
                     alternative_agents=self._get_fallback_agents(agent_type)
                 )
+                await self._learn_route(topic, decision, context)
+                return decision
         except Exception as e:
             print(f"Smart routing failed: {e}, falling back to keyword routing")
         
         # Fallback to keyword routing
         return self._keyword_route(topic)
     
+    async def _learn_route(self, topic: str, decision: RoutingDecision, context: str = ""):
+        """Remember an LLM routing decision: routing cache and centroid update"""
+        if self.routing_cache is not None:
+            self.routing_cache.set(topic, decision, context)
+        # The centroids only know the topic: a decision driven by the context
+        # would pull them the wrong way
+        if self.centroid_router is not None and not context:
+            vector = await self._embed_topic(topic)
+            if vector is not None:
+                self.centroid_router.update(vector, decision.agent_type)
+    
+    async def _centroid_route(self, topic: str) -> Optional[RoutingDecision]:
+        """Local embedding routing, or None when unavailable or ambiguous"""
+        if self.centroid_router is None:
+            return None
+        vector = await self._embed_topic(topic)
+        if vector is None:
+            return None
+        try:
+            # The first call embeds the centroid seeds
+            match = await asyncio.to_thread(self.centroid_router.classify, vector)
+        except Exception as e:
+            print(f"Centroid routing failed: {e}")
+            return None
+        if match is None:
+            return None
+        agent_type, similarity, margin = match
+        return RoutingDecision(
+            agent_type=agent_type,
+            confidence=round(similarity, 3),
+            reason=f"Embedding centroid (similarity {similarity:.2f}, margin {margin:.2f})",
+            alternative_agents=self._get_fallback_agents(agent_type)
+        )
+    
     def _keyword_route(self, topic: str) -> RoutingDecision:
-        """Fallback keyword-based routing"""
-        topic_lower = topic.lower()
+        """Fallback keyword-based routing (word-boundary matching, weighted keywords)"""
+        matches = self.KEYWORD_MATCHER.scores(topic)
         
         scores = {}
         for agent_type, capability in self.AGENT_CAPABILITIES.items():
-            score = sum(1 for kw in capability.keywords if kw in topic_lower)
+            score = matches.get(agent_type, 0.0)
             # Apply priority bonus
             score += capability.priority * 0.1
             scores[agent_type] = score
@@ -316,8 +466,10 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         # Calculate confidence based on keyword matches
         confidence = min(best_score / 5.0, 1.0) if best_score > 0 else 0.5
         
-        if best_score == 0:
+        # No keyword at all: the priority bonus alone doesn't pick a specialist
+        if not matches:
             best_agent = AgentType.CONTENT
+            best_score = 0.0
             confidence = 0.6
         
         return RoutingDecision(
@@ -327,6 +479,111 @@ Respond with ONLY a JSON object (no markdown, no explanation):
             alternative_agents=self._get_fallback_agents(best_agent)
         )
     
+    async def _route(
+        self,
+        topic: str,
+        platform: str,
+        content_type: Optional[str] = None,
+        context: str = "",
+        smart_routing: Optional[bool] = None
+    ) -> RoutingDecision:
+        """Pick the agent: explicit content type, smart LLM routing or keywords"""
+        if smart_routing is None:
+            smart_routing = self.enable_smart_routing
+        if content_type:
+            # Explicit routing
+            try:
+                return RoutingDecision(
+                    agent_type=AgentType(content_type),
+                    confidence=1.0,
+                    reason="Explicit content type specified",
+                    alternative_agents=self._get_fallback_agents(AgentType(content_type))
+                )
+            except ValueError:
+                return await self._smart_route_within_deadline(topic, platform, context)
+        elif smart_routing:
+            # Smart LLM-based routing
+            return await self._smart_route_within_deadline(topic, platform, context)
+        # Keyword-based routing
+        return self._keyword_route(topic)
+    
+    async def _smart_route_within_deadline(self, topic: str, platform: str, context: str = "") -> RoutingDecision:
+        """Smart routing is optional: keyword routing when the request deadline runs low"""
+        if self.routing_cache is not None:
+            cached = self.routing_cache.get(topic, context)
+            if cached is not None:
+                return cached
+        # Confident local decision: no LLM round trip (context only steers the LLM)
+        if not context:
+            routing = await self._centroid_route(topic)
+            if routing is not None:
+                return routing
+        routing = await optional_stage("smart_routing", self._smart_route(topic, platform, context))
+        return routing or self._keyword_route(topic)
+    
+    async def _route_and_run(
+        self,
+        topic: str,
+        platform: str,
+        content_type: Optional[str],
+        context: str,
+        run: Callable[[RoutingDecision], Awaitable[Any]],
+        smart_routing: Optional[bool] = None,
+        routing: Optional[RoutingDecision] = None
+    ) -> Tuple[RoutingDecision, Any]:
+        """
+        Route the request and run the agent work for the chosen route.
+        
+        In speculative mode the keyword-routed agent starts right away while
+        the LLM router decides: if both agree the routing round trip is hidden
+        behind the agent's work, otherwise the speculative run is cancelled
+        and restarted with the LLM's choice.
+        
+        Timed as the "routing" and "agent" stages (the speculative run is
+        "speculative_agent", whether it is kept or not). A routing decision
+        made beforehand (batch planner) skips routing.
+        """
+        if routing is not None:
+            return routing, await timed_stage("agent", run(routing))
+        smart_routing = self.enable_smart_routing if smart_routing is None else smart_routing
+        # A cached routing decision is instant: nothing to speculate on
+        routing_cached = (
+            self.routing_cache is not None
+            and RoutingCache.make_key(topic, context) in self.routing_cache
+        )
+        if content_type or routing_cached or not (smart_routing and self.enable_speculative_routing):
+            routing = await timed_stage(
+                "routing", self._route(topic, platform, content_type, context, smart_routing)
+            )
+            return routing, await timed_stage("agent", run(routing))
+        
+        guess = self._keyword_route(topic)
+        started = time.monotonic()
+        speculative = asyncio.ensure_future(timed_stage("speculative_agent", run(guess)))
+        try:
+            routing = await timed_stage(
+                "routing", self._smart_route_within_deadline(topic, platform, context)
+            )
+        except BaseException:
+            speculative.cancel()
+            raise
+        routing_ms = (time.monotonic() - started) * 1000
+        
+        if routing.agent_type == guess.agent_type:
+            result = await speculative
+            agent_ms = (time.monotonic() - started) * 1000
+            # Without speculation the agent would have started after routing
+            self.metrics.record_speculation(agreed=True, saved_ms=min(routing_ms, agent_ms))
+            return routing, result
+        
+        if speculative.done():
+            if not speculative.cancelled():
+                speculative.exception()  # Already finished: just mark it as retrieved
+        else:
+            speculative.cancel()
+        self.metrics.record_speculation(agreed=False, wasted_ms=routing_ms)
+        return routing, await timed_stage("agent", run(routing))
+    
     def _get_fallback_agents(self, primary: AgentType) -> List[AgentType]:
         """Get ordered list of fallback agents"""
         all_agents = [AgentType.CONTENT, AgentType.FINANCIAL, AgentType.SCIENCE]
@@ -350,17 +607,21 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         for i, current_agent_type in enumerate(agents_to_try):
             try:
                 agent = self.agents[current_agent_type]
-                result = await agent.generate(
+                result = await required_stage("generation", agent.generate(
                     topic=topic,
                     platform=platform,
                     audience=audience,
                     language=language,
                     **kwargs
-                )
+                ))
                 
                 fallback_used = i > 0
                 return result, current_agent_type, fallback_used
                 
+            except (RateLimitError, DeadlineExceeded):
+                # Fallback agents share the same provider budget (and the same
+                # deadline): don't hammer it
+                raise
             except Exception as e:
                 last_error = e
                 print(f"Agent {current_agent_type.value} failed: {e}")
@@ -391,6 +652,52 @@ Respond with ONLY a JSON object (no markdown, no explanation):
             print(f"Image generation failed: {e}")
             return None
     
+    def _start_image(self, topic: str, platform: str) -> Optional[asyncio.Task]:
+        """
+        Start the image as soon as the request arrives: it only depends on
+        topic and platform, so it runs alongside routing and the agent
+        """
+        if not stage_allowed("image", reserve=False):
+            return None
+        return asyncio.create_task(optional_stage(
+            "image", self._generate_image_async(topic, platform), reserve=False
+        ))
+    
+    async def _join_image(self, image_task: Optional[asyncio.Task]) -> Tuple[Optional[str], bool]:
+        """
+        Wait for the image once the content is ready, at most
+        IMAGE_JOIN_TIMEOUT_SECONDS more: a slow image is dropped instead of
+        holding back the text. Returns (image URL, dropped)
+        """
+        if image_task is None:
+            return None, False
+        done, _ = await asyncio.wait(
+            {image_task}, timeout=remaining_time(settings.IMAGE_JOIN_TIMEOUT_SECONDS)
+        )
+        if not done:
+            image_task.cancel()
+            drop_stage("image")
+            return None, True
+        return image_task.result(), False
+    
+    @staticmethod
+    def _dropped_stages(image_dropped: bool = False) -> List[str]:
+        """
+        Optional stages dropped in this request: the deadline's, plus the
+        image when its join timeout ran out (also without a deadline)
+        """
+        deadline = current_deadline()
+        dropped = list(deadline.dropped) if deadline else []
+        if image_dropped and "image" not in dropped:
+            dropped.append("image")
+        return dropped
+    
+    @staticmethod
+    def _stage_timings() -> Dict[str, Dict[str, float]]:
+        """Stages timed so far in this request (see app.core.timing)"""
+        timings = current_timings()
+        return timings.to_dict() if timings is not None else {}
+    
     def _run_post_processors(self, result: dict) -> dict:
         """Run all post-processing hooks"""
         for processor in self._post_processors:
@@ -400,6 +707,198 @@ Respond with ONLY a JSON object (no markdown, no explanation):
                 print(f"Post-processor failed: {e}")
         return result
     
+    async def _embed_topic(self, topic: str):
+        """
+        Unit-length topic embedding for the semantic cache and the centroid
+        router, or None when unavailable. Only uses the embedding model if
+        another component already loaded it.
+        """
+        embedder = self.semantic_cache or self.centroid_router
+        if embedder is None or not is_embedding_model_loaded():
+            return None
+        vector = self._topic_vectors.get(topic)
+        if vector is not None:
+            self._topic_vectors.move_to_end(topic)
+            return vector
+        try:
+            vector = await asyncio.to_thread(embedder.embed, topic)
+        except Exception as e:
+            print(f"Topic embedding failed: {e}")
+            return None
+        self._topic_vectors[topic] = vector
+        if len(self._topic_vectors) > self.TOPIC_VECTOR_CACHE_SIZE:
+            self._topic_vectors.popitem(last=False)
+        return vector
+    
+    def _cache_key(
+        self,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str,
+        content_type: Optional[str],
+        generate_image: bool,
+        **kwargs
+    ) -> str:
+        """
+        Exact cache key over every field that changes the generated content
+        (the topic in canonical form, so trivial spelling variants hit)
+        """
+        return ResultCache.make_key(
+            topic=normalize_topic(topic),
+            platform=platform,
+            audience=audience,
+            language=language,
+            content_type=content_type,
+            llm_provider=self.llm_provider,
+            generate_image=generate_image,
+            **kwargs
+        )
+    
+    def _cache_scope(
+        self,
+        platform: str,
+        audience: str,
+        language: str,
+        content_type: Optional[str],
+        generate_image: bool,
+        **kwargs
+    ) -> str:
+        """
+        Every field of the exact cache key except the topic: semantic matches
+        are only reused within the same scope (tone, context, content type...)
+        """
+        return ResultCache.make_key(
+            platform=platform,
+            audience=audience,
+            language=language,
+            content_type=content_type,
+            llm_provider=self.llm_provider,
+            generate_image=generate_image,
+            **kwargs
+        )
+    
+    async def _cache_lookup(
+        self, key: str, scope: str, topic: str
+    ) -> Tuple[Optional[dict], Any]:
+        """Exact cache first, then semantic cache. Returns (cached result, topic embedding)"""
+        cached = await self.cache.get(key)
+        if cached:
+            return cached, None
+        
+        vector = await self._embed_topic(topic)
+        if vector is None:
+            return None, None
+        if self.semantic_cache is None:
+            # Embedded for the centroid router only
+            return None, vector
+        match = self.semantic_cache.get(vector, scope)
+        if match is None:
+            return None, vector
+        return {
+            **match.result,
+            "semantic_match": {"topic": match.topic, "similarity": match.similarity}
+        }, vector
+    
+    async def _cache_store(self, key: str, scope: str, topic: str, result: dict, vector=None):
+        """Store a fresh result in the exact and semantic caches"""
+        await self.cache.set(key, result, compute_seconds=result.get("processing_time_ms", 0) / 1000)
+        if self.semantic_cache is None:
+            return
+        if vector is None:
+            vector = await self._embed_topic(topic)
+        if vector is not None:
+            self.semantic_cache.set(vector, topic, scope, result)
+    
+    async def _generate_result(
+        self,
+        cache_key: str,
+        cache_scope: str,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str,
+        content_type: Optional[str],
+        generate_image: bool,
+        start_time: float,
+        topic_vector=None,
+        smart_routing: Optional[bool] = None,
+        routing: Optional[RoutingDecision] = None,
+        **kwargs
+    ) -> dict:
+        """Route, run the agent and the image concurrently, then cache and record the fresh result"""
+        # Image runs concurrently with routing and the agent (optional: dropped
+        # if the deadline or the join timeout runs out)
+        image_task = self._start_image(topic, platform) if generate_image else None
+        try:
+            # Route the request and execute the agent with retry logic
+            # (speculatively overlapped with LLM routing when enabled)
+            routing, (agent_result, actual_agent, fallback_used) = await self._route_and_run(
+                topic,
+                platform,
+                content_type,
+                kwargs.get("additional_context", ""),
+                lambda decision: self._execute_with_retry(
+                    agent_type=decision.agent_type,
+                    topic=topic,
+                    platform=platform,
+                    audience=audience,
+                    language=language,
+                    fallback_agents=decision.alternative_agents,
+                    **kwargs
+                ),
+                smart_routing=smart_routing,
+                routing=routing
+            )
+            image_url, image_dropped = await self._join_image(image_task)
+        finally:
+            if image_task and not image_task.done():
+                image_task.cancel()
+        dropped_stages = self._dropped_stages(image_dropped)
+        
+        # Build result
+        processing_time = (time.time() - start_time) * 1000
+        
+        result = OrchestrationResult(
+            content=agent_result.get("content", ""),
+            agent_used=actual_agent,
+            agent_description=self.agents[actual_agent].description,
+            topic=topic,
+            platform=platform,
+            confidence_score=routing.confidence,
+            processing_time_ms=processing_time,
+            routing_reason=routing.reason,
+            fallback_used=fallback_used,
+            image_url=image_url,
+            sources=agent_result.get("sources"),
+            dropped_stages=dropped_stages,
+            stage_timings_ms=self._stage_timings(),
+            metadata={
+                k: v for k, v in agent_result.items() 
+                if k not in ["content", "sources"]
+            }
+        )
+        
+        result_dict = result.to_dict()
+        
+        # Run post-processors
+        result_dict = self._run_post_processors(result_dict)
+        
+        # Cache result (degraded results are not cached)
+        if self.enable_caching and self.cache is not None and not dropped_stages:
+            await self._cache_store(cache_key, cache_scope, topic, result_dict, topic_vector)
+        
+        # Record metrics
+        self.metrics.record_request(
+            actual_agent,
+            processing_time,
+            cache_hit=False,
+            fallback=fallback_used,
+            dropped_stages=dropped_stages
+        )
+        
+        return result_dict
+    
     async def process_request(
         self,
         topic: str,
@@ -409,6 +908,10 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         content_type: Optional[str] = None,
         use_cache: bool = True,
         generate_image: bool = True,
+        deadline_seconds: Optional[float] = None,
+        smart_routing: Optional[bool] = None,
+        routing: Optional[RoutingDecision] = None,
+        shared_context: Optional[dict] = None,
         **kwargs
     ) -> dict:
         """
@@ -422,18 +925,142 @@ Respond with ONLY a JSON object (no markdown, no explanation):
             content_type: Explicit agent type (overrides routing)
             use_cache: Whether to use cached results
             generate_image: Whether to generate an image
+            deadline_seconds: Time budget for the whole request (defaults to
+                REQUEST_DEADLINE_SECONDS; 0 disables it). Optional stages that
+                don't fit are skipped and reported in "dropped_stages"
+            smart_routing: Override LLM routing for this request (False uses
+                the compiled keyword router)
+            routing: Routing decision already made for this request (skips routing)
+            shared_context: Context the agent would otherwise fetch itself,
+                fetched once for several requests (see BatchPlanner). Not part
+                of the cache key: it doesn't change what is asked for
             **kwargs: Additional arguments passed to agents
             
         Returns:
             Dict with generated content and metadata
         """
         start_time = time.time()
-        fallback_used = False
+        topic_vector = None
+        cache_key = self._cache_key(topic, platform, audience, language, content_type, generate_image, **kwargs)
+        cache_scope = self._cache_scope(platform, audience, language, content_type, generate_image, **kwargs)
         
+        with deadline_scope(self._deadline_seconds(deadline_seconds)) as deadline, \
+                timing_scope(start_time) as timings:
+            try:
+                # Check cache first (exact, then semantically similar topics)
+                if self.enable_caching and use_cache and self.cache is not None:
+                    with stage("cache_lookup"):
+                        cached, topic_vector = await self._cache_lookup(cache_key, cache_scope, topic)
+                    if cached:
+                        processing_time = (time.time() - start_time) * 1000
+                        self.metrics.record_request(
+                            AgentType(cached.get("agent_used", "content")),
+                            processing_time,
+                            cache_hit=True
+                        )
+                        cached["from_cache"] = True
+                        cached["processing_time_ms"] = processing_time
+                        cached["stage_timings_ms"] = timings.to_dict()
+                        return cached
+                
+                # Identical concurrent requests share one execution (single-flight):
+                # followers await the leader's task instead of repeating the work,
+                # and a cancelled follower doesn't cancel it. The shared work runs
+                # with the loosest deadline of its waiters (each one still stops
+                # waiting at its own deadline)
+                leader = False
+                flight_deadline = self._flight_deadlines.get(cache_key)
+                if flight_deadline is not None:
+                    flight_deadline.extend(deadline)
+                
+                def generate() -> Awaitable[dict]:
+                    nonlocal leader
+                    leader = True
+                    agent_kwargs = kwargs if shared_context is None else {**kwargs, "shared_context": shared_context}
+                    # Registered now, not when the task starts, so no follower misses it
+                    flight_deadline = deadline.fork() if deadline is not None else None
+                    self._flight_deadlines[cache_key] = flight_deadline
+                    return self._run_shared(cache_key, flight_deadline, lambda: self._generate_result(
+                        cache_key, cache_scope, topic, platform, audience, language, content_type,
+                        generate_image, start_time, topic_vector, smart_routing, routing, **agent_kwargs
+                    ))
+                
+                wait_started_ms = (time.time() - timings.start_time) * 1000
+                result_dict = await required_stage("generation", self.inflight.do(cache_key, generate))
+                if leader:
+                    return dict(result_dict)
+                timings.record("coalesced_wait", round(wait_started_ms, 1))
+                
+                processing_time = (time.time() - start_time) * 1000
+                self.metrics.record_request(
+                    AgentType(result_dict.get("agent_used", "content")),
+                    processing_time,
+                    coalesced=True
+                )
+                # Timings of this request (its lookup and the wait), not the leader's
+                return {
+                    **result_dict,
+                    "coalesced": True,
+                    "processing_time_ms": processing_time,
+                    "stage_timings_ms": timings.to_dict()
+                }
+                
+            except Exception as e:
+                processing_time = (time.time() - start_time) * 1000
+                self.metrics.record_request(
+                    AgentType.CONTENT,
+                    processing_time,
+                    error=True,
+                    deadline_exceeded=isinstance(e, DeadlineExceeded)
+                )
+                raise
+    
+    async def _run_shared(
+        self, cache_key: str, flight_deadline: Optional[Deadline], work: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        """
+        Single-flight execution under its own copy of the leader's deadline,
+        which followers extend to theirs (see process_request)
+        """
         try:
-            # Check cache first
-            if self.enable_caching and use_cache and self.cache:
-                cached = self.cache.get(topic, platform, audience, language)
+            with replace_deadline(flight_deadline):
+                return await work()
+        finally:
+            if self._flight_deadlines.get(cache_key) is flight_deadline:
+                del self._flight_deadlines[cache_key]
+    
+    async def stream_request(
+        self,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str = "Spanish",
+        content_type: Optional[str] = None,
+        use_cache: bool = True,
+        generate_image: bool = True,
+        deadline_seconds: Optional[float] = None,
+        **kwargs
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Process a content generation request, yielding events as they happen
+        
+        Same arguments as process_request(). Yields (event, data) tuples:
+        - "routing": agent chosen, confidence and reason
+        - "sources": sources retrieved by the agent (may be empty)
+        - "token": a content delta from the LLM
+        - "image": generated image URL
+        - "result": final result dict (same shape as process_request())
+        """
+        start_time = time.time()
+        topic_vector = None
+        cache_key = self._cache_key(topic, platform, audience, language, content_type, generate_image, **kwargs)
+        cache_scope = self._cache_scope(platform, audience, language, content_type, generate_image, **kwargs)
+        
+        with deadline_scope(self._deadline_seconds(deadline_seconds)) as deadline, \
+                timing_scope(start_time) as timings:
+            if self.enable_caching and use_cache and self.cache is not None:
+                with stage("cache_lookup"):
+                    cached, topic_vector = await self._cache_lookup(cache_key, cache_scope, topic)
                 if cached:
                     processing_time = (time.time() - start_time) * 1000
                     self.metrics.record_request(
@@ -443,118 +1070,121 @@ Respond with ONLY a JSON object (no markdown, no explanation):
                     )
                     cached["from_cache"] = True
                     cached["processing_time_ms"] = processing_time
-                    return cached
+                    yield "routing", {
+                        "agent_used": cached.get("agent_used"),
+                        "confidence_score": cached.get("confidence_score"),
+                        "routing_reason": cached.get("routing_reason")
+                    }
+                    yield "sources", {"sources": cached.get("sources") or []}
+                    yield "token", {"delta": cached.get("content", "")}
+                    yield "image", {"image_url": cached.get("image_url")}
+                    yield "result", cached
+                    return
             
-            # Route the request
-            if content_type:
-                # Explicit routing
-                try:
-                    routing = RoutingDecision(
-                        agent_type=AgentType(content_type),
-                        confidence=1.0,
-                        reason="Explicit content type specified",
-                        alternative_agents=self._get_fallback_agents(AgentType(content_type))
-                    )
-                except ValueError:
-                    routing = await self._smart_route(topic, platform, kwargs.get("additional_context", ""))
-            elif self.enable_smart_routing:
-                # Smart LLM-based routing
-                routing = await self._smart_route(topic, platform, kwargs.get("additional_context", ""))
-            else:
-                # Keyword-based routing
-                routing = self._keyword_route(topic)
-            
-            # Execute agent with retry logic
-            agent_result, actual_agent, fallback_used = await self._execute_with_retry(
-                agent_type=routing.agent_type,
-                topic=topic,
-                platform=platform,
-                audience=audience,
-                language=language,
-                fallback_agents=routing.alternative_agents,
-                **kwargs
-            )
-            
-            # Generate image in parallel (if enabled)
-            image_url = None
-            if generate_image:
-                image_url = await self._generate_image_async(topic, platform)
-            
-            # Build result
-            processing_time = (time.time() - start_time) * 1000
-            
-            result = OrchestrationResult(
-                content=agent_result.get("content", ""),
-                agent_used=actual_agent,
-                agent_description=self.agents[actual_agent].description,
-                topic=topic,
-                platform=platform,
-                confidence_score=routing.confidence,
-                processing_time_ms=processing_time,
-                routing_reason=routing.reason,
-                fallback_used=fallback_used,
-                image_url=image_url,
-                sources=agent_result.get("sources"),
-                metadata={
-                    k: v for k, v in agent_result.items() 
-                    if k not in ["content", "sources"]
+            # The image only depends on topic and platform: fetch it while routing and tokens stream
+            image_task = self._start_image(topic, platform) if generate_image else None
+            try:
+                routing = await timed_stage(
+                    "routing", self._route(topic, platform, content_type, kwargs.get("additional_context", ""))
+                )
+                yield "routing", {
+                    "agent_used": routing.agent_type.value,
+                    "confidence_score": routing.confidence,
+                    "routing_reason": routing.reason
                 }
-            )
-            
-            result_dict = result.to_dict()
-            
-            # Run post-processors
-            result_dict = self._run_post_processors(result_dict)
-            
-            # Cache result
-            if self.enable_caching and self.cache:
-                self.cache.set(topic, platform, audience, language, result_dict)
-            
-            # Record metrics
-            self.metrics.record_request(
-                actual_agent,
-                processing_time,
-                cache_hit=False,
-                fallback=fallback_used
-            )
-            
-            return result_dict
-            
-        except Exception as e:
-            processing_time = (time.time() - start_time) * 1000
-            self.metrics.record_request(
-                AgentType.CONTENT,
-                processing_time,
-                error=True
-            )
-            raise
+                
+                agent = self.agents[routing.agent_type]
+                with stage("agent"):
+                    prepared = await required_stage("generation", timed_stage("prepare", agent.prepare(
+                        topic=topic,
+                        platform=platform,
+                        audience=audience,
+                        language=language,
+                        **kwargs
+                    )))
+                    prompt = prepared.pop("prompt")
+                    max_tokens = prepared.pop("max_tokens", None)
+                    yield "sources", {"sources": prepared.get("sources") or []}
+                    
+                    chunks = []
+                    async for delta in agent.stream(prompt, max_tokens=max_tokens):
+                        chunks.append(delta)
+                        yield "token", {"delta": delta}
+                
+                image_url, image_dropped = await self._join_image(image_task)
+                image_task = None
+                yield "image", {"image_url": image_url}
+                dropped_stages = self._dropped_stages(image_dropped)
+                
+                processing_time = (time.time() - start_time) * 1000
+                result = OrchestrationResult(
+                    content="".join(chunks),
+                    agent_used=routing.agent_type,
+                    agent_description=self.agents[routing.agent_type].description,
+                    topic=topic,
+                    platform=platform,
+                    confidence_score=routing.confidence,
+                    processing_time_ms=processing_time,
+                    routing_reason=routing.reason,
+                    image_url=image_url,
+                    sources=prepared.get("sources"),
+                    dropped_stages=dropped_stages,
+                    stage_timings_ms=timings.to_dict(),
+                    metadata={k: v for k, v in prepared.items() if k != "sources"}
+                )
+                
+                result_dict = self._run_post_processors(result.to_dict())
+                
+                if self.enable_caching and self.cache is not None and not dropped_stages:
+                    await self._cache_store(cache_key, cache_scope, topic, result_dict, topic_vector)
+                
+                self.metrics.record_request(
+                    routing.agent_type, processing_time, cache_hit=False, dropped_stages=dropped_stages
+                )
+                
+                yield "result", result_dict
+                
+            except Exception as e:
+                processing_time = (time.time() - start_time) * 1000
+                self.metrics.record_request(
+                    AgentType.CONTENT, processing_time, error=True,
+                    deadline_exceeded=isinstance(e, DeadlineExceeded)
+                )
+                raise
+            finally:
+                if image_task and not image_task.done():
+                    image_task.cancel()
     
     async def process_batch(
         self,
         requests: List[dict],
-        max_concurrent: int = 3
+        max_concurrent: int = 3,
+        smart_routing: Optional[bool] = None,
+        get_orchestrator: Optional[Callable[[str], "AgentOrchestrator"]] = None
     ) -> List[dict]:
         """
-        Process multiple requests in parallel
+        Process multiple requests in parallel, planned by BatchPlanner:
+        identical requests run once and requests for the same agent and
+        topic share the context it retrieves (market data, papers, graph)
         
         Args:
             requests: List of request dicts with topic, platform, audience, etc.
             max_concurrent: Maximum concurrent requests
+            smart_routing: LLM routing for the batch (defaults to
+                BATCH_SMART_ROUTING: bulk jobs use the keyword router)
+            get_orchestrator: Orchestrator for a request's llm_provider
+                (defaults to this one for every request)
             
         Returns:
             List of results in same order as requests
         """
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def process_with_semaphore(request: dict) -> dict:
-            async with semaphore:
-                try:
-                    return await self.process_request(**request)
-                except Exception as e:
-                    return {"error": str(e), **request}
-        
-        tasks = [process_with_semaphore(req) for req in requests]
-        return await asyncio.gather(*tasks)
+        planner = BatchPlanner(
+            get_orchestrator or (lambda provider: self),
+            max_concurrent=max_concurrent,
+            smart_routing=smart_routing,
+            default_provider=self.llm_provider
+        )
+        return await planner.run(requests)
     
     async def chain_agents(
         self,
@@ -580,9 +1210,41 @@ Respond with ONLY a JSON object (no markdown, no explanation):
         Returns:
             Final combined result
         """
-        if not agent_sequence:
-            agent_sequence = [AgentType.SCIENCE, AgentType.CONTENT]
+        with timing_scope() as timings:
+            if not agent_sequence:
+                agent_sequence = [AgentType.SCIENCE, AgentType.CONTENT]
+            
+            # The image for the final content only needs the topic: start it now
+            image_task = self._start_image(topic, platform)
+            try:
+                accumulated_context, all_sources = await timed_stage("agent", self._run_chain(
+                    topic, platform, audience, language, agent_sequence, **kwargs
+                ))
+                image_url, _ = await self._join_image(image_task)
+            finally:
+                if image_task and not image_task.done():
+                    image_task.cancel()
         
+        return {
+            "content": accumulated_context,
+            "topic": topic,
+            "platform": platform,
+            "agent_chain": [a.value for a in agent_sequence],
+            "sources": all_sources,
+            "image_url": image_url,
+            "stage_timings_ms": timings.to_dict()
+        }
+    
+    async def _run_chain(
+        self,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str,
+        agent_sequence: List[AgentType],
+        **kwargs
+    ) -> Tuple[str, List[dict]]:
+        """Run the agents in sequence, each one seeing the previous content"""
         accumulated_context = ""
         all_sources = []
         
@@ -609,21 +1271,18 @@ Respond with ONLY a JSON object (no markdown, no explanation):
             if result.get("sources"):
                 all_sources.extend(result["sources"])
         
-        # Generate image for final content
-        image_url = await self._generate_image_async(topic, platform)
-        
-        return {
-            "content": accumulated_context,
-            "topic": topic,
-            "platform": platform,
-            "agent_chain": [a.value for a in agent_sequence],
-            "sources": all_sources,
-            "image_url": image_url
-        }
+        return accumulated_context, all_sources
     
     def get_metrics(self) -> dict:
         """Get orchestration metrics"""
-        return self.metrics.get_stats()
+        return {
+            **self.metrics.get_stats(),
+            "result_cache": self.cache.get_stats() if self.cache is not None else None,
+            "single_flight": self.inflight.get_stats(),
+            "routing_cache": self.routing_cache.get_stats() if self.routing_cache is not None else None,
+            "centroid_router": self.centroid_router.get_stats() if self.centroid_router is not None else None,
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else None
+        }
     
     def get_agent_info(self) -> List[dict]:
         """Get information about available agents"""
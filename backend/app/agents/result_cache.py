@@ -0,0 +1,492 @@
+"""
+Result cache for orchestration results: in-process LRU + TTL (L1) bounded
+by bytes, optionally backed by a shared L2 (SQLite file or Redis)
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from app.core.config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional: zlib is used without it
+    zstandard = None
+
+try:
+    import redis
+except ImportError:  # redis is optional: only needed for the Redis L2
+    redis = None
+
+settings = get_settings()
+
+
+@dataclass
+class _Entry:
+    value: bytes
+    size: int
+    expires_at: float
+    compute_seconds: float
+
+
+class ResultCache:
+    """
+    Exact-match cache of generated results.
+
+    - O(1) get/set: an OrderedDict kept in LRU order (move_to_end on hit,
+      popitem(last=False) to evict)
+    - Bounded by the total size of the stored (serialized) results instead
+      of an entry count; every entry has its own TTL
+    - Results are serialized as JSON (never pickle: the L2 is shared with
+      other processes) and, above a small size, compressed with zstd (zlib
+      if zstandard is not installed)
+    - Probabilistic early refresh (XFetch): as an entry nears expiry, a few
+      lookups report a miss so one request recomputes it before it expires,
+      while the rest keep being served from the cache
+    """
+
+    # Format markers (the pickle-era markers r/z/d read as unknown)
+    _RAW = b"j"
+    _ZSTD = b"Z"
+    _ZLIB = b"D"
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        compress: bool = True,
+        compress_min_bytes: int = 1024,
+        early_refresh_beta: float = 1.0
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        self.early_refresh_beta = early_refresh_beta
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._total_bytes = 0
+
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """Stable key over every field that changes the generated result"""
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _encode(self, result: Any) -> bytes:
+        data = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if not self.compress or len(data) < self.compress_min_bytes:
+            return self._RAW + data
+        if zstandard is not None:
+            return self._ZSTD + self._compressor.compress(data)
+        return self._ZLIB + zlib.compress(data, 6)
+
+    def _decode(self, value: bytes) -> Any:
+        marker, data = value[:1], value[1:]
+        if marker == self._ZSTD:
+            if zstandard is None:
+                raise ValueError("Entry compressed with zstd but zstandard is not installed")
+            data = self._decompressor.decompress(data)
+        elif marker == self._ZLIB:
+            data = zlib.decompress(data)
+        elif marker != self._RAW:
+            raise ValueError(f"Unknown result cache entry format: {marker!r}")
+        return json.loads(data)
+
+    def encode(self, result: Any) -> bytes:
+        """Serialized (and maybe compressed) form stored in every tier"""
+        return self._encode(result)
+
+    def decode(self, value: bytes) -> Any:
+        return self._decode(value)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size
+
+    def get(self, key: str) -> Optional[Any]:
+        """A fresh copy of the cached result, or None on miss / early refresh"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if now >= entry.expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        # XFetch: recompute early with a probability that grows near expiry
+        # and with how long the result took to compute
+        if entry.compute_seconds > 0 and self.early_refresh_beta > 0:
+            jitter = -entry.compute_seconds * self.early_refresh_beta * math.log(1.0 - random.random())
+            if now + jitter >= entry.expires_at:
+                self.early_refreshes += 1
+                self.misses += 1
+                return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._decode(entry.value)
+
+    def set(self, key: str, result: Any, compute_seconds: float = 0.0, ttl_seconds: Optional[float] = None):
+        """Store a result; compute_seconds (how long it took) drives the early refresh"""
+        try:
+            value = self._encode(result)
+        except Exception as e:
+            # Results that can't be serialized are simply not cached
+            print(f"Result cache: can't serialize result: {e}")
+            return
+        self.set_encoded(key, value, compute_seconds, ttl_seconds)
+
+    def set_encoded(
+        self, key: str, value: bytes, compute_seconds: float = 0.0, ttl_seconds: Optional[float] = None
+    ):
+        """Store an already encoded result (e.g. promoted from the L2)"""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = _Entry(value, size, time.monotonic() + ttl, compute_seconds)
+        self._total_bytes += size
+
+        while self._total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "compression": ("zstd" if zstandard is not None else "zlib") if self.compress else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / max(lookups, 1) * 100, 2),
+            "early_refreshes": self.early_refreshes,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class ResultCacheBackend(ABC):
+    """
+    Shared (L2) storage of encoded results, visible to every worker process.
+    Entries carry an absolute (wall clock) expiry and their compute time.
+    """
+
+    name = "backend"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        """(encoded value, expires_at epoch seconds, compute_seconds) or None"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, expires_at: float, compute_seconds: float):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class SQLiteResultBackend(ResultCacheBackend):
+    """
+    L2 in a local SQLite file (WAL mode, so several uvicorn workers can read
+    and write it concurrently). Bounded by bytes with LRU eviction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                compute_seconds REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache(last_access)")
+        # Other workers write to the same file: this is only a local estimate,
+        # re-read from the database before evicting
+        self._total_bytes = self._stored_bytes()
+        self.evictions = 0
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, compute_seconds FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+        return bytes(row[0]), row[1], row[2]
+
+    def set(self, key: str, value: bytes, expires_at: float, compute_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_cache "
+                "(key, value, size, expires_at, compute_seconds, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, compute_seconds, now)
+            )
+            self._total_bytes += len(value)
+            if self._total_bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used ones until max_bytes fits"""
+        self._conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+        self._total_bytes = self._stored_bytes()
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM result_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM result_cache")
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache"
+            ).fetchone()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "entries": entries,
+            "bytes": stored,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
+
+
+class RedisResultBackend(ResultCacheBackend):
+    """L2 in a Redis-protocol server (Redis, Valkey, KeyDB...); expiry is handled by the server"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "result_cache:"):
+        if redis is None:
+            raise ImportError("The Redis result cache L2 needs the 'redis' package")
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        row = self._client.hmget(self.prefix + key, "value", "expires_at", "compute_seconds")
+        if row[0] is None:
+            return None
+        return row[0], float(row[1]), float(row[2])
+
+    def set(self, key: str, value: bytes, expires_at: float, compute_seconds: float):
+        name = self.prefix + key
+        pipe = self._client.pipeline()
+        pipe.hset(name, mapping={"value": value, "expires_at": expires_at, "compute_seconds": compute_seconds})
+        pipe.expireat(name, int(math.ceil(expires_at)))
+        pipe.execute()
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for name in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(name)
+
+    def close(self):
+        self._client.close()
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, "url": self.url}
+
+
+class TieredResultCache:
+    """
+    L1 (in-process ResultCache) in front of an optional shared L2 backend.
+
+    - Lookups try L1, then L2; L2 hits are promoted to L1 with their
+      remaining TTL
+    - An L1 early refresh (XFetch) is a miss for that caller: the L2 copy
+      expires at the same time, so it is not consulted
+    - Writes go to both tiers; L2 I/O runs in a worker thread and L2
+      errors degrade to L1-only instead of failing the request
+    """
+
+    def __init__(self, l1: ResultCache, l2: Optional[ResultCacheBackend] = None):
+        self.l1 = l1
+        self.l2 = l2
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        result = self.l1.get(key)
+        if result is not None or self.l2 is None or key in self.l1:
+            return result
+
+        try:
+            row = await asyncio.to_thread(self.l2.get, key)
+        except Exception as e:
+            print(f"Result cache L2 get failed: {e}")
+            self.l2_errors += 1
+            return None
+        if row is None:
+            self.l2_misses += 1
+            return None
+
+        value, expires_at, compute_seconds = row
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            self.l2_misses += 1
+            return None
+        try:
+            result = self.l1.decode(value)
+        except Exception as e:
+            print(f"Result cache L2 entry unreadable: {e}")
+            self.l2_errors += 1
+            return None
+        self.l2_hits += 1
+        self.l1.set_encoded(key, value, compute_seconds, ttl)
+        return result
+
+    async def set(self, key: str, result: Any, compute_seconds: float = 0.0, ttl_seconds: Optional[float] = None):
+        try:
+            value = self.l1.encode(result)
+        except Exception as e:
+            print(f"Result cache: can't serialize result: {e}")
+            return
+        ttl = self.l1.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.l1.set_encoded(key, value, compute_seconds, ttl)
+        if self.l2 is None:
+            return
+        try:
+            await asyncio.to_thread(self.l2.set, key, value, time.time() + ttl, compute_seconds)
+        except Exception as e:
+            print(f"Result cache L2 set failed: {e}")
+            self.l2_errors += 1
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def get_stats(self) -> dict:
+        l2_lookups = self.l2_hits + self.l2_misses
+        return {
+            "l1": self.l1.get_stats(),
+            "l2": {
+                **self.l2.get_stats(),
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "hit_rate": round(self.l2_hits / max(l2_lookups, 1) * 100, 2),
+                "errors": self.l2_errors
+            } if self.l2 is not None else None
+        }
+
+
+_shared_backend: Optional[ResultCacheBackend] = None
+
+
+def get_shared_result_backend() -> Optional[ResultCacheBackend]:
+    """L2 backend shared by every orchestrator in the process (None if disabled or unavailable)"""
+    global _shared_backend
+    if _shared_backend is None:
+        try:
+            if settings.RESULT_CACHE_L2 == "sqlite":
+                _shared_backend = SQLiteResultBackend(
+                    settings.RESULT_CACHE_L2_PATH,
+                    max_bytes=settings.RESULT_CACHE_L2_MAX_MB * 1024 * 1024
+                )
+            elif settings.RESULT_CACHE_L2 == "redis":
+                _shared_backend = RedisResultBackend(settings.RESULT_CACHE_L2_URL)
+        except Exception as e:
+            print(f"Result cache L2 unavailable, using L1 only: {e}")
+    return _shared_backend
@@ -0,0 +1,309 @@
+"""
+Routing helpers: canonical topic normalization, the routing decision cache,
+the compiled keyword matcher and the embedding-centroid router
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import replace
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_WORD = re.compile(r"[^\W_]+")
+# Diacritics left as separate marks by NFKD (á -> a + ´)
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]+")
+
+# Light suffix stripping (Spanish + English), longest first: enough to merge
+# plurals and common derivations without a full stemmer dependency
+_SUFFIXES = (
+    "aciones", "amiento", "imiento", "ciones", "mente", "acion",
+    "ings", "ing", "ies", "es", "ed", "s", "e",
+)
+_MIN_STEM = 4
+
+
+@lru_cache(maxsize=8192)
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def topic_words(topic: str, stem: bool = False) -> List[str]:
+    """Words of the topic in canonical form (see normalize_topic)"""
+    text = topic.casefold()
+    if not text.isascii():
+        text = _COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text))
+    words = _WORD.findall(text)
+    if stem:
+        words = [_stem(word) for word in words]
+    return words
+
+
+def normalize_topic(topic: str, stem: Optional[bool] = None) -> str:
+    """
+    Canonical form of a topic so trivial variants share cache entries:
+    case-folded, accents stripped, punctuation and whitespace collapsed to
+    single spaces and, optionally (TOPIC_NORMALIZE_STEM), lightly stemmed.
+
+    "¿Qué es la Computación Cuántica?" -> "que es la computacion cuantica"
+    """
+    if stem is None:
+        stem = settings.TOPIC_NORMALIZE_STEM
+    return " ".join(topic_words(topic, stem))
+
+
+class RoutingCache:
+    """
+    LRU + TTL cache of LLM routing decisions by normalized topic (and
+    normalized routing context, which also steers the router).
+
+    Routing only depends on the topic, so requests that miss the result
+    cache because platform, audience or language differ still skip the
+    routing LLM call.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = settings.ROUTING_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.ROUTING_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(topic: str, context: str = "") -> Tuple[str, str]:
+        return normalize_topic(topic), normalize_topic(context or "")
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        decision, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        return decision
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return self._lookup(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, topic: str, context: str = "") -> Optional[Any]:
+        """Cached decision for the topic (a copy marked as cached), or None"""
+        key = self.make_key(topic, context)
+        decision = self._lookup(key)
+        if decision is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return replace(decision, reason=f"{decision.reason} (cached)")
+
+    def set(self, topic: str, decision: Any, context: str = ""):
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        key = self.make_key(topic, context)
+        self._entries[key] = (decision, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class KeywordMatcher:
+    """
+    Keyword router compiled once into a token-level Aho–Corasick automaton.
+
+    - Keywords and topics go through the same normalization (normalize_topic
+      with stemming), so matches respect word boundaries ("ai" doesn't match
+      "said", "ml" doesn't match "html") while plurals still match
+    - One pass over the topic tokens finds every keyword of every agent,
+      instead of one substring scan per keyword
+    - Each distinct keyword counts once, weighted 1.0 plus 0.5 per extra
+      word (a phrase like "machine learning" is stronger evidence)
+    """
+
+    PHRASE_BONUS = 0.5
+
+    def __init__(self, keywords_by_label: Dict[Any, Iterable[str]]):
+        # State 0 is the root; per state: token transitions, failure link and
+        # the (keyword id) outputs that end there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        # Keyword id -> (label, weight)
+        self._keywords: List[Tuple[Any, float]] = []
+        for label, keywords in keywords_by_label.items():
+            for keyword in keywords:
+                self._add(label, keyword)
+        self._build_failure_links()
+
+    def _add(self, label: Any, keyword: str):
+        tokens = topic_words(keyword, stem=True)
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][token] = next_state
+            state = next_state
+        self._out[state].append(len(self._keywords))
+        self._keywords.append((label, 1.0 + self.PHRASE_BONUS * (len(tokens) - 1)))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                # Outputs of the longest proper suffix also end here
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def matches(self, text: str) -> Set[int]:
+        """Ids of the keywords found in the text"""
+        found: Set[int] = set()
+        state = 0
+        for token in topic_words(text, stem=True):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            found.update(self._out[state])
+        return found
+
+    def scores(self, text: str) -> Dict[Any, float]:
+        """Weighted score per label (labels without matches are left out)"""
+        scores: Dict[Any, float] = {}
+        for keyword_id in self.matches(text):
+            label, weight = self._keywords[keyword_id]
+            scores[label] = scores.get(label, 0.0) + weight
+        return scores
+
+
+class CentroidRouter:
+    """
+    Local embedding router: cosine similarity of the topic to one centroid
+    per agent, so unambiguous topics skip the LLM routing call.
+
+    - Centroids start from each agent's description, keywords and strengths
+      (embedded once, on first use)
+    - A topic is routed locally only when its best centroid reaches the
+      threshold and beats the runner-up by the margin; ambiguous topics go
+      to the LLM router
+    - Every LLM-routed topic (without extra context) pulls its agent's
+      centroid towards it (a running mean whose weight is capped, so recent
+      traffic keeps counting); updates before the centroids exist are skipped,
+      so they never embed the seeds on the caller's thread
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[Any], Any],
+        seeds: Dict[Any, List[str]],
+        threshold: Optional[float] = None,
+        margin: Optional[float] = None,
+        max_weight: Optional[int] = None
+    ):
+        self._encode = encode
+        self.seeds = seeds
+        self.threshold = settings.CENTROID_ROUTING_THRESHOLD if threshold is None else threshold
+        self.margin = settings.CENTROID_ROUTING_MARGIN if margin is None else margin
+        self.max_weight = settings.CENTROID_ROUTING_MAX_WEIGHT if max_weight is None else max_weight
+        # Label -> (running mean of unit vectors, number of vectors it stands for)
+        self._centroids: Optional[Dict[Any, Tuple[np.ndarray, int]]] = None
+        self._lock = threading.Lock()
+        self.local_routes = 0
+        self.ambiguous = 0
+        self.updates = 0
+
+    @staticmethod
+    def _unit(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def embed(self, topic: str) -> np.ndarray:
+        """Unit-length embedding of the normalized topic"""
+        return self._unit(np.asarray(self._encode(normalize_topic(topic, stem=False)), dtype=np.float32))
+
+    def _ensure_centroids(self) -> Dict[Any, Tuple[np.ndarray, int]]:
+        with self._lock:
+            if self._centroids is None:
+                centroids = {}
+                for label, texts in self.seeds.items():
+                    vectors = self._unit(np.asarray(self._encode(list(texts)), dtype=np.float32))
+                    centroids[label] = (vectors.mean(axis=0), len(texts))
+                self._centroids = centroids
+            return self._centroids
+
+    def similarities(self, vector: np.ndarray) -> Dict[Any, float]:
+        """Cosine similarity of a unit vector to every centroid"""
+        return {
+            label: float(np.dot(self._unit(centroid), vector))
+            for label, (centroid, _) in self._ensure_centroids().items()
+        }
+
+    def classify(self, vector: np.ndarray) -> Optional[Tuple[Any, float, float]]:
+        """(label, similarity, margin over the runner-up) when confident, else None"""
+        ranked = sorted(self.similarities(vector).items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None
+        label, best = ranked[0]
+        margin = best - ranked[1][1] if len(ranked) > 1 else best
+        if best < self.threshold or margin < self.margin:
+            self.ambiguous += 1
+            return None
+        self.local_routes += 1
+        return label, best, margin
+
+    def update(self, vector: np.ndarray, label: Any):
+        """Move the label's centroid towards a topic the LLM routed to it (no-op until classify() built them)"""
+        with self._lock:
+            centroids = self._centroids
+            if centroids is None or label not in centroids:
+                return
+            centroid, weight = centroids[label]
+            weight = min(weight + 1, self.max_weight)
+            centroids[label] = (centroid + (vector - centroid) / weight, weight)
+            self.updates += 1
+
+    def get_stats(self) -> dict:
+        decisions = self.local_routes + self.ambiguous
+        return {
+            "local_routes": self.local_routes,
+            "ambiguous": self.ambiguous,
+            "local_rate": round(self.local_routes / decisions * 100, 2) if decisions else 0.0,
+            "updates": self.updates,
+            "threshold": self.threshold,
+            "margin": self.margin,
+        }
@@ -1,6 +1,8 @@
 """
 Agente para contenido científico divulgativo con RAG
 """
+from typing import Optional
+from app.agents.routing import normalize_topic
 from app.services.graph_rag_service import GraphRAGService
 
 
@@ -12,6 +14,46 @@ class ScienceAgent:
     def __init__(self, llm_provider:  str = "groq"):
         self.graph_rag = GraphRAGService(llm_provider=llm_provider)
     
+    def shared_context_key(self, topic: str) -> str:
+        """La recuperación depende sólo del tema: se comparte entre peticiones del mismo tema"""
+        return normalize_topic(topic)
+    
+    async def fetch_shared_context(self, topic: str) -> dict:
+        """Contexto del grafo y papers recuperados (una vez) para varias peticiones de un lote"""
+        return {"retrieval": await self.graph_rag.retrieve_context(topic, learn=True)}
+    
+    async def prepare(
+        self,
+        topic: str,
+        platform: str,
+        audience: str,
+        language: str = "Spanish",
+        scientific_area: str = "ai",
+        shared_context: Optional[dict] = None,
+        **kwargs
+    ) -> dict:
+        """
+        Recupera el contexto (grafo + papers) y construye el prompt, sin llamar al LLM.
+        shared_context: recuperación ya hecha con fetch_shared_context() (lotes)
+        """
+        
+        prepared = await self.graph_rag.prepare_content(
+            topic=topic,
+            platform=platform,
+            language=language,
+            retrieved=(shared_context or {}).get("retrieval")
+        )
+        
+        return {
+            "prompt": prepared["prompt"],
+            "topic": topic,
+            "platform": platform,
+            "sources": prepared.get("sources", []),
+            "graph_concepts": prepared.get("graph_concepts", []),
+            "scientific_area":  scientific_area,
+            "max_tokens": prepared.get("max_tokens")
+        }
+    
     async def generate(
         self,
         topic: str,
@@ -19,6 +61,7 @@ class ScienceAgent:
         audience: str,
         language: str = "Spanish",
         scientific_area: str = "ai",
+        shared_context: Optional[dict] = None,
         **kwargs
     ) -> dict:
         """Genera contenido científico divulgativo"""
@@ -26,7 +69,8 @@ class ScienceAgent:
         result = await self.graph_rag.generate_content(
             topic=topic,
             platform=platform,
-            language=language
+            language=language,
+            retrieved=(shared_context or {}).get("retrieval")
         )
         
         return {
@@ -37,3 +81,7 @@ class ScienceAgent:
             "graph_concepts": result.get("graph_concepts", []),
             "scientific_area":  scientific_area
         }
+    
+    def stream(self, prompt: str, max_tokens: Optional[int] = None):
+        """Stream de tokens para un prompt ya preparado con prepare()"""
+        return self.graph_rag.llm_service.stream(prompt, max_tokens=max_tokens)
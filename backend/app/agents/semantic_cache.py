@@ -0,0 +1,159 @@
+"""
+Semantic request cache: reuse results for near-duplicate topics
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.agents.routing import normalize_topic
+
+
+@dataclass
+class SemanticMatch:
+    """A cached result whose topic is close enough to the requested one"""
+    result: dict
+    topic: str
+    similarity: float
+
+
+@dataclass
+class _Bucket:
+    """Entries that share every request field except the topic (one scope)"""
+    vectors: List[np.ndarray] = field(default_factory=list)
+    topics: List[str] = field(default_factory=list)
+    results: List[dict] = field(default_factory=list)
+    timestamps: List[float] = field(default_factory=list)
+
+    def remove(self, index: int):
+        for column in (self.vectors, self.topics, self.results, self.timestamps):
+            del column[index]
+
+
+class SemanticCache:
+    """
+    In-memory vector index over previous requests.
+
+    Topics are embedded with the shared SentenceTransformer; a lookup only
+    compares against entries with the same scope (every field of the exact
+    cache key except the topic) and hits when the cosine similarity reaches
+    the threshold. Entries expire after ttl_seconds and the oldest one is
+    evicted when max_entries is reached.
+    """
+
+    # Upper edges of the similarity histogram reported in get_stats()
+    SIMILARITY_BUCKETS = (0.5, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0)
+
+    def __init__(
+        self,
+        embed: Callable[[str], np.ndarray],
+        threshold: float = 0.92,
+        max_entries: int = 500,
+        ttl_seconds: int = 3600
+    ):
+        self._embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._buckets: Dict[str, _Bucket] = {}
+        self._size = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self._hit_similarity_total = 0.0
+        self._similarity_histogram = [0] * len(self.SIMILARITY_BUCKETS)
+
+    def embed(self, topic: str) -> np.ndarray:
+        """
+        Unit-length embedding of the topic, normalized like the exact and
+        routing cache keys (unstemmed, as the centroid router embeds it, so
+        one vector serves both)
+        """
+        vector = np.asarray(self._embed(normalize_topic(topic, stem=False)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _prune(self, bucket: _Bucket, now: float):
+        index = 0
+        while index < len(bucket.timestamps):
+            if now - bucket.timestamps[index] >= self.ttl_seconds:
+                bucket.remove(index)
+                self._size -= 1
+            else:
+                index += 1
+
+    def _record_similarity(self, similarity: float):
+        for i, upper in enumerate(self.SIMILARITY_BUCKETS):
+            if similarity <= upper:
+                self._similarity_histogram[i] += 1
+                return
+        self._similarity_histogram[-1] += 1
+
+    def get(self, vector: np.ndarray, scope: str) -> Optional[SemanticMatch]:
+        """Best cached result above the threshold within this scope"""
+        self.lookups += 1
+        bucket = self._buckets.get(scope)
+        if bucket is None:
+            return None
+
+        self._prune(bucket, time.time())
+        if not bucket.vectors:
+            return None
+
+        similarities = np.stack(bucket.vectors) @ vector
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        self._record_similarity(similarity)
+
+        if similarity < self.threshold:
+            return None
+
+        self.hits += 1
+        self._hit_similarity_total += similarity
+        return SemanticMatch(
+            result=bucket.results[best],
+            topic=bucket.topics[best],
+            similarity=round(similarity, 4)
+        )
+
+    def set(self, vector: np.ndarray, topic: str, scope: str, result: dict):
+        now = time.time()
+        if self._size >= self.max_entries:
+            for bucket in self._buckets.values():
+                self._prune(bucket, now)
+        if self._size >= self.max_entries:
+            self._evict_oldest()
+
+        bucket = self._buckets.setdefault(scope, _Bucket())
+        bucket.vectors.append(vector)
+        bucket.topics.append(topic)
+        bucket.results.append(result)
+        bucket.timestamps.append(now)
+        self._size += 1
+
+    def _evict_oldest(self):
+        # Entries are appended in time order, so each bucket's oldest is at index 0
+        candidates = [bucket for bucket in self._buckets.values() if bucket.timestamps]
+        if not candidates:
+            return
+        oldest = min(candidates, key=lambda bucket: bucket.timestamps[0])
+        oldest.remove(0)
+        self._size -= 1
+        self.evictions += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": self._size,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / max(self.lookups, 1) * 100, 2),
+            "avg_hit_similarity": round(self._hit_similarity_total / max(self.hits, 1), 4),
+            "threshold": self.threshold,
+            "evictions": self.evictions,
+            "similarity_histogram": {
+                f"<={upper}": count
+                for upper, count in zip(self.SIMILARITY_BUCKETS, self._similarity_histogram)
+            }
+        }
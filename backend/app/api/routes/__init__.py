@@ -2,11 +2,12 @@
 Registro de todas las rutas
 """
 from fastapi import APIRouter
-from app.api.routes import content, health, financial, science
+from app.api.routes import content, health, financial, jobs, science
 
 api_router = APIRouter()
 
 api_router.include_router(health.router)
 api_router.include_router(content.router)
 api_router.include_router(financial.router)
-api_router.include_router(science.router)
\ No newline at end of file
+api_router.include_router(science.router)
+api_router.include_router(jobs.router)
\ No newline at end of file
@@ -1,40 +1,52 @@
 """
 Rutas para generación de contenido (actualizado con multi-agente mejorado)
 """
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException
+import json
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from app.models.schemas import (
     ContentRequest, 
     ContentResponse, 
     ConfigResponse,
+    LLMProviderEnum,
     PlatformInfo,
     AudienceInfo
 )
-from app.agents.orchestrator import AgentOrchestrator, AgentType
+from app.agents.batch_planner import BatchPlanner
+from app.agents.orchestrator import AgentOrchestrator, AgentType, OrchestrationMetrics
+from app.core.config import get_settings
+from app.core.deadline import DeadlineExceeded, request_deadline_seconds
+from app.core.metrics import registry as metrics_registry
 from app.core.prompts import PLATFORM_CONFIGS, AUDIENCE_CONFIGS
-from app.core.guardrails import ContentGuardrails
+from app.core.timing import stage, timing_scope, timings_tree
+from app.core.guardrails import ContentGuardrails, ValidationResult
 from app.core.tracing import setup_langsmith
+from app.services.llm_service import LLMService
+from app.services.rate_limiter import RateLimitError
 
 router = APIRouter(prefix="/content", tags=["Content"])
 
 # Configurar LangSmith al cargar el módulo
 setup_langsmith()
 
-# Global orchestrator instance for metrics persistence
-_orchestrator_instance: Optional[AgentOrchestrator] = None
+# One orchestrator per LLM provider for metrics and cache persistence
+# (a batch may mix providers)
+_orchestrators: Dict[str, AgentOrchestrator] = {}
 
 
-def get_orchestrator(llm_provider: str = "groq") -> AgentOrchestrator:
-    """Get or create orchestrator instance"""
-    global _orchestrator_instance
-    if _orchestrator_instance is None or _orchestrator_instance.llm_provider != llm_provider:
-        _orchestrator_instance = AgentOrchestrator(
+def get_orchestrator(llm_provider: Optional[str] = None) -> AgentOrchestrator:
+    """Get or create the orchestrator for a provider"""
+    llm_provider = llm_provider or get_settings().DEFAULT_LLM_PROVIDER
+    orchestrator = _orchestrators.get(llm_provider)
+    if orchestrator is None:
+        orchestrator = _orchestrators[llm_provider] = AgentOrchestrator(
             llm_provider=llm_provider,
             enable_smart_routing=True,
             enable_caching=True
         )
-    return _orchestrator_instance
+    return orchestrator
 
 
 class BatchRequest(BaseModel):
@@ -54,7 +66,10 @@ class ChainRequest(BaseModel):
 
 
 @router.post("/generate", response_model=ContentResponse)
-async def generate_content(request: ContentRequest):
+async def generate_content(
+    request: ContentRequest,
+    x_request_deadline_ms: Optional[int] = Header(default=None)
+):
     """
     Genera contenido usando el sistema multi-agente mejorado
     
@@ -63,26 +78,112 @@ async def generate_content(request: ContentRequest):
     - Automatic fallback on errors
     - Request caching
     - Performance metrics
+    - Request deadline (deadline_ms or X-Request-Deadline-Ms): optional
+      stages that don't fit are skipped and listed in dropped_stages
+    - debug=true: per-stage timings (nested) in stage_timings_ms
     """
     try:
         # Get orchestrator with caching
         orchestrator = get_orchestrator(request.llm_provider.value)
         
-        # Procesar con el agente apropiado
-        result = await orchestrator.process_request(
-            topic=request.topic,
-            platform=request.platform.value,
-            audience=request.audience.value,
-            language=request.language,
-            tone=request.tone,
-            additional_context=request.additional_context,
-            content_type=getattr(request, 'content_type', None)
-        )
+        with timing_scope() as timings:
+            # Procesar con el agente apropiado
+            result = await orchestrator.process_request(
+                topic=request.topic,
+                platform=request.platform.value,
+                audience=request.audience.value,
+                language=request.language,
+                tone=request.tone,
+                additional_context=request.additional_context,
+                content_type=getattr(request, 'content_type', None),
+                deadline_seconds=request_deadline_seconds(request.deadline_ms, x_request_deadline_ms)
+            )
+            
+            validation = _apply_guardrails(result, request.platform.value)
+            result["stage_timings_ms"] = timings.to_dict()
+        
+        return _build_response(request, result, validation)
         
-        # Validar con guardrails
+    except RateLimitError as e:
+        raise _rate_limit_http_error(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate/stream")
+async def generate_content_stream(
+    request: ContentRequest,
+    x_request_deadline_ms: Optional[int] = Header(default=None)
+):
+    """
+    Genera contenido emitiendo server-sent events a medida que avanza
+    
+    Eventos (en orden):
+    - routing: agente elegido, confianza y motivo
+    - sources: fuentes recuperadas por el agente
+    - token: fragmento de texto generado por el LLM (uno por delta)
+    - image: URL de la imagen generada
+    - validation: puntuación y avisos de los guardrails
+    - done: respuesta final (mismo formato que /generate)
+    - error: si algo falla a mitad del stream
+    """
+    orchestrator = get_orchestrator(request.llm_provider.value)
+    deadline_seconds = request_deadline_seconds(request.deadline_ms, x_request_deadline_ms)
+    
+    async def event_stream():
+        try:
+            with timing_scope() as timings:
+                async for event, data in orchestrator.stream_request(
+                    topic=request.topic,
+                    platform=request.platform.value,
+                    audience=request.audience.value,
+                    language=request.language,
+                    tone=request.tone,
+                    additional_context=request.additional_context,
+                    content_type=getattr(request, 'content_type', None),
+                    deadline_seconds=deadline_seconds
+                ):
+                    if event != "result":
+                        yield _sse_event(event, data)
+                        continue
+                    
+                    validation = _apply_guardrails(data, request.platform.value)
+                    yield _sse_event("validation", {
+                        "validation_score": validation.score,
+                        "validation_warnings": data.get("validation_warnings", [])
+                    })
+                    data["stage_timings_ms"] = timings.to_dict()
+                    response = _build_response(request, data, validation)
+                    yield _sse_event("done", response.model_dump(mode="json"))
+        except Exception as e:
+            yield _sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _rate_limit_http_error(error: RateLimitError) -> HTTPException:
+    """429 para el cliente, con Retry-After si el provider lo indicó"""
+    headers = {"Retry-After": str(int(error.retry_after or 1))}
+    return HTTPException(status_code=429, detail=str(error), headers=headers)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Serializa un evento en formato server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _apply_guardrails(result: dict, platform: str) -> ValidationResult:
+    """Valida el contenido con guardrails y lo sanea in-place si hace falta"""
+    with stage("guardrails"):
         validation = ContentGuardrails.validate_content(
             content=result["content"],
-            platform=request.platform.value
+            platform=platform
         )
         
         # Sanitizar si hay issues menores
@@ -95,27 +196,32 @@ async def generate_content(request: ContentRequest):
             result["content"] = ContentGuardrails.add_disclaimers(
                 result["content"], "financial"
             )
-        
-        return ContentResponse(
-            content=result["content"],
-            platform=request.platform.value,
-            audience=request.audience.value,
-            topic=request.topic,
-            llm_provider=request.llm_provider.value,
-            model_used=result.get("model_used", "unknown"),
-            image_url=result.get("image_url"),
-            agent_used=result.get("agent_used"),
-            sources=result.get("sources"),
-            validation_score=validation.score,
-            # New fields from enhanced orchestrator
-            confidence_score=result.get("confidence_score"),
-            processing_time_ms=result.get("processing_time_ms"),
-            routing_reason=result.get("routing_reason"),
-            from_cache=result.get("from_cache", False)
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    return validation
+
+
+def _build_response(request: ContentRequest, result: dict, validation: ValidationResult) -> ContentResponse:
+    timings = result.get("stage_timings_ms")
+    return ContentResponse(
+        content=result["content"],
+        platform=request.platform.value,
+        audience=request.audience.value,
+        topic=request.topic,
+        llm_provider=request.llm_provider.value,
+        model_used=result.get("model_used", "unknown"),
+        image_url=result.get("image_url"),
+        agent_used=result.get("agent_used"),
+        sources=result.get("sources"),
+        validation_score=validation.score,
+        validation_warnings=result.get("validation_warnings"),
+        # New fields from enhanced orchestrator
+        confidence_score=result.get("confidence_score"),
+        processing_time_ms=result.get("processing_time_ms"),
+        routing_reason=result.get("routing_reason"),
+        from_cache=result.get("from_cache", False),
+        dropped_stages=result.get("dropped_stages") or [],
+        stage_timings_ms=timings_tree(timings) if request.debug and timings else None
+    )
 
 
 @router.post("/generate/batch")
@@ -126,39 +232,45 @@ async def generate_batch(batch_request: BatchRequest):
     Useful for:
     - Generating content for multiple platforms at once
     - Bulk content creation
+    
+    Identical items run once, items for the same agent and topic share
+    their context (market data, papers, graph) and each item runs with its
+    own llm_provider. "plan" summarizes how the batch was grouped.
     """
     try:
-        orchestrator = get_orchestrator()
-        
         # Convert requests to dicts
-        requests = [
-            {
-                "topic": req.topic,
-                "platform": req.platform.value,
-                "audience": req.audience.value,
-                "language": req.language,
-                "tone": req.tone,
-                "additional_context": req.additional_context,
-            }
-            for req in batch_request.requests
-        ]
+        requests = [_batch_item(req) for req in batch_request.requests]
         
-        results = await orchestrator.process_batch(
-            requests=requests,
-            max_concurrent=batch_request.max_concurrent
-        )
+        planner = BatchPlanner(get_orchestrator, max_concurrent=batch_request.max_concurrent)
+        results = await planner.run(requests)
         
         return {
             "results": results,
             "total": len(results),
             "successful": sum(1 for r in results if "error" not in r),
-            "failed": sum(1 for r in results if "error" in r)
+            "failed": sum(1 for r in results if "error" in r),
+            "plan": planner.stats
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _batch_item(request: ContentRequest) -> dict:
+    """Item de un lote con los mismos campos que /generate"""
+    return {
+        "topic": request.topic,
+        "platform": request.platform.value,
+        "audience": request.audience.value,
+        "language": request.language,
+        "tone": request.tone,
+        "additional_context": request.additional_context,
+        "content_type": request.content_type.value if request.content_type else None,
+        "deadline_seconds": request_deadline_seconds(request.deadline_ms),
+        "llm_provider": request.llm_provider.value,
+    }
+
+
 @router.post("/generate/chain")
 async def generate_with_chain(chain_request: ChainRequest):
     """
@@ -166,7 +278,8 @@ async def generate_with_chain(chain_request: ChainRequest):
     
     Example: Use Science agent for research, then Content agent for social optimization
     
-    Default chain: science → content
+    Default chain: science → content (an empty agent_sequence uses the
+    routed specialist → content)
     """
     try:
         orchestrator = get_orchestrator()
@@ -210,9 +323,33 @@ async def get_metrics():
     - Average processing time
     - Cache hit rate
     - Error rate
+    
+    Totals cover every LLM provider; "providers" has each orchestrator's
+    full metrics (caches, routing, single-flight) by provider, and "llm" the
+    process-wide LLM client stats (shared by every provider, reported once).
     """
-    orchestrator = get_orchestrator()
-    return orchestrator.get_metrics()
+    get_orchestrator()
+    orchestrators = dict(_orchestrators)
+    return {
+        **OrchestrationMetrics.combine([o.metrics for o in orchestrators.values()]).get_stats(),
+        "providers": {provider: o.get_metrics() for provider, o in orchestrators.items()},
+        "llm": LLMService.get_stats()
+    }
+
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+    Orchestration metrics in Prometheus text format
+    
+    Latency histograms per agent/outcome, per stage and per LLM role, plus
+    request and dropped-stage counters. Values are per worker process
+    (label worker=<pid>): aggregate them in Prometheus with sum by (...).
+    """
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @router.get("/agents")
@@ -251,6 +388,6 @@ async def get_config():
     return ConfigResponse(
         platforms=platforms,
         audiences=audiences,
-        llm_providers=["groq", "ollama"],
+        llm_providers=[provider.value for provider in LLMProviderEnum],
         content_types=["general", "financial", "science"]
     )
\ No newline at end of file
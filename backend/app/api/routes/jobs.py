@@ -0,0 +1,129 @@
+"""
+Rutas de trabajos asíncronos: lotes grandes fuera de la petición HTTP
+"""
+import asyncio
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from app.api.routes.content import _batch_item, _sse_event
+from app.core.config import get_settings
+from app.models.schemas import ContentRequest
+from app.services.job_queue import get_job_queue
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+class JobRequest(BaseModel):
+    """Request para encolar un trabajo de generación en lote"""
+    requests: List[ContentRequest] = Field(..., min_length=1)
+
+
+async def _get_job_or_404(job_id: str) -> dict:
+    job = await asyncio.to_thread(get_job_queue().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.post("", status_code=202)
+async def submit_job(job_request: JobRequest):
+    """
+    Encola un lote y devuelve el id del trabajo sin esperar a la generación
+    
+    El trabajo sobrevive a la desconexión del cliente y a reinicios del
+    servidor. Consultar con GET /jobs/{job_id}, /results o /stream.
+    """
+    max_items = get_settings().JOB_MAX_ITEMS
+    if len(job_request.requests) > max_items:
+        raise HTTPException(status_code=413, detail=f"A job accepts at most {max_items} requests")
+    
+    queue = get_job_queue()
+    job_id = await asyncio.to_thread(queue.submit, [_batch_item(req) for req in job_request.requests])
+    return await asyncio.to_thread(queue.get_job, job_id)
+
+
+@router.get("/stats")
+async def get_job_stats():
+    """
+    Métricas de la cola
+    
+    Returns:
+    - Items por estado (profundidad de la cola)
+    - Espera del item pendiente más antiguo
+    - Items completados en el último minuto
+    - Lag de la cola (p50/p95/p99 desde que un item está disponible hasta que empieza)
+    """
+    return await asyncio.to_thread(get_job_queue().get_stats)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Estado y progreso de un trabajo"""
+    return await _get_job_or_404(job_id)
+
+
+@router.get("/{job_id}/results")
+async def get_job_results(
+    job_id: str,
+    after: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    """
+    Items terminados después de la secuencia `after` (en orden de finalización)
+    
+    Para hacer polling, pasar el `next_after` de la respuesta anterior.
+    """
+    job = await _get_job_or_404(job_id)
+    items = await asyncio.to_thread(get_job_queue().results, job_id, after, limit)
+    return {
+        "job": job,
+        "items": items,
+        "next_after": items[-1]["seq"] if items else after
+    }
+
+
+@router.get("/{job_id}/stream")
+async def stream_job_results(job_id: str, after: int = Query(default=0, ge=0)):
+    """
+    Server-sent events con los items a medida que terminan
+    
+    Eventos:
+    - item: un item terminado (resultado o error)
+    - done: estado final del trabajo
+    
+    Si el cliente se desconecta, reconectar con `after` = última secuencia recibida.
+    """
+    await _get_job_or_404(job_id)
+    queue = get_job_queue()
+    poll_interval = get_settings().JOB_POLL_INTERVAL_SECONDS
+    
+    async def event_stream():
+        cursor = after
+        while True:
+            items = await asyncio.to_thread(queue.results, job_id, cursor)
+            for item in items:
+                cursor = item["seq"]
+                yield _sse_event("item", item)
+            if items:
+                continue
+            job = await asyncio.to_thread(queue.get_job, job_id)
+            if job["finished"]:
+                yield _sse_event("done", job)
+                return
+            await asyncio.sleep(poll_interval)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancela los items pendientes del trabajo (los que están en curso terminan)"""
+    queue = get_job_queue()
+    if not await asyncio.to_thread(queue.cancel, job_id):
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return await asyncio.to_thread(queue.get_job, job_id)
@@ -1,9 +1,11 @@
 """
 Rutas específicas para contenido científico
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel, Field
 from typing import Optional
+from app.core.config import get_settings
+from app.core.deadline import DeadlineExceeded, deadline_scope, request_deadline_seconds
 from app.rag.arxiv_loader import ArxivLoader
 from app.services.science_rag_service import ScienceRAGService
 
@@ -21,7 +23,8 @@ class ScienceContentRequest(BaseModel):
     scientific_area: str = "ai"
     platform: str = "blog"
     language:  str = "Spanish"
-    llm_provider: str = "groq"
+    llm_provider: str = Field(default_factory=lambda: get_settings().DEFAULT_LLM_PROVIDER)
+    deadline_ms: Optional[int] = Field(default=None, ge=100, le=600_000)
 
 
 @router.post("/search-papers")
@@ -50,20 +53,31 @@ async def search_arxiv_papers(request: ArxivSearchRequest):
 
 
 @router.post("/generate")
-async def generate_science_content(request: ScienceContentRequest):
-    """Genera contenido científico divulgativo con RAG"""
+async def generate_science_content(
+    request: ScienceContentRequest,
+    x_request_deadline_ms: Optional[int] = Header(default=None)
+):
+    """Genera contenido científico divulgativo con RAG (el indexado de arXiv se salta si no hay tiempo)"""
+    deadline_seconds = (
+        request_deadline_seconds(request.deadline_ms, x_request_deadline_ms)
+        or get_settings().REQUEST_DEADLINE_SECONDS
+    )
     try:
         service = ScienceRAGService(llm_provider=request.llm_provider)
         
-        result = await service.generate_content(
-            topic=request.topic,
-            scientific_area=request.scientific_area,
-            platform=request.platform,
-            language=request.language
-        )
+        with deadline_scope(deadline_seconds) as deadline:
+            result = await service.generate_content(
+                topic=request.topic,
+                scientific_area=request.scientific_area,
+                platform=request.platform,
+                language=request.language
+            )
+            result["dropped_stages"] = list(deadline.dropped) if deadline else []
         
         return result
         
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e: 
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -26,6 +26,130 @@ class Settings(BaseSettings):
     DEFAULT_GROQ_MODEL: str = "llama-3.3-70b-versatile"
     DEFAULT_OLLAMA_MODEL: str = "llama3.2"
     
+    # Pool de clientes LLM (compartido por todo el proceso)
+    LLM_POOL_MAX_CONNECTIONS: int = 100
+    LLM_POOL_MAX_KEEPALIVE: int = 20
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_REQUEST_TIMEOUT: float = 120.0
+    
+    # Ollama (cliente async nativo)
+    OLLAMA_NUM_PARALLEL: int = 4  # Igual que OLLAMA_NUM_PARALLEL en el servidor
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_PRELOAD: bool = False  # Cargar el modelo por defecto al arrancar
+    OLLAMA_REQUEST_TIMEOUT: float = 300.0
+    
+    # Provider "fake" (sin red, para pruebas de carga)
+    FAKE_LLM_MODEL: str = "fake-llm"
+    FAKE_LLM_PROFILE: str = "groq"  # instant | groq | ollama | custom
+    FAKE_LLM_TTFT_MS: float = 250.0  # sólo con perfil custom
+    FAKE_LLM_TOKENS_PER_SECOND: float = 250.0  # sólo con perfil custom
+    FAKE_LLM_JITTER: float = 0.2
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    FAKE_LLM_ERROR_STATUS: int = 500
+    FAKE_LLM_SEED: Optional[int] = None
+    
+    # Rate limiting por provider (ventana deslizante de 60 s; 0 = sin límite)
+    GROQ_RPM_LIMIT: int = 30
+    GROQ_TPM_LIMIT: int = 12000
+    OLLAMA_RPM_LIMIT: int = 0
+    OLLAMA_TPM_LIMIT: int = 0
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_LATENCY_SPIKE_FACTOR: float = 3.0
+    LLM_RATE_LIMIT_RETRIES: int = 3
+    
+    # Caché persistente de respuestas LLM (llamadas auxiliares deterministas)
+    LLM_DISK_CACHE_ENABLED: bool = True
+    LLM_DISK_CACHE_PATH: str = "./llm_cache.db"
+    LLM_DISK_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_DISK_CACHE_MAX_MB: int = 256
+    LLM_DISK_CACHE_CALL_TYPES: list[str] = ["routing", "expansion", "hyde", "compression", "extraction"]
+    
+    # Hedging: petición de respaldo si el provider principal tarda más que su percentil
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_PROVIDER: str = "ollama"
+    LLM_HEDGE_MODEL: str = ""  # vacío = modelo por defecto del provider de respaldo
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MAX_RATE: float = 0.1
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    
+    # Micro-batching de llamadas auxiliares en un único prompt multi-tarea
+    LLM_BATCHING_ENABLED: bool = True
+    LLM_BATCH_WINDOW_MS: float = 10.0
+    LLM_BATCH_MAX_TASKS: int = 6
+    
+    # Modelo por rol (call_type). Claves opcionales: "<provider>_model",
+    # "temperature" y "max_tokens"; lo que falte usa los valores por defecto.
+    # "batch" fija temperatura y tope de los prompts multi-tarea del micro-batching
+    # (el modelo es el de las tareas agrupadas); un lote se cierra antes de que la
+    # suma de los topes de sus tareas pase del suyo.
+    LLM_ROLES: dict[str, dict] = {
+        "routing": {"groq_model": "llama-3.1-8b-instant", "temperature": 0.0, "max_tokens": 100},
+        "expansion": {"groq_model": "llama-3.1-8b-instant", "temperature": 0.3, "max_tokens": 150},
+        "hyde": {"groq_model": "llama-3.1-8b-instant", "temperature": 0.5, "max_tokens": 350},
+        "compression": {"groq_model": "llama-3.1-8b-instant", "temperature": 0.0, "max_tokens": 800},
+        "extraction": {"groq_model": "llama-3.1-8b-instant", "temperature": 0.0, "max_tokens": 700},
+        "batch": {"temperature": 0.2, "max_tokens": 2048},
+        "generation": {"temperature": 0.7},
+    }
+    
+    # Routing especulativo: el agente elegido por keywords arranca mientras el
+    # router LLM decide; si discrepan se cancela y se relanza con el del LLM
+    SPECULATIVE_ROUTING_ENABLED: bool = False
+    # Caché de decisiones de routing por tema normalizado (minúsculas, sin
+    # acentos ni puntuación; con stemming ligero opcional). La misma
+    # normalización entra en la clave de la caché de resultados
+    ROUTING_CACHE_TTL_SECONDS: int = 6 * 3600
+    ROUTING_CACHE_MAX_ENTRIES: int = 2048
+    TOPIC_NORMALIZE_STEM: bool = False
+    # Los lotes usan el router de keywords compilado (sin llamada LLM por tema)
+    BATCH_SMART_ROUTING: bool = False
+    # Router local por centroides de embeddings: sólo se llama al router LLM
+    # si el tema es ambiguo (similitud < umbral o poca ventaja sobre el 2º)
+    CENTROID_ROUTING_ENABLED: bool = True
+    CENTROID_ROUTING_THRESHOLD: float = 0.40
+    CENTROID_ROUTING_MARGIN: float = 0.10
+    # Peso máximo de la media móvil de cada centroide (aprendizaje online)
+    CENTROID_ROUTING_MAX_WEIGHT: int = 200
+    
+    # Deadline por petición (segundos; 0 = sin deadline: sólo se aplica el que
+    # pida el cliente con deadline_ms). Cada etapa usa el tiempo que le queda;
+    # las opcionales se saltan si no llegan a su mínimo sin tocar la reserva
+    # de la generación final
+    REQUEST_DEADLINE_SECONDS: float = 0.0
+    REQUEST_DEADLINE_MAX_SECONDS: float = 600.0
+    DEADLINE_GENERATION_RESERVE_SECONDS: float = 8.0
+    DEADLINE_STAGE_MIN_SECONDS: dict[str, float] = {
+        "smart_routing": 0.5,
+        "expansion": 0.5,
+        "hyde": 1.0,
+        "rerank": 0.5,
+        "compression": 1.0,
+        "auto_learn": 1.0,
+        "mcp": 2.0,
+        "arxiv_index": 5.0,
+        "image": 1.0,
+    }
+    
+    # Cola persistente de trabajos (lotes grandes fuera de la petición HTTP)
+    JOB_QUEUE_PATH: str = "./jobs.db"
+    # Workers dentro del proceso de la API (0 = este proceso sólo encola)
+    JOB_WORKERS: int = 2
+    # Items que un worker toma de una vez de un mismo trabajo (planificados juntos)
+    JOB_CLAIM_BATCH: int = 5
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    # Un item en curso cuyo worker desaparece vuelve a la cola pasado este tiempo
+    JOB_LEASE_SECONDS: float = 900.0
+    # Al arrancar, devolver a la cola todos los items en curso sin esperar a su
+    # lease. Sólo con un único proceso: con varios workers de uvicorn sobre el
+    # mismo fichero se regenerarían los items que otro proceso tiene en curso
+    JOB_RECOVER_ON_START: bool = False
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    # Los trabajos terminados se borran pasado este tiempo (0 = conservarlos)
+    JOB_RETENTION_SECONDS: float = 604800.0
+    JOB_MAX_ITEMS: int = 1000
+    
     # LangSmith (Trazabilidad)
     LANGCHAIN_TRACING_V2: bool = True
     LANGCHAIN_ENDPOINT: str = "https://api.smith.langchain.com"
@@ -34,6 +158,8 @@ class Settings(BaseSettings):
     
     # Pollinations (Imágenes IA)
     POLLINATIONS_API_KEY: Optional[str] = None
+    # Espera máxima por la imagen una vez generado el contenido (arranca en el routing)
+    IMAGE_JOIN_TIMEOUT_SECONDS: float = 5.0
     
         # ChromaDB (RAG)
     CHROMA_PERSIST_DIR: str = "./chroma_db"
@@ -42,6 +168,24 @@ class Settings(BaseSettings):
     # Embeddings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     
+    # Caché exacta de resultados del orquestador (LRU + TTL, acotada en bytes)
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+    RESULT_CACHE_COMPRESS: bool = True
+    # Refresco anticipado probabilístico (XFetch); 0 lo desactiva
+    RESULT_CACHE_EARLY_REFRESH_BETA: float = 1.0
+    # L2 compartido entre workers y reinicios: "sqlite", "redis" o "" (sólo L1)
+    RESULT_CACHE_L2: str = "sqlite"
+    RESULT_CACHE_L2_PATH: str = "./result_cache.db"
+    RESULT_CACHE_L2_URL: str = "redis://localhost:6379/0"
+    RESULT_CACHE_L2_MAX_MB: int = 256
+    
+    # Caché semántica de peticiones (temas casi idénticos)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 500
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    
     class Config: 
         env_file = ".env"
         extra = "ignore"
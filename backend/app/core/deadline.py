@@ -0,0 +1,243 @@
+"""
+Deadlines por petición propagados a todas las etapas de la orquestación
+"""
+import asyncio
+import inspect
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app.core.timing import stage as timed
+
+settings = get_settings()
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el tiempo de la petición en una etapa obligatoria"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline de la petición agotado en la etapa '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Instante límite de una petición y registro de las etapas descartadas.
+
+    - Las etapas obligatorias (la generación final) pueden usar todo el tiempo
+      restante; si se agota, DeadlineExceeded
+    - Las etapas opcionales (routing LLM, HyDE, MCP, indexado de arXiv,
+      imagen...) sólo se ejecutan si les queda su presupuesto mínimo
+      (DEADLINE_STAGE_MIN_SECONDS) sin tocar la reserva de la generación, y
+      se cancelan al agotarlo; quedan en `dropped`
+    """
+
+    def __init__(self, seconds: float, reserve_seconds: Optional[float] = None):
+        self.budget_seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        if reserve_seconds is None:
+            reserve_seconds = settings.DEADLINE_GENERATION_RESERVE_SECONDS
+        # Con deadlines cortos la reserva no se come todo el presupuesto
+        self.reserve_seconds = min(reserve_seconds, seconds * 0.5)
+        self.dropped: List[str] = []
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage_budget(self, reserve: bool = True) -> float:
+        """Segundos disponibles para una etapa opcional"""
+        return max(self.remaining() - (self.reserve_seconds if reserve else 0.0), 0.0)
+
+    def allows(self, stage: str, reserve: bool = True) -> bool:
+        """Si a la etapa le queda al menos su presupuesto mínimo"""
+        minimum = settings.DEADLINE_STAGE_MIN_SECONDS.get(stage, 0.0)
+        budget = self.stage_budget(reserve)
+        return budget > 0 and budget >= minimum
+
+    def drop(self, stage: str):
+        if stage not in self.dropped:
+            self.dropped.append(stage)
+
+    def fork(self) -> "Deadline":
+        """Copia independiente (mismo límite y reserva) para un trabajo compartido"""
+        deadline = Deadline(self.budget_seconds, self.reserve_seconds)
+        deadline.expires_at = self.expires_at
+        deadline.dropped = list(self.dropped)
+        return deadline
+
+    def extend(self, other: Optional["Deadline"]):
+        """Amplía el límite hasta el de otra petición que espera el mismo trabajo (None: sin límite)"""
+        self.expires_at = max(self.expires_at, other.expires_at if other is not None else math.inf)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline de la petición en curso (None si no tiene)"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    Fija el deadline de la petición para todo lo que se ejecute dentro
+    (incluidas las tasks y threads que se lancen desde aquí).
+    Sin segundos (o <= 0) se mantiene el deadline actual, si lo hay; si ya
+    hay uno más estricto, se respeta ese.
+    """
+    outer = _current_deadline.get()
+    if not seconds or seconds <= 0 or (outer is not None and outer.remaining() <= seconds):
+        yield outer
+        return
+    deadline = Deadline(min(seconds, settings.REQUEST_DEADLINE_MAX_SECONDS))
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+        # Las etapas descartadas también cuentan para la petición exterior
+        if outer is not None:
+            for stage in deadline.dropped:
+                outer.drop(stage)
+
+
+@contextmanager
+def replace_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """
+    Fija deadline para todo lo de dentro aunque el actual sea más estricto:
+    para trabajo compartido por varias peticiones (single-flight), que no
+    debe heredar el deadline de la que lo lanzó
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def request_deadline_seconds(*deadlines_ms: Optional[int]) -> Optional[float]:
+    """Deadline pedido por el cliente en segundos: el más estricto de los dados en ms (campo, cabecera)"""
+    candidates = [ms for ms in deadlines_ms if ms and ms > 0]
+    return min(candidates) / 1000 if candidates else None
+
+
+def remaining_time(cap: Optional[float] = None) -> Optional[float]:
+    """Segundos restantes acotados por cap (cap si no hay deadline)"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.remaining() if cap is None else min(deadline.remaining(), cap)
+
+
+def stage_allowed(stage: str, reserve: bool = True) -> bool:
+    """Para etapas opcionales síncronas: False (y se anota) si no hay tiempo"""
+    deadline = _current_deadline.get()
+    if deadline is None or deadline.allows(stage, reserve):
+        return True
+    deadline.drop(stage)
+    return False
+
+
+def drop_stage(stage: str):
+    """Anota una etapa opcional descartada por otro motivo de tiempo (p. ej. su propio timeout)"""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.drop(stage)
+
+
+def _discard(awaitable: Awaitable):
+    """Evita el aviso 'coroutine was never awaited' de una etapa saltada"""
+    if inspect.iscoroutine(awaitable):
+        awaitable.close()
+    elif isinstance(awaitable, asyncio.Future):
+        awaitable.cancel()
+
+
+async def _wait_within(awaitable: Awaitable, budget: Callable[[], float]) -> Any:
+    """
+    Como asyncio.wait_for, pero al vencer vuelve a consultar budget(): el
+    deadline de un trabajo compartido se puede ampliar mientras se espera
+    (ver Deadline.extend). asyncio.TimeoutError si de verdad se agotó.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=budget())
+            if done:
+                return task.result()
+            if budget() <= 0:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise asyncio.TimeoutError()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def optional_stage(stage: str, awaitable: Awaitable, default: Any = None, reserve: bool = True) -> Any:
+    """
+    Ejecuta (y mide) una etapa opcional dentro de su presupuesto. Si no le
+    queda tiempo o lo agota, devuelve default y la etapa queda como descartada.
+    reserve=False para etapas que no compiten con la generación final
+    (p. ej. la imagen, que va en paralelo o después).
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        with timed(stage):
+            return await awaitable
+    if not deadline.allows(stage, reserve):
+        _discard(awaitable)
+        deadline.drop(stage)
+        return default
+    try:
+        with timed(stage):
+            return await _wait_within(awaitable, lambda: deadline.stage_budget(reserve))
+    except asyncio.TimeoutError:
+        deadline.drop(stage)
+        return default
+
+
+async def required_stage(stage: str, awaitable: Awaitable) -> Any:
+    """Ejecuta una etapa obligatoria con todo el tiempo restante (DeadlineExceeded si se agota)"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    if deadline.expired:
+        _discard(awaitable)
+        raise DeadlineExceeded(stage)
+    try:
+        return await _wait_within(awaitable, deadline.remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage)
+
+
+async def iterate_within_deadline(stage: str, iterator: AsyncIterator) -> AsyncIterator:
+    """Recorre un stream obligatorio sin esperar a ningún elemento más allá del deadline"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        async for item in iterator:
+            yield item
+        return
+    try:
+        while True:
+            if deadline.expired:
+                raise DeadlineExceeded(stage)
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), timeout=deadline.remaining())
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(stage)
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,288 @@
+"""
+Histogramas de latencia y contadores del proceso en formato Prometheus
+"""
+import math
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Límites superiores (segundos) de los buckets por defecto: de 5 ms a 2 min
+DEFAULT_BUCKETS_SECONDS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos: observe() es una búsqueda binaria y un
+    incremento (sin guardar muestras), y los percentiles se estiman
+    interpolando dentro del bucket
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_SECONDS):
+        self.buckets = tuple(sorted(buckets))
+        # Un contador por bucket más el de +Inf (no acumulados)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        """Conteos acumulados por bucket, terminando en +Inf (como los 'le' de Prometheus)"""
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        cumulative = []
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Estimación del percentil (None sin observaciones)"""
+        cumulative = self.cumulative_counts()
+        total = cumulative[-1]
+        if not total:
+            return None
+        rank = total * percentile / 100
+        for index, upto in enumerate(cumulative):
+            if upto >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    # Por encima del último límite sólo se sabe que es mayor
+                    return lower
+                below = cumulative[index - 1] if index > 0 else 0
+                in_bucket = upto - below
+                fraction = (rank - below) / in_bucket if in_bucket else 1.0
+                return lower + (self.buckets[index] - lower) * fraction
+        return self.buckets[-1]
+
+    def get_stats(self, scale: float = 1000.0) -> dict:
+        """count, media y p50/p95/p99 (por defecto en ms)"""
+        def scaled(value: Optional[float]) -> Optional[float]:
+            return round(value * scale, 2) if value is not None else None
+
+        return {
+            "count": self.count,
+            "avg_ms": scaled(self.sum / self.count) if self.count else None,
+            "p50_ms": scaled(self.percentile(50)),
+            "p95_ms": scaled(self.percentile(95)),
+            "p99_ms": scaled(self.percentile(99)),
+        }
+
+
+class HistogramFamily:
+    """Un histograma por combinación de etiquetas (agente, etapa, rol...)"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS_SECONDS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children: Dict[LabelValues, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: float, *label_values: str):
+        self.labels(*label_values).observe(value)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Resumen por etiquetas ("a/b" si hay varias)"""
+        return {"/".join(key): child.get_stats() for key, child in sorted(self._children.items())}
+
+    def render(self, extra_label: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, child in sorted(self._children.items()):
+            cumulative = child.cumulative_counts()
+            for bound, count in zip(self.buckets + (math.inf,), cumulative):
+                labels = _format_labels(
+                    self.label_names + ("le",), key + (_format_value(bound),), extra_label
+                )
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key, extra_label)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative[-1]}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+
+class CounterFamily:
+    """Contador monótono por combinación de etiquetas"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        key = tuple(str(value) for value in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(tuple(str(value) for value in label_values), 0.0)
+
+    def render(self, extra_label: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key, extra_label)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class GaugeFamily:
+    """Valor instantáneo (profundidad de una cola...) por combinación de etiquetas"""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values: str):
+        key = tuple(str(label) for label in label_values)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(tuple(str(value) for value in label_values), 0.0)
+
+    def render(self, extra_label: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key, extra_label)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso. Cada worker expone las suyas con la etiqueta
+    worker (su pid) para que Prometheus pueda agregarlas con sum by (...)
+    sin mezclar series de procesos distintos.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, object] = {}
+
+    def histogram(self, name: str, description: str, label_names: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS_SECONDS) -> HistogramFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = HistogramFamily(name, description, tuple(label_names), buckets)
+        return family
+
+    def counter(self, name: str, description: str, label_names: Iterable[str] = ()) -> CounterFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = CounterFamily(name, description, tuple(label_names))
+        return family
+
+    def gauge(self, name: str, description: str, label_names: Iterable[str] = ()) -> GaugeFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = GaugeFamily(name, description, tuple(label_names))
+        return family
+
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (0.0.4)"""
+        worker = f'worker="{os.getpid()}"'
+        lines: List[str] = []
+        for family in self._families.values():
+            lines.extend(family.render(worker))
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for family in self._families.values():
+            family.clear()
+
+
+# Registro compartido por todo el proceso
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "orchestrator_request_duration_seconds",
+    "End-to-end latency of orchestrated requests",
+    ("agent", "outcome")
+)
+STAGE_LATENCY = registry.histogram(
+    "orchestrator_stage_duration_seconds",
+    "Latency of each orchestration stage (routing, agent, image...)",
+    ("stage",)
+)
+LLM_LATENCY = registry.histogram(
+    "llm_call_duration_seconds",
+    "Latency of LLM calls per role",
+    ("role", "model")
+)
+REQUESTS = registry.counter(
+    "orchestrator_requests_total",
+    "Orchestrated requests by agent and outcome",
+    ("agent", "outcome")
+)
+DROPPED_STAGES = registry.counter(
+    "orchestrator_dropped_stages_total",
+    "Optional stages dropped to meet the request deadline",
+    ("stage",)
+)
+JOB_QUEUE_LAG = registry.histogram(
+    "job_queue_lag_seconds",
+    "Time job items wait in the queue until a worker starts them"
+)
+JOB_ITEMS = registry.counter(
+    "job_items_total",
+    "Job items processed by outcome (done, retried, failed)",
+    ("outcome",)
+)
+JOB_QUEUE_DEPTH = registry.gauge(
+    "job_queue_depth",
+    "Job items by status (pending, running)",
+    ("status",)
+)
@@ -1,6 +1,10 @@
 """
 Sistema de prompts para diferentes plataformas y audiencias
 """
+from app.core.tokens import count_tokens, template_tokens, truncate_to_tokens
+
+# Contexto mínimo que se deja aunque la plantilla ya ocupe todo el presupuesto
+MIN_CONTEXT_TOKENS = 200
 
 PLATFORM_CONFIGS = {
     "blog": {
@@ -9,7 +13,9 @@ PLATFORM_CONFIGS = {
         "style": "informativo, detallado, con subtítulos y párrafos bien estructurados",
         "elements": "introducción enganchadora, desarrollo con subtítulos H2/H3, conclusión, llamada a la acción",
         "tone": "profesional pero accesible",
-        "format_instructions": "Usa formato Markdown con encabezados, listas y negritas donde sea apropiado."
+        "format_instructions": "Usa formato Markdown con encabezados, listas y negritas donde sea apropiado.",
+        "max_tokens": 4096,  # Tope de salida del LLM
+        "prompt_tokens": 4500  # Presupuesto del prompt completo (plantilla + contexto)
     },
     "twitter":  {
         "name": "Twitter/X",
@@ -17,7 +23,9 @@ PLATFORM_CONFIGS = {
         "style": "conciso, impactante, con gancho inicial",
         "elements": "mensaje principal directo, hashtags relevantes (máximo 3), emoji estratégico",
         "tone": "directo, engaging y memorable",
-        "format_instructions":  "Un solo tweet.  Los hashtags al final.  Máximo 280 caracteres TOTAL."
+        "format_instructions":  "Un solo tweet.  Los hashtags al final.  Máximo 280 caracteres TOTAL.",
+        "max_tokens": 150,  # Tope de salida del LLM
+        "prompt_tokens": 1500  # Presupuesto del prompt completo (plantilla + contexto)
     },
     "instagram": {
         "name":  "Instagram",
@@ -25,7 +33,9 @@ PLATFORM_CONFIGS = {
         "style": "visual, emotivo, storytelling personal",
         "elements": "gancho en primera línea, historia o valor, emojis naturales, hashtags (10-15 relevantes), CTA",
         "tone": "cercano, auténtico y inspirador",
-        "format_instructions": "Primera línea debe captar atención.  Separa hashtags con salto de línea al final."
+        "format_instructions": "Primera línea debe captar atención.  Separa hashtags con salto de línea al final.",
+        "max_tokens": 700,  # Tope de salida del LLM
+        "prompt_tokens": 2000  # Presupuesto del prompt completo (plantilla + contexto)
     },
     "linkedin":  {
         "name": "LinkedIn",
@@ -33,7 +43,9 @@ PLATFORM_CONFIGS = {
         "style": "profesional con toque personal, insights de valor",
         "elements": "gancho inicial potente, desarrollo con puntos clave, reflexión final o pregunta",
         "tone": "experto pero humano, que invite a la conversación",
-        "format_instructions": "Usa saltos de línea para facilitar lectura. Primera línea es crucial."
+        "format_instructions": "Usa saltos de línea para facilitar lectura. Primera línea es crucial.",
+        "max_tokens": 600,  # Tope de salida del LLM
+        "prompt_tokens": 2500  # Presupuesto del prompt completo (plantilla + contexto)
     }
 }
 
@@ -71,6 +83,30 @@ AUDIENCE_CONFIGS = {
 }
 
 
+def get_platform_config(platform: str) -> dict:
+    """Configuración de la plataforma (blog si no se conoce)"""
+    return PLATFORM_CONFIGS.get(platform, PLATFORM_CONFIGS["blog"])
+
+
+def get_max_tokens(platform: str) -> int:
+    """Tope de tokens de salida acorde a la longitud real de la plataforma"""
+    return get_platform_config(platform)["max_tokens"]
+
+
+def get_context_budget(platform: str, template: str, *fixed_values: str) -> int:
+    """
+    Tokens disponibles para contexto recuperado (grafo, papers, mercado...):
+    presupuesto del prompt de la plataforma menos la parte fija de la
+    plantilla y los valores fijos que se insertan en ella (tema, idioma...)
+    """
+    budget = (
+        get_platform_config(platform)["prompt_tokens"]
+        - template_tokens(template)
+        - sum(count_tokens(value) for value in fixed_values)
+    )
+    return max(budget, MIN_CONTEXT_TOKENS)
+
+
 def build_content_prompt(
     topic: str,
     platform: str,
@@ -82,9 +118,15 @@ def build_content_prompt(
     """
     Construye el prompt optimizado para generación de contenido
     """
-    platform_config = PLATFORM_CONFIGS.get(platform, PLATFORM_CONFIGS["blog"])
+    platform_config = get_platform_config(platform)
     audience_config = AUDIENCE_CONFIGS.get(audience, AUDIENCE_CONFIGS["general"])
     
+    # El contexto adicional ocupa lo que deja libre el resto del prompt
+    if additional_context:
+        base_tokens = count_tokens(build_content_prompt(topic, platform, audience, "", tone, language))
+        budget = max(platform_config["prompt_tokens"] - base_tokens, MIN_CONTEXT_TOKENS)
+        additional_context = truncate_to_tokens(additional_context, budget)
+    
     prompt = f"""Eres un experto creador de contenido digital con años de experiencia en {platform_config['name']}.
 Tu contenido siempre genera alto engagement y aporta valor real a la audiencia.
 
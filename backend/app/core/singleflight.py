@@ -0,0 +1,63 @@
+"""
+Single-flight: agrupa llamadas concurrentes idénticas en una sola ejecución
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Mientras una llamada con una clave está en curso, las siguientes con la
+    misma clave esperan su resultado en lugar de repetir el trabajo.
+
+    - El trabajo corre en una Task propia: cancelar a uno de los que esperan
+      (incluido el que la lanzó) no cancela el trabajo de los demás
+    - Si se cancelan todos los que esperan, el trabajo se cancela
+    - Los errores se propagan a todos los que esperan y no se cachean
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta factory() o se une a la ejecución en curso con la misma clave"""
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    self._forget(key, task)
+                    task.cancel()
+            raise
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def get_stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "executions": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / max(total, 1) * 100, 2),
+            "in_flight": self.in_flight()
+        }
@@ -0,0 +1,126 @@
+"""
+Tiempos por etapa de una petición (routing, MCP, embeddings, rerank, LLM...)
+propagados con contextvars a todas las capas
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, Optional, Tuple
+
+from app.core.metrics import STAGE_LATENCY
+
+
+class StageTimings:
+    """
+    Inicio/fin de cada etapa en ms desde el inicio de la petición, para ver
+    qué etapas se solapan (imagen y agente, routing especulativo...).
+
+    - Las etapas anidadas se guardan con su ruta ("agent.prepare.rerank")
+    - Una etapa que se repite (p. ej. varios embeddings) acumula su
+      duración y cuenta las llamadas; start_ms es el de la primera y end_ms
+      el de la última
+    """
+
+    def __init__(self, start_time: Optional[float] = None):
+        self.start_time = start_time if start_time is not None else time.time()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self) -> float:
+        return round((time.time() - self.start_time) * 1000, 1)
+
+    def record(self, stage: str, started_ms: float):
+        """Etapa que empezó en started_ms y termina ahora (también al histograma)"""
+        ended = self._elapsed_ms()
+        duration = round(ended - started_ms, 1)
+        with self._lock:
+            timing = self._stages.get(stage)
+            if timing is None:
+                self._stages[stage] = {"start_ms": started_ms, "end_ms": ended, "duration_ms": duration}
+            else:
+                timing["start_ms"] = min(timing["start_ms"], started_ms)
+                timing["end_ms"] = max(timing["end_ms"], ended)
+                timing["duration_ms"] = round(timing["duration_ms"] + duration, 1)
+                timing["calls"] = timing.get("calls", 1) + 1
+        STAGE_LATENCY.observe(duration / 1000, stage)
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Etapas terminadas por ruta ("agent.prepare.rerank")"""
+        with self._lock:
+            return {stage: dict(timing) for stage, timing in self._stages.items()}
+
+    def tree(self) -> Dict[str, dict]:
+        """Las mismas etapas anidadas: cada una con sus subetapas en "stages" """
+        return timings_tree(self.to_dict())
+
+
+def timings_tree(flat: Dict[str, Dict[str, float]]) -> Dict[str, dict]:
+    """Convierte {"agent.prepare": {...}} en {"agent": {"stages": {"prepare": {...}}}}"""
+    tree: Dict[str, dict] = {}
+    for path in sorted(flat, key=lambda path: path.count(".")):
+        node = tree
+        *parents, name = path.split(".")
+        for parent in parents:
+            node = node.setdefault(parent, {}).setdefault("stages", {})
+        node.setdefault(name, {}).update(flat[path])
+    return tree
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+_stage_path: ContextVar[Tuple[str, ...]] = ContextVar("stage_path", default=())
+
+
+def current_timings() -> Optional[StageTimings]:
+    """Tiempos de la petición en curso (None fuera de timing_scope)"""
+    return _current_timings.get()
+
+
+@contextmanager
+def timing_scope(start_time: Optional[float] = None) -> Iterator[StageTimings]:
+    """
+    Registra los tiempos de todo lo que se ejecute dentro (incluidas tasks
+    y threads lanzados desde aquí). Si ya hay un scope abierto (p. ej. el
+    de la ruta HTTP) se reutiliza.
+    """
+    outer = _current_timings.get()
+    if outer is not None:
+        yield outer
+        return
+    timings = StageTimings(start_time)
+    token = _current_timings.set(timings)
+    path_token = _stage_path.set(())
+    try:
+        yield timings
+    finally:
+        _stage_path.reset(path_token)
+        _current_timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Mide una etapa, anidada bajo la etapa en curso. Siempre alimenta el
+    histograma de latencias; dentro de timing_scope también queda en los
+    tiempos de la petición.
+    """
+    path = _stage_path.get() + (name,)
+    key = ".".join(path)
+    timings = _current_timings.get()
+    token = _stage_path.set(path)
+    started = time.perf_counter()
+    started_ms = timings._elapsed_ms() if timings is not None else 0.0
+    try:
+        yield
+    finally:
+        _stage_path.reset(token)
+        if timings is not None:
+            timings.record(key, started_ms)
+        else:
+            STAGE_LATENCY.observe(time.perf_counter() - started, key)
+
+
+async def timed_stage(name: str, awaitable: Awaitable) -> Any:
+    """Await dentro de stage(name)"""
+    with stage(name):
+        return await awaitable
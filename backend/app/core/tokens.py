@@ -0,0 +1,149 @@
+"""
+Conteo de tokens y reparto de presupuestos de tokens para los prompts
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken es opcional: sin él se estima por caracteres
+    tiktoken = None
+
+# Codificación de referencia. Los modelos Llama/Mixtral usan otro tokenizer,
+# pero cl100k da cuentas muy parecidas y es suficiente para presupuestar.
+ENCODING_NAME = "cl100k_base"
+CHARS_PER_TOKEN = 4
+
+# Un texto que no cabe se recorta sólo si quedan al menos estos tokens libres
+MIN_USEFUL_TOKENS = 32
+
+_PLACEHOLDER = re.compile(r"(?<!\{)\{[a-z_]+\}(?!\})")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Tokenizer cargado una sola vez por proceso (None si no hay tiktoken)"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Número de tokens de un texto"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max((len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN, 1)
+
+
+@lru_cache(maxsize=64)
+def template_tokens(template: str) -> int:
+    """Tokens de la parte fija de una plantilla (sin sus {placeholders}); se calcula una vez"""
+    return count_tokens(_PLACEHOLDER.sub("", template))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Recorta un texto a max_tokens, cortando en un límite de frase o palabra si es posible"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        truncated = text[:max_tokens * CHARS_PER_TOKEN]
+
+    # Preferir terminar en una frase completa, si no se pierde demasiado
+    sentence_end = max(truncated.rfind(". "), truncated.rfind(".\n"), truncated.rfind("\n"))
+    if sentence_end > len(truncated) * 0.6:
+        return truncated[:sentence_end + 1].rstrip()
+    word_end = truncated.rfind(" ")
+    if word_end > len(truncated) * 0.8:
+        truncated = truncated[:word_end]
+    return truncated.rstrip() + "..."
+
+
+def pack_texts(texts: Sequence[str], max_tokens: int, separator: str = "\n\n") -> List[str]:
+    """
+    Mete textos en orden (el más relevante primero) hasta llenar max_tokens.
+    El primero que no cabe entero se recorta si quedan al menos MIN_USEFUL_TOKENS.
+    """
+    packed = []
+    remaining = max_tokens
+    separator_tokens = count_tokens(separator)
+
+    for text in texts:
+        cost = count_tokens(text) + (separator_tokens if packed else 0)
+        if cost <= remaining:
+            packed.append(text)
+            remaining -= cost
+            continue
+        available = remaining - (separator_tokens if packed else 0)
+        if available >= MIN_USEFUL_TOKENS:
+            packed.append(truncate_to_tokens(text, available))
+        break
+    return packed
+
+
+class TokenBudgeter:
+    """
+    Reparte un presupuesto de tokens de contexto entre varias secciones
+    (grafo, papers, datos de mercado...).
+
+    Cada sección recibe una parte proporcional a su peso; lo que una sección
+    no necesita se redistribuye entre las que sí lo necesitan. Dentro de cada
+    sección los textos se meten en orden con pack_texts().
+    """
+
+    def __init__(self, total_tokens: int, separator: str = "\n\n"):
+        self.total_tokens = max(total_tokens, 0)
+        self.separator = separator
+
+    def allocate(self, needs: Dict[str, int], weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+        """Tokens asignados a cada sección según lo que necesita y su peso"""
+        weights = weights or {}
+        allocation = {name: 0 for name in needs}
+        pending = {name for name, need in needs.items() if need > 0}
+        remaining = self.total_tokens
+
+        while pending and remaining > 0:
+            total_weight = sum(weights.get(name, 1.0) for name in pending)
+            shares = {name: int(remaining * weights.get(name, 1.0) / total_weight) for name in pending}
+            satisfied = {name for name in pending if needs[name] - allocation[name] <= shares[name]}
+
+            if not satisfied:
+                # Nadie cabe entero: repartir lo que queda y terminar
+                for name in pending:
+                    allocation[name] += shares[name]
+                break
+            for name in satisfied:
+                granted = needs[name] - allocation[name]
+                allocation[name] += granted
+                remaining -= granted
+            pending -= satisfied
+        return allocation
+
+    def pack(
+        self,
+        sections: Dict[str, Sequence[str]],
+        weights: Optional[Dict[str, float]] = None
+    ) -> Dict[str, str]:
+        """Texto final de cada sección dentro del presupuesto total"""
+        separator_tokens = count_tokens(self.separator)
+        needs = {
+            name: sum(count_tokens(text) for text in texts) + separator_tokens * max(len(texts) - 1, 0)
+            for name, texts in sections.items()
+        }
+        allocation = self.allocate(needs, weights)
+        return {
+            name: self.separator.join(pack_texts(texts, allocation[name], self.separator))
+            for name, texts in sections.items()
+        }
@@ -1,19 +1,66 @@
 """
 Aplicación principal FastAPI
 """
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import get_settings
 from app.api.routes import api_router
+from app.api.routes.content import get_orchestrator
+from app.services.job_queue import JobWorkerPool, get_job_queue
+from app.services.llm_service import LLMService, client_registry
 
 settings = get_settings()
 
+# Workers de la cola de trabajos (arrancan con la aplicación si JOB_WORKERS > 0)
+job_workers: Optional[JobWorkerPool] = None
+
+
+async def start_job_workers() -> Optional[JobWorkerPool]:
+    """Arranca los workers (y, con JOB_RECOVER_ON_START, devuelve a la cola los items interrumpidos)"""
+    if settings.JOB_WORKERS <= 0:
+        return None
+    # Abre (y crea si hace falta) el fichero fuera del event loop
+    queue = await asyncio.to_thread(get_job_queue)
+    if settings.JOB_RECOVER_ON_START:
+        recovered = await asyncio.to_thread(queue.recover)
+        if recovered:
+            print(f"Job queue: {recovered} interrupted items requeued")
+    workers = JobWorkerPool(queue, get_orchestrator)
+    workers.start()
+    return workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque: precarga el modelo de Ollama (la primera petición no paga la
+    carga) y arranca los workers de la cola de trabajos.
+    Parada: para los workers (lo que tenían en curso vuelve a la cola) y
+    cierra los pools HTTP compartidos de los clientes LLM.
+    """
+    global job_workers
+    if settings.OLLAMA_PRELOAD:
+        await LLMService(provider="ollama").preload()
+    job_workers = await start_job_workers()
+    try:
+        yield
+    finally:
+        if job_workers is not None:
+            await job_workers.stop()
+            job_workers = None
+        await client_registry.aclose()
+
+
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
     description="API para generación de contenido con IA para diferentes plataformas",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -2,8 +2,9 @@
 Schemas de Pydantic para validación de datos (actualizado)
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Any, Optional, List, Dict
 from enum import Enum
+from app.core.config import get_settings
 
 
 class LanguageEnum(str, Enum):
@@ -32,6 +33,7 @@ class AudienceEnum(str, Enum):
 class LLMProviderEnum(str, Enum):
     GROQ = "groq"
     OLLAMA = "ollama"
+    FAKE = "fake"  # Sin red, respuestas deterministas (pruebas de carga)
 
 
 class ContentTypeEnum(str, Enum):
@@ -47,9 +49,15 @@ class ContentRequest(BaseModel):
     audience: AudienceEnum = AudienceEnum.GENERAL
     additional_context: Optional[str] = Field(default="", max_length=1000)
     tone: Optional[str] = Field(default="", max_length=200)
-    llm_provider: LLMProviderEnum = LLMProviderEnum.GROQ
+    llm_provider: LLMProviderEnum = Field(
+        default_factory=lambda: LLMProviderEnum(get_settings().DEFAULT_LLM_PROVIDER)
+    )
     language: str = Field(default="Spanish")
     content_type: Optional[ContentTypeEnum] = None  # NUEVO:  Para forzar tipo de agente
+    # Tiempo máximo de la petición (también vía cabecera X-Request-Deadline-Ms)
+    deadline_ms: Optional[int] = Field(default=None, ge=100, le=600_000)
+    # Incluye en la respuesta los tiempos por etapa (stage_timings_ms)
+    debug: bool = False
 
 
 class SourceInfo(BaseModel):
@@ -78,6 +86,15 @@ class ContentResponse(BaseModel):
     processing_time_ms: Optional[float] = Field(None, description="Total processing time in ms")
     routing_reason: Optional[str] = Field(None, description="Explanation of routing decision")
     from_cache: bool = Field(False, description="Whether result was served from cache")
+    dropped_stages: List[str] = Field(
+        default_factory=list,
+        description="Optional stages skipped or cancelled to meet the request deadline"
+    )
+    stage_timings_ms: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Debug only: start/end/duration (ms since request start) of each stage, "
+                    "with nested sub-stages under \"stages\""
+    )
 
 
 class PlatformInfo(BaseModel):
@@ -8,6 +8,7 @@ import json
 import re
 import os
 from difflib import SequenceMatcher
+from app.core.tokens import truncate_to_tokens
 
 
 class KnowledgeGraph: 
@@ -26,6 +27,9 @@ class KnowledgeGraph:
         "uses", "improves", "extends", "applies_to", "requires"
     ]
     
+    # Max tokens of source text sent to the LLM for entity extraction
+    EXTRACTION_INPUT_TOKENS = 500
+    
     def __init__(self, persist_path: Optional[str] = None):
         self.graph = nx.DiGraph()
         self.persist_path = persist_path
@@ -90,7 +94,7 @@ class KnowledgeGraph:
         extraction_prompt = f"""Extract scientific entities and their relationships from this text.
 
 TEXT:
-{text[:2000]}
+{truncate_to_tokens(text, self.EXTRACTION_INPUT_TOKENS)}
 
 Respond ONLY with valid JSON in this exact format:
 {{
@@ -106,7 +110,7 @@ Focus on key scientific concepts, technologies, and their relationships.
 Return at most 10 entities and 15 relations.
 """
         try:
-            response = await llm_service.generate(extraction_prompt)
+            response = await llm_service.generate(extraction_prompt, call_type="extraction", batchable=True)
             
             # Parse JSON from response
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
@@ -5,14 +5,28 @@ Enhanced with: chunking, reranking, relevance filtering, and hybrid search
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer, CrossEncoder
+from functools import lru_cache
 from typing import List
 import re
 from app.core.config import get_settings
+from app.core.deadline import stage_allowed
+from app.core.timing import stage
 from app.rag.arxiv_loader import ArxivLoader, ArxivDocument
 
 settings = get_settings()
 
 
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name: str = settings.EMBEDDING_MODEL) -> SentenceTransformer:
+    """Modelo de embeddings compartido por proceso (se carga una sola vez)"""
+    return SentenceTransformer(model_name)
+
+
+def is_embedding_model_loaded() -> bool:
+    """True si algún componente ya cargó el modelo de embeddings"""
+    return get_embedding_model.cache_info().currsize > 0
+
+
 class TextChunker:
     """Intelligent text chunking for better retrieval"""
     
@@ -99,7 +113,7 @@ class VectorStore:
         )
         
         # Modelo de embeddings (bi-encoder for retrieval)
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        self.embedding_model = get_embedding_model()
         
         # Cross-encoder for reranking (lazy loaded)
         self._reranker = None
@@ -116,18 +130,23 @@ class VectorStore:
     
     def _get_embedding(self, text: str) -> List[float]:
         """Genera embedding para un texto"""
-        return self.embedding_model.encode(text).tolist()
+        with stage("embedding"):
+            return self.embedding_model.encode(text).tolist()
     
     def _rerank_results(self, query: str, results: List[dict], top_k: int = 5) -> List[dict]:
         """Rerank results using cross-encoder for better relevance"""
         if not self.enable_reranking or not results or self.reranker is None:
             return results[:top_k]
+        # The cross-encoder is optional: skipped when the request deadline runs low
+        if not stage_allowed("rerank"):
+            return results[:top_k]
         
         # Prepare pairs for reranking
         pairs = [(query, doc["content"]) for doc in results]
         
         # Get reranking scores
-        scores = self.reranker.predict(pairs)
+        with stage("rerank"):
+            scores = self.reranker.predict(pairs)
         
         # Add scores and sort
         for i, doc in enumerate(results):
@@ -221,12 +240,13 @@ class VectorStore:
             # ChromaDB where clause for category filtering
             where_clause = {"categories": {"$in": filter_categories}}
         
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=retrieve_k,
-            include=["documents", "metadatas", "distances"],
-            where=where_clause
-        )
+        with stage("vector_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=retrieve_k,
+                include=["documents", "metadatas", "distances"],
+                where=where_clause
+            )
         
         # Handle empty results
         if not results['ids'] or not results['ids'][0]:
@@ -288,7 +308,9 @@ class VectorStore:
         return self._rerank_results(query, semantic_results[:n_results * 2], top_k=n_results)
 
     def index_from_arxiv(self, query: str, category: str = None, max_papers: int = 20) -> int:
-        """Indexa papers desde arXiv"""
+        """Indexa papers desde arXiv (se salta si al deadline de la petición no le queda tiempo)"""
+        if not stage_allowed("arxiv_index"):
+            return 0
         papers = ArxivLoader.search_papers(query, category, max_papers)
         return self.add_documents(papers)
     
@@ -0,0 +1,242 @@
+"""
+Provider LLM "fake": respuestas deterministas sin red para pruebas de carga
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import AsyncIterator, List, Optional
+
+from app.core.tokens import count_tokens
+
+
+# Perfiles de latencia: (time-to-first-token en ms, tokens por segundo)
+LATENCY_PROFILES = {
+    "instant": (0.0, 0.0),  # 0 tokens/s = sin espera
+    "groq": (250.0, 250.0),
+    "ollama": (800.0, 30.0),
+}
+
+# Tokens de salida de una generación final (acotados por num_predict)
+GENERATION_TOKENS = 600
+
+_FILLER = [
+    "Los datos más recientes apuntan a un cambio de tendencia que merece atención.",
+    "Expertos del sector coinciden en que el impacto será visible a medio plazo.",
+    "La clave está en entender el contexto y no quedarse en el titular.",
+    "Cada vez más organizaciones están adaptando su estrategia a esta realidad.",
+    "El reto ahora es convertir esta información en decisiones concretas.",
+    "Conviene revisar las fuentes y contrastar las cifras antes de sacar conclusiones.",
+    "Este avance abre nuevas preguntas que la comunidad todavía está explorando.",
+    "Para el público general, lo importante es cómo afecta al día a día.",
+]
+
+_ROUTING_KEYWORDS = {
+    "FINANCIAL": ["bolsa", "acciones", "mercado", "stock", "market", "crypto", "bitcoin", "finanzas", "inversión"],
+    "SCIENCE": ["ciencia", "paper", "investigación", "quantum", "cuántic", "ai", "machine learning", "física", "biología"],
+}
+
+
+class FakeLLMError(Exception):
+    """Error simulado del provider (status_code 429 ejercita la ruta de rate limit)"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeLLMClient:
+    """
+    Cliente LLM sin red con la misma interfaz que OllamaAsyncClient.
+
+    - La salida depende sólo del prompt (y de num_predict): misma entrada,
+      misma respuesta, con la forma que espera cada prompt auxiliar (JSON de
+      routing, arrays de expansión, JSON de entidades, lotes multi-tarea)
+    - La latencia simula time-to-first-token + tokens/s con jitter, también
+      en streaming, y una tasa de errores configurable
+    """
+
+    def __init__(
+        self,
+        model: str = "fake-llm",
+        temperature: float = 0.7,
+        num_predict: Optional[int] = None,
+        ttft_ms: float = 250.0,
+        tokens_per_second: float = 250.0,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: Optional[int] = None
+    ):
+        self.model = model
+        self.temperature = temperature
+        self.num_predict = num_predict
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Sólo la latencia y los errores son aleatorios; el texto no
+        self._rng = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_profile(cls, profile: str, **kwargs) -> "FakeLLMClient":
+        """Cliente con el perfil de latencia dado ("instant", "groq", "ollama")"""
+        ttft_ms, tokens_per_second = LATENCY_PROFILES[profile]
+        return cls(ttft_ms=ttft_ms, tokens_per_second=tokens_per_second, **kwargs)
+
+    # --- Latencia y errores simulados ---
+
+    def _jittered(self, seconds: float) -> float:
+        if not seconds or not self.jitter:
+            return seconds
+        return max(seconds * self._rng.uniform(1 - self.jitter, 1 + self.jitter), 0.0)
+
+    def _token_delay(self, tokens: int) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return self._jittered(tokens / self.tokens_per_second)
+
+    def _maybe_fail(self):
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeLLMError(f"Fake LLM error simulado ({self.error_status})", status_code=self.error_status)
+
+    async def generate(self, prompt: str) -> str:
+        """Respuesta completa tras TTFT + tiempo de generación de todos los tokens"""
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self._jittered(self.ttft_ms / 1000))
+            self._maybe_fail()
+            text = self.respond(prompt)
+            await asyncio.sleep(self._token_delay(count_tokens(text)))
+            return text
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Respuesta palabra a palabra al ritmo de tokens/s configurado"""
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self._jittered(self.ttft_ms / 1000))
+            self._maybe_fail()
+            for chunk in re.findall(r"\S+\s*", self.respond(prompt)):
+                yield chunk
+                await asyncio.sleep(self._token_delay(count_tokens(chunk)))
+        finally:
+            self.in_flight -= 1
+
+    async def preload(self) -> bool:
+        return True
+
+    def get_stats(self) -> dict:
+        return {"in_flight": self.in_flight, "calls": self.calls, "errors": self.errors}
+
+    # --- Respuestas deterministas según la forma del prompt ---
+
+    def respond(self, prompt: str) -> str:
+        if "### TASK t1" in prompt:
+            return self._batch(prompt)
+        if '"agent": "FINANCIAL|SCIENCE|CONTENT"' in prompt:
+            return self._routing(prompt)
+        if "alternative search queries" in prompt:
+            return self._expansion(prompt)
+        if "hypothetical scientific abstract" in prompt:
+            return self._hyde(prompt)
+        if "Extract only the most relevant information" in prompt:
+            return self._compression(prompt)
+        if "Extract scientific entities" in prompt:
+            return self._entities(prompt)
+        return self._generation(prompt)
+
+    @staticmethod
+    def _rng_for(prompt: str) -> random.Random:
+        return random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _find(pattern: str, prompt: str, default: str = "") -> str:
+        match = re.search(pattern, prompt)
+        return match.group(1).strip() if match else default
+
+    def _batch(self, prompt: str) -> str:
+        sections = re.split(r"^### TASK (t\d+)\n", prompt, flags=re.MULTILINE)
+        answers = {}
+        for task_id, body in zip(sections[1::2], sections[2::2]):
+            body = body.split("\n\nRespond with ONLY a JSON object")[0]
+            answer = self.respond(body)
+            try:
+                answers[task_id] = json.loads(answer)
+            except json.JSONDecodeError:
+                answers[task_id] = answer
+        return json.dumps(answers, ensure_ascii=False)
+
+    def _routing(self, prompt: str) -> str:
+        topic = self._find(r'User\'s topic: "(.*)"', prompt).lower()
+        agent = "CONTENT"
+        for candidate, keywords in _ROUTING_KEYWORDS.items():
+            if any(keyword in topic for keyword in keywords):
+                agent = candidate
+                break
+        return json.dumps({
+            "agent": agent,
+            "confidence": 0.9 if agent != "CONTENT" else 0.7,
+            "reason": f"Fake router: {agent.lower()} keywords"
+        })
+
+    def _expansion(self, prompt: str) -> str:
+        query = self._find(r"Original query: (.*)", prompt, "topic")
+        return json.dumps([f"{query} overview", f"{query} recent advances", f"{query} applications"])
+
+    def _hyde(self, prompt: str) -> str:
+        query = self._find(r"Question: (.*)", prompt, "the topic")
+        return (
+            f"We study {query}. We propose a method that improves on prior approaches "
+            f"and evaluate it on standard benchmarks. Results show consistent gains and "
+            f"suggest new directions for research on {query}."
+        )
+
+    def _compression(self, prompt: str) -> str:
+        context = prompt.split("Context:", 1)[-1].split("Return a compressed version")[0]
+        return " ".join(context.split()[:150])
+
+    def _entities(self, prompt: str) -> str:
+        text = prompt.split("TEXT:", 1)[-1].split("Respond ONLY with valid JSON")[0]
+        names: List[str] = []
+        for word in re.findall(r"\b[A-Z][A-Za-z0-9-]{3,}\b", text):
+            if word not in names:
+                names.append(word)
+        names = names[:5]
+        entities = [
+            {"id": name.lower(), "name": name, "type": "concept", "definition": f"{name} (fake)"}
+            for name in names
+        ]
+        relations = [
+            {"source": a.lower(), "target": b.lower(), "relation": "uses"}
+            for a, b in zip(names, names[1:])
+        ]
+        return json.dumps({"entities": entities, "relations": relations})
+
+    def _generation(self, prompt: str) -> str:
+        topic = (
+            self._find(r"Crea contenido sobre:\s*\*\*(.+?)\*\*", prompt)
+            or self._find(r"## 🎯 TEMA(?: A DESARROLLAR)?:?\s*\n?(.+)", prompt)
+            or "el tema"
+        )
+        rng = self._rng_for(prompt)
+        budget = min(self.num_predict or GENERATION_TOKENS, GENERATION_TOKENS)
+        parts = [f"{topic}:"]
+        tokens = count_tokens(parts[0])
+        while True:
+            sentence = rng.choice(_FILLER)
+            cost = count_tokens(sentence) + 1
+            if tokens + cost > budget:
+                break
+            parts.append(sentence)
+            tokens += cost
+        return " ".join(parts)
@@ -3,7 +3,12 @@ Servicio Graph RAG para contenido científico avanzado
 Enhanced with: HyDE, query expansion, contextual compression, auto-learning
 """
 from typing import List, Optional, Dict
+import asyncio
 import re
+from app.core.deadline import optional_stage
+from app.core.prompts import get_context_budget, get_max_tokens
+from app.core.timing import stage, timed_stage
+from app.core.tokens import TokenBudgeter, count_tokens, pack_texts, truncate_to_tokens
 from app.rag.graph_store import KnowledgeGraph
 from app.rag.vector_store import VectorStore
 from app.services.llm_service import LLMService
@@ -74,6 +79,14 @@ Context:
 
 Return a compressed version (max 500 words) containing ONLY information relevant to answering the query. Remove tangential information."""
 
+    # Share of the context budget for each section (papers get twice the graph)
+    CONTEXT_WEIGHTS = {"graph": 1.0, "vector": 2.0}
+    
+    # Token limits for auxiliary texts
+    HYDE_MAX_TOKENS = 250
+    COMPRESSION_INPUT_TOKENS = 1000
+    AUTO_LEARN_TOKENS_PER_DOC = 125
+    
     def __init__(self, llm_provider: str = "groq", enable_hyde: bool = True, enable_auto_learn: bool = True):
         self.knowledge_graph = KnowledgeGraph(persist_path="./knowledge_graph.json")
         self.vector_store = VectorStore(collection_name="science_papers", enable_reranking=True)
@@ -173,8 +186,8 @@ Return a compressed version (max 500 words) containing ONLY information relevant
             
         try:
             prompt = self.HYDE_PROMPT.format(query=query)
-            hypothetical_doc = await self.llm_service.generate(prompt)
-            return hypothetical_doc[:1000]  # Limit length
+            hypothetical_doc = await self.llm_service.generate(prompt, call_type="hyde", batchable=True)
+            return truncate_to_tokens(hypothetical_doc, self.HYDE_MAX_TOKENS)
         except Exception:
             return query
     
@@ -182,7 +195,7 @@ Return a compressed version (max 500 words) containing ONLY information relevant
         """Generate alternative queries for comprehensive search"""
         try:
             prompt = self.QUERY_EXPANSION_PROMPT.format(query=query)
-            response = await self.llm_service.generate(prompt)
+            response = await self.llm_service.generate(prompt, call_type="expansion", batchable=True)
             
             # Parse JSON array
             json_match = re.search(r'\[.*?\]', response, re.DOTALL)
@@ -196,16 +209,16 @@ Return a compressed version (max 500 words) containing ONLY information relevant
         return [query]
     
     async def _compress_context(self, query: str, context: str) -> str:
-        """Compress context to keep only relevant information"""
-        if len(context) < 1000:
-            return context
-            
+        """Compress context to keep only relevant information (caller fits the result to its budget)"""
         try:
-            prompt = self.COMPRESSION_PROMPT.format(query=query, context=context[:3000])
-            compressed = await self.llm_service.generate(prompt)
+            prompt = self.COMPRESSION_PROMPT.format(
+                query=query,
+                context=truncate_to_tokens(context, self.COMPRESSION_INPUT_TOKENS)
+            )
+            compressed = await self.llm_service.generate(prompt, call_type="compression", batchable=True)
             return compressed
         except Exception:
-            return context[:1500]
+            return context
     
     async def _auto_learn_from_results(self, results: List[dict]):
         """Extract entities from retrieved documents and add to knowledge graph"""
@@ -214,7 +227,8 @@ Return a compressed version (max 500 words) containing ONLY information relevant
             
         # Combine content from top results
         combined_text = "\n".join([
-            f"{doc['metadata'].get('title', '')}: {doc['content'][:500]}"
+            f"{doc['metadata'].get('title', '')}: "
+            f"{truncate_to_tokens(doc['content'], self.AUTO_LEARN_TOKENS_PER_DOC)}"
             for doc in results[:2]
         ])
         
@@ -224,81 +238,154 @@ Return a compressed version (max 500 words) containing ONLY information relevant
                 self.llm_service
             )
     
-    async def generate_content(
+    async def retrieve_context(
         self,
         topic: str,
-        platform: str = "blog",
-        language: str = "Spanish",
         related_concepts: List[str] = None,
         use_hyde: bool = True,
-        use_query_expansion: bool = True
+        use_query_expansion: bool = True,
+        learn: bool = False
     ) -> dict:
         """
-        Generate content using Enhanced Graph RAG
+        Retrieval part of Enhanced Graph RAG (graph context and hybrid search)
+        
+        It only depends on the topic, so a batch with several requests on the
+        same topic retrieves once and builds each prompt with prepare_content().
         
         Args:
             topic: Main topic for content generation
-            platform: Target platform (blog, twitter, linkedin, etc.)
-            language: Output language
             related_concepts: Optional list of concepts to include
             use_hyde: Whether to use HyDE for better retrieval
             use_query_expansion: Whether to expand query for comprehensive search
+            learn: Also auto-learn from the results (otherwise prepare_content does)
         """
         
         # 1. Extract concepts from topic
         concepts = related_concepts or self._extract_concepts(topic)
         
         # 2. Get context from knowledge graph (with fuzzy matching)
-        graph_context = self.knowledge_graph.get_context_for_query(concepts + [topic])
+        with stage("graph_context"):
+            graph_context = self.knowledge_graph.get_context_for_query(concepts + [topic])
         
-        # 3. Expand query for better coverage
-        queries = [topic]
-        if use_query_expansion:
-            queries = await self._expand_query(topic)
+        # 3-4. Expand query and generate HyDE query concurrently
+        # (both are short auxiliary calls: the LLM batcher sends them as one request)
+        async def no_expansion() -> List[str]:
+            return [topic]
         
-        # 4. Generate HyDE query for semantic search
-        search_query = topic
-        if use_hyde and self.enable_hyde:
-            search_query = await self._generate_hyde_query(topic)
+        async def no_hyde() -> str:
+            return topic
+        
+        # Both are optional: under a tight request deadline they fall back to the topic
+        queries, search_query = await asyncio.gather(
+            optional_stage("expansion", self._expand_query(topic), default=[topic])
+            if use_query_expansion else no_expansion(),
+            optional_stage("hyde", self._generate_hyde_query(topic), default=topic)
+            if use_hyde and self.enable_hyde else no_hyde()
+        )
         
         # 5. Perform hybrid search with all queries
         all_results = []
         seen_ids = set()
         
-        for q in queries[:3]:  # Limit to avoid too many searches
-            results = self.vector_store.hybrid_search(
-                query=q,
-                keywords=concepts,
-                n_results=3
+        with stage("vector_search"):
+            for q in queries[:3]:  # Limit to avoid too many searches
+                results = self.vector_store.hybrid_search(
+                    query=q,
+                    keywords=concepts,
+                    n_results=3
+                )
+                for doc in results:
+                    if doc['id'] not in seen_ids:
+                        all_results.append(doc)
+                        seen_ids.add(doc['id'])
+            
+            # Also search with HyDE query
+            if search_query != topic:
+                hyde_results = self.vector_store.search(search_query, n_results=2)
+                for doc in hyde_results:
+                    if doc['id'] not in seen_ids:
+                        all_results.append(doc)
+                        seen_ids.add(doc['id'])
+        
+        if learn:
+            await optional_stage("auto_learn", self._auto_learn_from_results(all_results))
+        
+        return {
+            "concepts": concepts,
+            "graph_context": graph_context,
+            "queries": queries,
+            "results": all_results,
+            "hyde_enabled": use_hyde and self.enable_hyde,
+            "learned": learn
+        }
+    
+    async def prepare_content(
+        self,
+        topic: str,
+        platform: str = "blog",
+        language: str = "Spanish",
+        related_concepts: List[str] = None,
+        use_hyde: bool = True,
+        use_query_expansion: bool = True,
+        retrieved: Optional[dict] = None
+    ) -> dict:
+        """
+        Run the retrieval part of Enhanced Graph RAG and build the final prompt
+        
+        Returns the same metadata as generate_content() plus the "prompt",
+        without calling the LLM for the final generation.
+        
+        Args:
+            topic: Main topic for content generation
+            platform: Target platform (blog, twitter, linkedin, etc.)
+            language: Output language
+            related_concepts: Optional list of concepts to include
+            use_hyde: Whether to use HyDE for better retrieval
+            use_query_expansion: Whether to expand query for comprehensive search
+            retrieved: Result of retrieve_context() to reuse (skips retrieval)
+        """
+        if retrieved is None:
+            retrieved = await self.retrieve_context(
+                topic, related_concepts, use_hyde, use_query_expansion
             )
-            for doc in results:
-                if doc['id'] not in seen_ids:
-                    all_results.append(doc)
-                    seen_ids.add(doc['id'])
-        
-        # Also search with HyDE query
-        if search_query != topic:
-            hyde_results = self.vector_store.search(search_query, n_results=2)
-            for doc in hyde_results:
-                if doc['id'] not in seen_ids:
-                    all_results.append(doc)
-                    seen_ids.add(doc['id'])
-        
-        # 6. Auto-learn from results (add new entities to graph)
-        await self._auto_learn_from_results(all_results)
-        
-        # 7. Format vector context
-        vector_context = "\n\n".join([
+        concepts = retrieved["concepts"]
+        graph_context = retrieved["graph_context"]
+        all_results = retrieved["results"]
+        
+        # 6. Format vector context (full chunks: the token budget decides how much fits)
+        doc_texts = [
             f"📄 **{doc['metadata'].get('title', 'Unknown')}** "
             f"(Relevance: {doc.get('rerank_score', doc.get('similarity', 0)):.2f})\n"
             f"Authors: {doc['metadata'].get('authors', 'Unknown')}\n"
-            f"{doc['content'][:600]}..."
+            f"{doc['content']}"
             for doc in all_results[:5]
-        ])
+        ]
+        vector_context = "\n\n".join(doc_texts)
+        graph_lines = graph_context.split("\n") if graph_context else []
+        
+        # 7. Split the platform's context budget between graph and papers
+        budget = get_context_budget(platform, self.GRAPH_RAG_PROMPT, topic, language, platform)
+        allocation = TokenBudgeter(budget).allocate(
+            {"graph": count_tokens(graph_context or ""), "vector": count_tokens(vector_context)},
+            self.CONTEXT_WEIGHTS
+        )
+        graph_context = "\n".join(pack_texts(graph_lines, allocation["graph"], separator="\n"))
+        
+        # 8. Auto-learn from results (add new entities to graph) while compressing
+        # the papers if they don't fit in their share (batched together)
+        async def fit_vector_context() -> str:
+            if count_tokens(vector_context) <= allocation["vector"]:
+                return vector_context
+            compressed = await optional_stage(
+                "compression", self._compress_context(topic, vector_context), default=vector_context
+            )
+            return truncate_to_tokens(compressed, allocation["vector"])
         
-        # 8. Compress context if too long
-        if len(vector_context) > 2500:
-            vector_context = await self._compress_context(topic, vector_context)
+        async def learn() -> None:
+            if not retrieved["learned"]:
+                await optional_stage("auto_learn", self._auto_learn_from_results(all_results))
+        
+        _, vector_context = await asyncio.gather(learn(), fit_vector_context())
         
         # 9. Generate prompt
         prompt = self.GRAPH_RAG_PROMPT.format(
@@ -309,19 +396,56 @@ Return a compressed version (max 500 words) containing ONLY information relevant
             platform=platform
         )
         
-        # 10. Generate content
-        content = await self.llm_service.generate(prompt)
-        
         return {
-            "content": content,
+            "prompt": prompt,
             "graph_concepts": concepts,
             "sources": [doc['metadata'] for doc in all_results[:5]],
             "topic": topic,
-            "queries_used": queries,
-            "hyde_enabled": use_hyde and self.enable_hyde,
-            "graph_stats": self.knowledge_graph.get_stats()
+            "queries_used": retrieved["queries"],
+            "hyde_enabled": retrieved["hyde_enabled"],
+            "graph_stats": self.knowledge_graph.get_stats(),
+            "max_tokens": get_max_tokens(platform)
         }
     
+    async def generate_content(
+        self,
+        topic: str,
+        platform: str = "blog",
+        language: str = "Spanish",
+        related_concepts: List[str] = None,
+        use_hyde: bool = True,
+        use_query_expansion: bool = True,
+        retrieved: Optional[dict] = None
+    ) -> dict:
+        """
+        Generate content using Enhanced Graph RAG
+        
+        Args:
+            topic: Main topic for content generation
+            platform: Target platform (blog, twitter, linkedin, etc.)
+            language: Output language
+            related_concepts: Optional list of concepts to include
+            use_hyde: Whether to use HyDE for better retrieval
+            use_query_expansion: Whether to expand query for comprehensive search
+            retrieved: Result of retrieve_context() to reuse (skips retrieval)
+        """
+        prepared = await timed_stage("prepare", self.prepare_content(
+            topic=topic,
+            platform=platform,
+            language=language,
+            related_concepts=related_concepts,
+            use_hyde=use_hyde,
+            use_query_expansion=use_query_expansion,
+            retrieved=retrieved
+        ))
+        prompt = prepared.pop("prompt")
+        max_tokens = prepared.pop("max_tokens")
+        
+        # 10. Generate content
+        content = await self.llm_service.generate(prompt, max_tokens=max_tokens)
+        
+        return {"content": content, **prepared}
+    
     def _extract_concepts(self, topic: str) -> List[str]:
         """Extract concepts using both exact matching and fuzzy search"""
         topic_lower = topic.lower()
@@ -0,0 +1,78 @@
+"""
+Hedging de peticiones LLM: segunda petición cuando la primera tarda más de lo habitual
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class HedgePolicy:
+    """
+    Decide cuándo lanzar una petición de respaldo para un provider/modelo.
+
+    - Guarda las latencias recientes por tipo de llamada (un routing y un post
+      de blog no tienen la misma latencia normal)
+    - El retardo del hedge es el percentil configurado de esas latencias
+    - Presupuesto: como mucho max_hedge_rate de las llamadas se duplican, para
+      que el hedging no dispare la carga justo cuando el provider va lento
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_hedge_rate: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        min_delay_seconds: float = 0.05
+    ):
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay_seconds = min_delay_seconds
+        self._latencies: Dict[str, Deque[float]] = {}
+
+        # Métricas
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.skipped_budget = 0
+
+    def record_latency(self, call_type: str, seconds: float):
+        samples = self._latencies.get(call_type)
+        if samples is None:
+            samples = self._latencies[call_type] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def hedge_delay(self, call_type: str) -> Optional[float]:
+        """Segundos a esperar antes del hedge, o None si aún no hay muestras suficientes"""
+        samples = self._latencies.get(call_type)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(math.ceil(len(ordered) * self.percentile / 100) - 1, len(ordered) - 1)
+        return max(ordered[max(index, 0)], self.min_delay_seconds)
+
+    def try_hedge(self) -> bool:
+        """Reserva un hedge si cabe en el presupuesto (hedged / calls <= max_hedge_rate)"""
+        if self.hedged + 1 > self.max_hedge_rate * self.calls:
+            self.skipped_budget += 1
+            return False
+        self.hedged += 1
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / max(self.calls, 1) * 100, 2),
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "skipped_budget": self.skipped_budget,
+            "delays_ms": {
+                call_type: round(delay * 1000, 1)
+                for call_type in self._latencies
+                if (delay := self.hedge_delay(call_type)) is not None
+            }
+        }
@@ -5,6 +5,7 @@ import httpx
 import urllib.parse
 from typing import Optional
 from app.core.config import get_settings
+from app.core.deadline import remaining_time
 
 settings = get_settings()
 
@@ -13,6 +14,7 @@ class ImageService:
     """Servicio de imágenes con Pollinations API"""
     
     BASE_URL = "https://image.pollinations.ai/prompt"
+    TIMEOUT_SECONDS = 60.0
     
     @classmethod
     async def generate_image(cls, prompt: str, width: int = 1200, height: int = 630) -> Optional[str]:
@@ -38,7 +40,9 @@ class ImageService:
                 "Authorization": f"Bearer {settings.POLLINATIONS_API_KEY}"
             }
             
-            async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+            # Sin esperar más de lo que le queda a la petición
+            timeout = remaining_time(cls.TIMEOUT_SECONDS)
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
                 response = await client.get(image_url, headers=headers, params=params)
                 
                 if response.status_code == 200:
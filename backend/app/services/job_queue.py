@@ -0,0 +1,544 @@
+"""
+Cola persistente (SQLite) de trabajos de generación en lote y su pool de workers
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.agents.batch_planner import BatchPlanner
+from app.core.config import get_settings
+from app.core.metrics import JOB_ITEMS, JOB_QUEUE_DEPTH, JOB_QUEUE_LAG
+
+settings = get_settings()
+
+# Estados de un item
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class JobItem:
+    """Item de un trabajo reclamado por un worker"""
+    job_id: str
+    position: int
+    request: dict
+    attempts: int
+
+
+class JobQueue:
+    """
+    Cola de trabajos en un fichero SQLite: sobrevive a reinicios y a la
+    desconexión del cliente.
+
+    - Un trabajo es una lista de peticiones; cada una es un item con su
+      estado, intentos, resultado o error
+    - claim() reclama items pendientes de un mismo trabajo con un lease; si
+      el worker desaparece, el item vuelve a la cola al vencer el lease.
+      release() los devuelve al parar ordenadamente; recover() devuelve
+      todos los que están en curso (sólo si un único proceso usa el fichero)
+    - Un item fallido se reintenta con backoff exponencial hasta
+      max_attempts
+    - Cada item terminado recibe un número de secuencia creciente dentro de
+      su trabajo: los clientes piden "lo terminado después de N" para hacer
+      polling o stream
+    - purge() borra los trabajos terminados hace más de retention_seconds
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: Optional[int] = None,
+        retry_backoff_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        retention_seconds: Optional[float] = None
+    ):
+        self.path = path
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.retry_backoff_seconds = (
+            settings.JOB_RETRY_BACKOFF_SECONDS if retry_backoff_seconds is None else retry_backoff_seconds
+        )
+        self.lease_seconds = settings.JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.retention_seconds = (
+            settings.JOB_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+        )
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # timeout: espera por el lock del fichero si otro proceso está escribiendo
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                cancelled INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                request TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_until REAL,
+                started_at REAL,
+                finished_at REAL,
+                seq INTEGER,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (job_id, position)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_seq ON job_items(job_id, seq)")
+
+    def submit(self, requests: List[dict]) -> str:
+        """Encola un trabajo y devuelve su id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, total, created_at) VALUES (?, ?, ?)", (job_id, len(requests), now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, position, request, status, available_at) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (job_id, position, json.dumps(request, ensure_ascii=False, default=str), PENDING, now)
+                        for position, request in enumerate(requests)
+                    ]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def recover(self) -> int:
+        """
+        Devuelve a la cola todos los items en curso (p. ej. tras un reinicio).
+        Incluye los de otros procesos que compartan el fichero: sólo es seguro
+        con un único proceso
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = ?, lease_until = NULL, available_at = ? WHERE status = ?",
+                (PENDING, time.time(), RUNNING)
+            )
+            self._update_depth()
+        return cursor.rowcount
+
+    def release(self, items: List[JobItem]) -> int:
+        """Devuelve a la cola items reclamados por este proceso que no llegó a terminar"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "UPDATE job_items SET status = ?, lease_until = NULL, available_at = ? "
+                "WHERE job_id = ? AND position = ? AND status = ?",
+                [(PENDING, now, item.job_id, item.position, RUNNING) for item in items]
+            )
+            self._update_depth()
+        return cursor.rowcount
+
+    def claim(self, limit: int = 1) -> List[JobItem]:
+        """Reclama hasta limit items pendientes del trabajo más antiguo con items disponibles"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Items cuyo worker desapareció sin terminarlos
+                self._conn.execute(
+                    "UPDATE job_items SET status = ?, lease_until = NULL WHERE status = ? AND lease_until < ?",
+                    (PENDING, RUNNING, now)
+                )
+                # Pendientes de trabajos ya cancelados (lease vencido, release()
+                # o recover() después de cancelar): se cancelan en vez de
+                # quedarse en la cola
+                for (cancelled_job,) in self._conn.execute(
+                    "SELECT DISTINCT i.job_id FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                    "WHERE i.status = ? AND j.cancelled = 1",
+                    (PENDING,)
+                ).fetchall():
+                    self._cancel_pending(cancelled_job)
+                # Los items de un trabajo cancelado no se reclaman aunque
+                # sigan pendientes
+                row = self._conn.execute(
+                    "SELECT i.job_id FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                    "WHERE i.status = ? AND i.available_at <= ? AND j.cancelled = 0 "
+                    "ORDER BY i.available_at, i.position LIMIT 1",
+                    (PENDING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    self._update_depth()
+                    return []
+                job_id = row[0]
+                rows = self._conn.execute(
+                    "SELECT position, request, attempts, available_at FROM job_items "
+                    "WHERE job_id = ? AND status = ? AND available_at <= ? ORDER BY position LIMIT ?",
+                    (job_id, PENDING, now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE job_items SET status = ?, attempts = attempts + 1, lease_until = ?, "
+                    "started_at = COALESCE(started_at, ?) WHERE job_id = ? AND position = ?",
+                    [(RUNNING, now + self.lease_seconds, now, job_id, position) for position, *_ in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._update_depth()
+
+        items = []
+        for position, request, attempts, available_at in rows:
+            # Espera en cola: desde que se encoló (o desde que tocaba reintentarlo)
+            JOB_QUEUE_LAG.observe(max(now - available_at, 0.0))
+            items.append(JobItem(job_id, position, json.loads(request), attempts + 1))
+        return items
+
+    def _update_depth(self):
+        """Gauge de items pendientes y en curso (con el lock tomado)"""
+        counts = dict(self._conn.execute(
+            "SELECT status, COUNT(*) FROM job_items WHERE status IN (?, ?) GROUP BY status", (PENDING, RUNNING)
+        ).fetchall())
+        for status in (PENDING, RUNNING):
+            JOB_QUEUE_DEPTH.set(counts.get(status, 0), status)
+
+    def _finish(self, job_id: str, position: int, status: str, result: Optional[dict] = None,
+                error: Optional[str] = None) -> bool:
+        """
+        Marca un item en curso como terminado con el siguiente número de
+        secuencia de su trabajo. False si ya no estaba en curso (cancelado,
+        terminado o devuelto a la cola)
+        """
+        with self._lock:
+            # MAX(seq) del trabajo sale del índice (job_id, seq), sin recorrer la tabla
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL, "
+                "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_items WHERE job_id = ?) "
+                "WHERE job_id = ? AND position = ? AND status = ?",
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    job_id,
+                    position,
+                    RUNNING
+                )
+            )
+            self._update_depth()
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, position: int, result: dict):
+        if self._finish(job_id, position, DONE, result=result):
+            JOB_ITEMS.inc("done")
+
+    def fail(self, job_id: str, position: int, error: str) -> bool:
+        """Anota un fallo: True si el item se reintentará, False si queda como fallido"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT i.attempts, j.cancelled FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.job_id = ? AND i.position = ? AND i.status = ?",
+                (job_id, position, RUNNING)
+            ).fetchone()
+            if row is None:
+                return False
+            attempts, cancelled = row
+            if attempts < self.max_attempts and not cancelled:
+                delay = self.retry_backoff_seconds * 2 ** (attempts - 1)
+                self._conn.execute(
+                    "UPDATE job_items SET status = ?, error = ?, available_at = ?, lease_until = NULL "
+                    "WHERE job_id = ? AND position = ?",
+                    (PENDING, error, time.time() + delay, job_id, position)
+                )
+                self._update_depth()
+                JOB_ITEMS.inc("retried")
+                return True
+        if self._finish(job_id, position, FAILED, error=error):
+            JOB_ITEMS.inc("failed")
+        return False
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela los items pendientes (los que están en curso terminan). False si no existe"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute("UPDATE jobs SET cancelled = 1 WHERE id = ?", (job_id,))
+                if not cursor.rowcount:
+                    self._conn.execute("COMMIT")
+                    return False
+                self._cancel_pending(job_id)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._update_depth()
+        return True
+
+    def _cancel_pending(self, job_id: str):
+        """
+        Cancela los items pendientes de un trabajo en una sola sentencia (con
+        el lock y una transacción abiertos): ningún worker puede reclamarlos
+        entre la lectura y la cancelación. Secuencias crecientes (y únicas)
+        a partir de la última del trabajo
+        """
+        last_seq = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM job_items WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        self._conn.execute(
+            "UPDATE job_items SET status = ?, finished_at = ?, lease_until = NULL, seq = ? + position + 1 "
+            "WHERE job_id = ? AND status = ?",
+            (CANCELLED, time.time(), last_seq, job_id, PENDING)
+        )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Estado y progreso de un trabajo (None si no existe)"""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT total, created_at, cancelled FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), MIN(started_at), MAX(finished_at) FROM job_items "
+                "WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+        total, created_at, cancelled = job
+        counts = {status: 0 for status in (PENDING, RUNNING, DONE, FAILED, CANCELLED)}
+        started = [row[2] for row in rows if row[2] is not None]
+        finished = [row[3] for row in rows if row[3] is not None]
+        for status, count, _, _ in rows:
+            counts[status] = count
+
+        active = counts[PENDING] + counts[RUNNING]
+        if active == 0:
+            if cancelled:
+                status = "cancelled"
+            elif counts[FAILED] and not counts[DONE]:
+                status = "failed"
+            else:
+                status = "completed"
+        elif counts[RUNNING] == 0 and counts[DONE] + counts[FAILED] == 0 and not started:
+            status = "queued"
+        else:
+            status = "running"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "finished": active == 0,
+            "total": total,
+            "counts": counts,
+            "progress": round((total - active) / total * 100, 2) if total else 100.0,
+            "created_at": created_at,
+            "started_at": min(started) if started else None,
+            "finished_at": max(finished) if active == 0 and finished else None,
+        }
+
+    def results(self, job_id: str, after: int = 0, limit: int = 100) -> List[dict]:
+        """Items terminados con secuencia > after (en orden de finalización)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, position, status, attempts, result, error FROM job_items "
+                "WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [
+            {
+                "seq": seq,
+                "position": position,
+                "status": status,
+                "attempts": attempts,
+                "result": json.loads(result) if result is not None else None,
+                "error": error,
+            }
+            for seq, position, status, attempts, result, error in rows
+        ]
+
+    def get_stats(self) -> dict:
+        """Profundidad de la cola, espera del item más antiguo, throughput y lag"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(available_at) FROM job_items WHERE status = ? AND available_at <= ?", (PENDING, now)
+            ).fetchone()[0]
+            done_last_minute = self._conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE status = ? AND finished_at >= ?", (DONE, now - 60)
+            ).fetchone()[0]
+            self._update_depth()
+        return {
+            "items": {status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED, CANCELLED)},
+            "oldest_pending_seconds": round(now - oldest, 2) if oldest is not None else 0.0,
+            "throughput_per_minute": done_last_minute,
+            "lag": JOB_QUEUE_LAG.labels().get_stats(),
+            "outcomes": {outcome: JOB_ITEMS.value(outcome) for outcome in ("done", "retried", "failed")},
+        }
+
+    def purge(self) -> int:
+        """
+        Borra los trabajos sin items activos cuyo último item terminó hace más
+        de retention_seconds (0 = conservarlos siempre). Devuelve cuántos
+        """
+        if not self.retention_seconds:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [
+                    row[0] for row in self._conn.execute(
+                        "SELECT j.id FROM jobs j WHERE j.created_at < ? AND NOT EXISTS ("
+                        "SELECT 1 FROM job_items i WHERE i.job_id = j.id "
+                        "AND (i.status IN (?, ?) OR i.finished_at >= ?))",
+                        (cutoff, PENDING, RUNNING, cutoff)
+                    ).fetchall()
+                ]
+                self._conn.executemany("DELETE FROM job_items WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(job_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkerPool:
+    """
+    Workers asyncio que consumen la cola dentro del proceso de la API.
+
+    Cada worker reclama hasta claim_batch items de un mismo trabajo y los
+    ejecuta con BatchPlanner (deduplicados y compartiendo contexto por
+    agente y tema); los fallidos vuelven a la cola con backoff. Cuando no
+    hay trabajo, cada purge_interval purga los trabajos antiguos. Las
+    operaciones de la cola (SQLite, con esperas por el lock del fichero)
+    corren en threads para no bloquear el event loop de la API.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        get_orchestrator: Callable,
+        workers: Optional[int] = None,
+        claim_batch: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        purge_interval: float = 3600.0
+    ):
+        self.queue = queue
+        self.get_orchestrator = get_orchestrator
+        self.workers = settings.JOB_WORKERS if workers is None else workers
+        self.claim_batch = settings.JOB_CLAIM_BATCH if claim_batch is None else claim_batch
+        self.poll_interval = settings.JOB_POLL_INTERVAL_SECONDS if poll_interval is None else poll_interval
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._tasks: List[asyncio.Task] = []
+        # Items reclamados por este pool que aún no se han anotado
+        self._claimed: Dict[Tuple[str, int], JobItem] = {}
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        if self.running:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Para los workers y devuelve a la cola los items que tenían en curso"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._claimed:
+            released = await asyncio.to_thread(self.queue.release, list(self._claimed.values()))
+            self._claimed.clear()
+            if released:
+                print(f"Job queue: {released} in-flight items released")
+
+    async def _worker(self):
+        while True:
+            try:
+                items = await asyncio.to_thread(self.queue.claim, self.claim_batch)
+            except sqlite3.Error as e:
+                print(f"Job queue claim failed: {e}")
+                items = []
+            if not items:
+                await self._maybe_purge()
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self._claimed.update(((item.job_id, item.position), item) for item in items)
+            try:
+                await self.process(items)
+            except Exception as e:
+                # El worker sigue vivo; los items sin anotar vuelven a la cola al vencer su lease
+                print(f"Job worker failed processing {len(items)} items: {e}")
+
+    async def _maybe_purge(self):
+        """Purga la cola como mucho una vez cada purge_interval (entre todos los workers del pool)"""
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            purged = await asyncio.to_thread(self.queue.purge)
+        except sqlite3.Error as e:
+            print(f"Job queue purge failed: {e}")
+            return
+        if purged:
+            print(f"Job queue: {purged} expired jobs purged")
+
+    async def process(self, items: List[JobItem]):
+        """Ejecuta items reclamados y anota su resultado (o su fallo) en la cola"""
+        planner = BatchPlanner(self.get_orchestrator, max_concurrent=len(items))
+        try:
+            results = await planner.run([item.request for item in items])
+        except Exception as e:
+            results = [{"error": str(e)}] * len(items)
+        for item, result in zip(items, results):
+            try:
+                if "error" in result:
+                    await asyncio.to_thread(self.queue.fail, item.job_id, item.position, str(result["error"]))
+                else:
+                    await asyncio.to_thread(self.queue.complete, item.job_id, item.position, result)
+            except Exception as e:
+                # Se sigue con el resto; éste vuelve a la cola al vencer su lease
+                print(f"Job queue update failed for {item.job_id}/{item.position}: {e}")
+                continue
+            self._claimed.pop((item.job_id, item.position), None)
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Cola de trabajos compartida por el proceso"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(settings.JOB_QUEUE_PATH)
+    return _job_queue
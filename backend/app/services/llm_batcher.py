@@ -0,0 +1,176 @@
+"""
+Micro-batching de llamadas LLM auxiliares en un único prompt multi-tarea
+"""
+import asyncio
+import json
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.rate_limiter import RateLimitError
+
+
+BATCH_PROMPT = """Complete each of the following independent tasks. Treat every task separately and follow its own instructions and output format.
+
+{tasks}
+
+Respond with ONLY a JSON object (no markdown, no explanation) with one key per task id. Each value is the complete answer to that task: a string for text answers, or the JSON value itself when the task asks for JSON.
+{{{example}}}"""
+
+
+@dataclass
+class _BatchTask:
+    prompt: str
+    future: asyncio.Future
+    max_tokens: int = 0
+
+
+class LLMBatcher:
+    """
+    Agrupa tareas auxiliares cortas (routing, expansión, HyDE, compresión,
+    extracción) que llegan en una ventana de pocos ms, de una misma petición
+    o de peticiones concurrentes, y las envía como un único prompt JSON.
+
+    - Una tarea sola se envía con su prompt original (sin sobrecoste)
+    - El lote se cierra antes de que la suma de los topes de salida de sus
+      tareas supere max_tokens (el tope de la respuesta multi-tarea), para
+      que ninguna respuesta quede truncada
+    - La respuesta se demultiplexa por id de tarea; las tareas que falten o
+      no se puedan parsear se reintentan individualmente
+    - Un 429 se propaga a todas las tareas del lote (no se reintenta por separado)
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[str], Awaitable[str]],
+        window_ms: float = 10.0,
+        max_tasks: int = 6,
+        max_tokens: Optional[int] = None
+    ):
+        self._execute = execute
+        self.window_seconds = window_ms / 1000
+        self.max_tasks = max_tasks
+        self.max_tokens = max_tokens
+        self._pending: List[_BatchTask] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Métricas
+        self.tasks = 0
+        self.batches = 0
+        self.batched_tasks = 0
+        self.round_trips = 0
+        self.fallbacks = 0
+
+    async def submit(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Encola una tarea (max_tokens: su tope de salida) y espera su respuesta"""
+        loop = asyncio.get_running_loop()
+        task = _BatchTask(prompt=prompt, future=loop.create_future(), max_tokens=max_tokens or 0)
+        # Con esta tarea la respuesta del lote podría pasar del tope: sale el lote actual
+        if self.max_tokens and self._pending and self._pending_tokens + task.max_tokens > self.max_tokens:
+            self._flush()
+        self._pending.append(task)
+        self._pending_tokens += task.max_tokens
+        self.tasks += 1
+
+        if len(self._pending) >= self.max_tasks:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await task.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        self._pending_tokens = 0
+        # Las tareas canceladas mientras esperaban ya no se envían
+        batch = [task for task in batch if not task.future.done()]
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[_BatchTask]):
+        if len(batch) == 1:
+            await self._run_single(batch[0])
+            return
+
+        self.batches += 1
+        self.batched_tasks += len(batch)
+        self.round_trips += 1
+        ids = [f"t{i}" for i in range(1, len(batch) + 1)]
+        try:
+            response = await self._execute(self.build_prompt(ids, [task.prompt for task in batch]))
+            answers = self.parse_answers(response, ids)
+        except RateLimitError as e:
+            for task in batch:
+                if not task.future.done():
+                    task.future.set_exception(e)
+            return
+        except Exception as e:
+            print(f"Batch LLM call failed, retrying tasks individually: {e}")
+            answers = {}
+
+        missing = []
+        for task_id, task in zip(ids, batch):
+            if task_id in answers:
+                if not task.future.done():
+                    task.future.set_result(answers[task_id])
+            else:
+                missing.append(task)
+        if missing:
+            self.fallbacks += len(missing)
+            await asyncio.gather(*(self._run_single(task) for task in missing))
+
+    async def _run_single(self, task: _BatchTask):
+        if task.future.done():
+            return
+        self.round_trips += 1
+        try:
+            result = await self._execute(task.prompt)
+        except Exception as e:
+            if not task.future.done():
+                task.future.set_exception(e)
+        else:
+            if not task.future.done():
+                task.future.set_result(result)
+
+    @staticmethod
+    def build_prompt(ids: List[str], prompts: List[str]) -> str:
+        tasks = "\n\n".join(
+            f"### TASK {task_id}\n{prompt.strip()}" for task_id, prompt in zip(ids, prompts)
+        )
+        example = ", ".join(f'"{task_id}": ...' for task_id in ids)
+        return BATCH_PROMPT.format(tasks=tasks, example=example)
+
+    @staticmethod
+    def parse_answers(response: str, ids: List[str]) -> Dict[str, str]:
+        """Respuesta de cada tarea como texto (las respuestas JSON se re-serializan)"""
+        json_match = re.search(r"\{.*\}", response, re.DOTALL)
+        if not json_match:
+            return {}
+        try:
+            data = json.loads(json_match.group())
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        answers = {}
+        for task_id in ids:
+            if task_id not in data or data[task_id] is None:
+                continue
+            value = data[task_id]
+            answers[task_id] = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return answers
+
+    def get_stats(self) -> dict:
+        return {
+            "tasks": self.tasks,
+            "batches": self.batches,
+            "batched_tasks": self.batched_tasks,
+            "avg_batch_size": round(self.batched_tasks / max(self.batches, 1), 2),
+            "round_trips": self.round_trips,
+            "round_trips_saved": max(self.tasks - self.round_trips, 0),
+            "fallbacks": self.fallbacks
+        }
@@ -0,0 +1,174 @@
+"""
+Caché persistente en disco (SQLite) de respuestas del LLM
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin él se comprime con zlib
+    zstandard = None
+
+
+class LLMResponseCache:
+    """
+    Caché prompt → respuesta en un fichero SQLite, compartido entre reinicios.
+
+    - Clave: hash del prompt + provider, modelo y parámetros de muestreo
+    - Valores comprimidos con zstd (o zlib si zstandard no está instalado)
+    - TTL por entrada y tope de tamaño total con expulsión LRU
+    """
+
+    _ZSTD = b"z"
+    _ZLIB = b"d"
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, max_tokens: Optional[int], prompt: str) -> str:
+        raw = f"{provider}\0{model}\0{temperature}\0{max_tokens}\0{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _compress(self, value: str) -> bytes:
+        data = value.encode("utf-8")
+        if zstandard is not None:
+            return self._ZSTD + self._compressor.compress(data)
+        return self._ZLIB + zlib.compress(data)
+
+    def _decompress(self, blob: bytes) -> str:
+        codec, payload = blob[:1], blob[1:]
+        if codec == self._ZSTD:
+            if zstandard is None:
+                raise ValueError("Entrada comprimida con zstd pero zstandard no está instalado")
+            return self._decompressor.decompress(payload).decode("utf-8")
+        return zlib.decompress(payload).decode("utf-8")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, size, created_at = row
+            if now - created_at >= self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+
+            # El (de)compresor zstd no es thread-safe: se usa con el lock tomado
+            try:
+                result = self._decompress(value)
+            except Exception:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return result
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            blob = self._compress(value)
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self.writes += 1
+            self._evict()
+
+    def _evict(self):
+        """Expulsa las entradas caducadas y después las menos usadas hasta caber en max_bytes"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        expired_before = time.time() - self.ttl_seconds
+        expired_bytes, expired_count = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM llm_cache WHERE created_at < ?", (expired_before,)
+        ).fetchone()
+        if expired_count:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (expired_before,))
+            self._total_bytes -= expired_bytes
+            self.evictions += expired_count
+
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / max(lookups, 1) * 100, 2),
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "compression": "zstd" if zstandard is not None else "zlib"
+        }
@@ -2,57 +2,694 @@
 Servicio para interactuar con diferentes LLMs
 """
 import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
 from langchain_groq import ChatGroq
-from langchain_community.llms import Ollama
 from langchain_core.messages import HumanMessage
 from app.core.config import get_settings
+from app.core.deadline import DeadlineExceeded, iterate_within_deadline, required_stage
+from app.core.metrics import LLM_LATENCY
+from app.core.singleflight import SingleFlight
+from app.core.timing import stage
+from app.core.tokens import count_tokens
+from app.services.fake_llm import FakeLLMClient
+from app.services.hedging import HedgePolicy
+from app.services.llm_batcher import LLMBatcher
+from app.services.llm_cache import LLMResponseCache
+from app.services.ollama_client import OllamaAsyncClient
+from app.services.rate_limiter import ProviderRateLimiter, RateLimitError
 
 settings = get_settings()
 
+# (provider, model, temperature, max_tokens)
+ClientKey = Tuple[str, str, float, Optional[int]]
+
+
+class LLMClientRegistry:
+    """
+    Registro de clientes LLM compartidos por todo el proceso.
+
+    Cada combinación (provider, model, temperature, max_tokens) tiene un único
+    cliente, y todos los clientes Groq reutilizan el mismo pool HTTP keep-alive
+    en lugar de abrir conexiones (y handshakes TLS) nuevas por agente. Los
+    clientes Ollama comparten su propio pool y un semáforo por modelo.
+    """
+
+    def __init__(self):
+        self._clients: Dict[ClientKey, Any] = {}
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._ollama_http_client: Optional[httpx.AsyncClient] = None
+        self._ollama_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._rate_limiters: Dict[str, ProviderRateLimiter] = {}
+        self._hedge_policies: Dict[Tuple[str, str], HedgePolicy] = {}
+        self._batchers: Dict[Tuple[str, str], LLMBatcher] = {}
+        self.clients_created = 0
+        self.clients_reused = 0
+        self.http_requests = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY
+        )
+
+    def _count_request(self, request: httpx.Request):
+        self.http_requests += 1
+
+    async def _acount_request(self, request: httpx.Request):
+        self.http_requests += 1
+
+    def _get_http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Crea (una sola vez) los pools HTTP compartidos"""
+        if self._http_async_client is None:
+            timeout = httpx.Timeout(settings.LLM_REQUEST_TIMEOUT)
+            self._http_client = httpx.Client(
+                limits=self._limits(),
+                timeout=timeout,
+                event_hooks={"request": [self._count_request]}
+            )
+            self._http_async_client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=timeout,
+                event_hooks={"request": [self._acount_request]}
+            )
+        return self._http_client, self._http_async_client
+
+    def _get_ollama_http_client(self) -> httpx.AsyncClient:
+        if self._ollama_http_client is None:
+            self._ollama_http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_NUM_PARALLEL * 2,
+                    max_keepalive_connections=settings.OLLAMA_NUM_PARALLEL,
+                    keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(settings.OLLAMA_REQUEST_TIMEOUT),
+                event_hooks={"request": [self._acount_request]}
+            )
+        return self._ollama_http_client
+
+    def get_client(self, provider: str, model: str, temperature: float, max_tokens: Optional[int]):
+        """Devuelve el cliente compartido para la configuración dada"""
+        key = (provider, model, temperature, max_tokens)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.clients_reused += 1
+                return client
+
+            client = self._create_client(provider, model, temperature, max_tokens)
+            self._clients[key] = client
+            self.clients_created += 1
+            return client
+
+    def _create_client(self, provider: str, model: str, temperature: float, max_tokens: Optional[int]):
+        if provider == "groq":
+            http_client, http_async_client = self._get_http_clients()
+            return ChatGroq(
+                model=model,
+                api_key=settings.GROQ_API_KEY,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                http_client=http_client,
+                http_async_client=http_async_client
+            )
+        elif provider == "ollama":
+            # Un semáforo por modelo: Ollama paraleliza por modelo cargado
+            if model not in self._ollama_semaphores:
+                self._ollama_semaphores[model] = asyncio.Semaphore(settings.OLLAMA_NUM_PARALLEL)
+            semaphore = self._ollama_semaphores[model]
+            return OllamaAsyncClient(
+                model=model,
+                base_url=settings.OLLAMA_BASE_URL,
+                temperature=temperature,
+                num_predict=max_tokens,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                http_client=self._get_ollama_http_client(),
+                semaphore=semaphore
+            )
+        elif provider == "fake":
+            options = dict(
+                model=model,
+                temperature=temperature,
+                num_predict=max_tokens,
+                jitter=settings.FAKE_LLM_JITTER,
+                error_rate=settings.FAKE_LLM_ERROR_RATE,
+                error_status=settings.FAKE_LLM_ERROR_STATUS,
+                seed=settings.FAKE_LLM_SEED
+            )
+            if settings.FAKE_LLM_PROFILE == "custom":
+                return FakeLLMClient(
+                    ttft_ms=settings.FAKE_LLM_TTFT_MS,
+                    tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+                    **options
+                )
+            return FakeLLMClient.from_profile(settings.FAKE_LLM_PROFILE, **options)
+        else:
+            raise ValueError(f"Provider '{provider}' no soportado")
+
+    def get_rate_limiter(self, provider: str) -> ProviderRateLimiter:
+        """Limiter compartido por todas las llamadas a un provider"""
+        with self._lock:
+            limiter = self._rate_limiters.get(provider)
+            if limiter is None:
+                limiter = ProviderRateLimiter(
+                    name=provider,
+                    rpm=getattr(settings, f"{provider.upper()}_RPM_LIMIT", 0),
+                    tpm=getattr(settings, f"{provider.upper()}_TPM_LIMIT", 0),
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+                    latency_spike_factor=settings.LLM_LATENCY_SPIKE_FACTOR
+                )
+                self._rate_limiters[provider] = limiter
+            return limiter
+
+    def get_rate_limit_stats(self) -> dict:
+        return {name: limiter.get_stats() for name, limiter in self._rate_limiters.items()}
+
+    def get_hedge_policy(self, provider: str, model: str) -> HedgePolicy:
+        """Política de hedging (latencias y presupuesto) compartida por provider/modelo"""
+        with self._lock:
+            policy = self._hedge_policies.get((provider, model))
+            if policy is None:
+                policy = HedgePolicy(
+                    percentile=settings.LLM_HEDGE_PERCENTILE,
+                    max_hedge_rate=settings.LLM_HEDGE_MAX_RATE,
+                    min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+                )
+                self._hedge_policies[(provider, model)] = policy
+            return policy
+
+    def get_batcher(
+        self,
+        provider: str,
+        model: str,
+        make_execute: Callable[[], Callable[[str], Awaitable[str]]],
+        max_tokens: Optional[int] = None
+    ) -> LLMBatcher:
+        """
+        Batcher de tareas auxiliares compartido por provider/modelo
+        (make_execute y max_tokens, el tope del prompt multi-tarea, sólo se
+        usan al crearlo)
+        """
+        batcher = self._batchers.get((provider, model))
+        if batcher is None:
+            execute = make_execute()
+            with self._lock:
+                batcher = self._batchers.get((provider, model))
+                if batcher is None:
+                    batcher = LLMBatcher(
+                        execute=execute,
+                        window_ms=settings.LLM_BATCH_WINDOW_MS,
+                        max_tasks=settings.LLM_BATCH_MAX_TASKS,
+                        max_tokens=max_tokens
+                    )
+                    self._batchers[(provider, model)] = batcher
+        return batcher
+
+    def get_batch_stats(self) -> dict:
+        return {f"{provider}/{model}": batcher.get_stats() for (provider, model), batcher in self._batchers.items()}
+
+    def get_hedge_stats(self) -> dict:
+        return {f"{provider}/{model}": policy.get_stats() for (provider, model), policy in self._hedge_policies.items()}
+
+    def _ollama_stats(self) -> dict:
+        """Peticiones Ollama en curso y en espera del semáforo"""
+        stats = {"in_flight": 0, "waiting": 0}
+        for client in self._clients.values():
+            if isinstance(client, OllamaAsyncClient):
+                for key, value in client.get_stats().items():
+                    stats[key] += value
+        return stats
+
+    def _pool_connections(self) -> int:
+        """Conexiones abiertas actualmente en el pool async (0 si no hay pool)"""
+        if self._http_async_client is None:
+            return 0
+        pool = getattr(getattr(self._http_async_client, "_transport", None), "_pool", None)
+        return len(getattr(pool, "connections", []) or [])
+
+    def get_stats(self) -> dict:
+        open_connections = self._pool_connections()
+        return {
+            "clients": len(self._clients),
+            "clients_created": self.clients_created,
+            "clients_reused": self.clients_reused,
+            "http_requests": self.http_requests,
+            "open_connections": open_connections,
+            # Peticiones servidas sobre una conexión ya abierta
+            "connection_reuse": max(self.http_requests - open_connections, 0),
+            "ollama": self._ollama_stats()
+        }
+
+    async def aclose(self):
+        """Cierra los pools HTTP compartidos (shutdown de la aplicación)"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+        if self._ollama_http_client is not None:
+            await self._ollama_http_client.aclose()
+        self.clear()
+
+    def clear(self):
+        """Olvida todos los clientes (los siguientes se crearán de nuevo)"""
+        with self._lock:
+            self._clients.clear()
+            self._http_client = None
+            self._http_async_client = None
+            self._ollama_http_client = None
+            self._ollama_semaphores.clear()
+            self._rate_limiters.clear()
+            self._hedge_policies.clear()
+            self._batchers.clear()
+            self.clients_created = 0
+            self.clients_reused = 0
+            self.http_requests = 0
+
+
+# Registro único por proceso
+client_registry = LLMClientRegistry()
+
+# Llamadas idénticas en vuelo (mismo modelo, parámetros y prompt) comparten resultado
+inflight_calls = SingleFlight()
+
+# Caché en disco de respuestas (se abre al primer uso)
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Caché persistente de respuestas, o None si está desactivada"""
+    global _response_cache
+    if not settings.LLM_DISK_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        _response_cache = LLMResponseCache(
+            path=settings.LLM_DISK_CACHE_PATH,
+            ttl_seconds=settings.LLM_DISK_CACHE_TTL_SECONDS,
+            max_bytes=settings.LLM_DISK_CACHE_MAX_MB * 1024 * 1024
+        )
+    return _response_cache
+
+
+class RoleLatencyStats:
+    """Latencias recientes por rol (routing, expansion, ..., generation) y modelo usado"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self._models: Dict[str, str] = {}
+        self._calls: Dict[str, int] = {}
+
+    def record(self, role: str, model: str, seconds: float):
+        LLM_LATENCY.observe(seconds, role, model)
+        if role not in self._latencies:
+            self._latencies[role] = deque(maxlen=self.window)
+        self._latencies[role].append(seconds * 1000)
+        self._models[role] = model
+        self._calls[role] = self._calls.get(role, 0) + 1
+
+    @staticmethod
+    def _percentile(ordered: list, percentile: float) -> float:
+        index = min(int(len(ordered) * percentile / 100), len(ordered) - 1)
+        return round(ordered[index], 2)
+
+    def get_stats(self) -> dict:
+        stats = {}
+        for role, samples in self._latencies.items():
+            ordered = sorted(samples)
+            stats[role] = {
+                "model": self._models[role],
+                "calls": self._calls[role],
+                "avg_ms": round(sum(ordered) / len(ordered), 2),
+                "p50_ms": self._percentile(ordered, 50),
+                "p95_ms": self._percentile(ordered, 95),
+                "p99_ms": self._percentile(ordered, 99)
+            }
+        return stats
+
+    def clear(self):
+        self._latencies.clear()
+        self._models.clear()
+        self._calls.clear()
+
+
+# Latencias por rol de todas las llamadas del proceso
+role_latency = RoleLatencyStats()
+
+
+def _estimate_tokens(text: str) -> int:
+    """Tokens de un texto (tokenizer si está disponible, si no ~4 caracteres por token)"""
+    return max(count_tokens(text), 1)
+
+
+def _rate_limit_retry_after(error: Exception) -> Optional[float]:
+    """
+    Si el error es un 429 devuelve los segundos a esperar (0.0 si el provider
+    no manda Retry-After); None si es cualquier otro error
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
 
 class LLMService:
     """Servicio unificado para interactuar con LLMs"""
-    
-    def __init__(self, provider: str = "groq"):
+
+    # Espera máxima entre reintentos tras un 429
+    MAX_RETRY_WAIT_SECONDS = 30.0
+
+    def __init__(
+        self,
+        provider: str = "groq",
+        model: Optional[str] = None,
+        hedge: Optional[bool] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        role: Optional[str] = None
+    ):
         self.provider = provider
+        self.model_name = model or self._get_model_name(provider)
+        self.temperature = temperature
+        self.max_tokens = max_tokens or (4096 if provider == "groq" else None)
+        # Rol fijo (servicio creado por for_role) o None (resuelve el rol por llamada)
+        self.role = role
+        self._role_services: Dict[str, "LLMService"] = {}
         self.llm = self._initialize_llm()
-        self.model_name = self._get_model_name()
-    
-    def _get_model_name(self) -> str:
-        if self.provider == "groq":  
+        self.rate_limiter = client_registry.get_rate_limiter(provider)
+
+        # Hedging (opt-in): respaldo en otro provider/modelo ante latencias de cola
+        self.hedge = settings.LLM_HEDGING_ENABLED if hedge is None else hedge
+        self.hedge_policy = client_registry.get_hedge_policy(provider, self.model_name)
+        self._hedge_service: Optional["LLMService"] = None
+
+    @staticmethod
+    def _get_model_name(provider: str) -> str:
+        if provider == "groq":
             return settings.DEFAULT_GROQ_MODEL
+        if provider == "fake":
+            return settings.FAKE_LLM_MODEL
         return settings.DEFAULT_OLLAMA_MODEL
-    
+
     def _initialize_llm(self):
-        if self.provider == "groq":  
-            return ChatGroq(
-                model=settings.DEFAULT_GROQ_MODEL,
-                api_key=settings.GROQ_API_KEY,
-                temperature=0.7,
-                max_tokens=4096
-            )
-        elif self.provider == "ollama":  
-            return Ollama(
-                model=settings.DEFAULT_OLLAMA_MODEL,
-                base_url=settings.OLLAMA_BASE_URL,
-                temperature=0.7
-            )
-        else:
+        if self.provider not in ("groq", "ollama", "fake"):
             raise ValueError(f"Provider '{self.provider}' no soportado")
-    
-    async def generate(self, prompt: str) -> str:
-        """Genera contenido basado en el prompt"""
-        try:
-            if self.provider == "groq":  
-                response = await self.llm.ainvoke([HumanMessage(content=prompt)])
-                return response.content
-            else: 
-                # ✅ CORREGIDO: Ejecutar Ollama en un thread separado para no bloquear el event loop
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None,  # Usa el executor por defecto (ThreadPoolExecutor)
-                    lambda: self.llm.invoke(prompt)
+        return client_registry.get_client(self.provider, self.model_name, self.temperature, self.max_tokens)
+
+    @property
+    def hedge_service(self) -> Optional["LLMService"]:
+        """Servicio de respaldo para el hedging (None si coincide con el principal)"""
+        if self._hedge_service is None and self.hedge:
+            provider = settings.LLM_HEDGE_PROVIDER or self.provider
+            model = settings.LLM_HEDGE_MODEL or self._get_model_name(provider)
+            if (provider, model) == (self.provider, self.model_name):
+                self.hedge = False
+                return None
+            # Misma temperatura y tope de tokens que el principal (los de su rol)
+            self._hedge_service = LLMService(
+                provider=provider,
+                model=model,
+                hedge=False,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                role=self.role
+            )
+        return self._hedge_service
+
+    def for_role(self, role: str) -> "LLMService":
+        """
+        Servicio configurado para un rol según LLM_ROLES (modelo, temperatura
+        y tope de tokens); el propio servicio si la configuración coincide
+        """
+        if self.role is not None:
+            return self
+        service = self._role_services.get(role)
+        if service is None:
+            config = settings.LLM_ROLES.get(role, {})
+            model = config.get(f"{self.provider}_model") or self.model_name
+            temperature = config.get("temperature", self.temperature)
+            max_tokens = config.get("max_tokens", self.max_tokens)
+            if (model, temperature, max_tokens) == (self.model_name, self.temperature, self.max_tokens):
+                service = self
+            else:
+                service = LLMService(
+                    provider=self.provider,
+                    model=model,
+                    hedge=self.hedge,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    role=role
                 )
-                return response
-        except Exception as e:
-            raise Exception(f"Error al generar contenido con {self.provider}:  {str(e)}")
\ No newline at end of file
+            self._role_services[role] = service
+        return service
+
+    def _batch_max_tokens(self) -> int:
+        """Tope de salida de los prompts multi-tarea (rol batch)"""
+        return settings.LLM_ROLES.get("batch", {}).get("max_tokens", self.max_tokens)
+
+    def _batch_executor(self) -> Callable[[str], Awaitable[str]]:
+        """Llamada para los prompts multi-tarea: mismo modelo, con temperatura y tope del rol batch"""
+        config = settings.LLM_ROLES.get("batch", {})
+        batch_service = LLMService(
+            provider=self.provider,
+            model=self.model_name,
+            hedge=False,
+            temperature=config.get("temperature", self.temperature),
+            max_tokens=self._batch_max_tokens(),
+            role="batch"
+        )
+        return batch_service._generate
+
+    async def preload(self) -> bool:
+        """Carga el modelo en memoria (solo Ollama; en Groq no aplica)"""
+        if self.provider == "ollama":
+            return await self.llm.preload()
+        return False
+
+    @staticmethod
+    def get_stats() -> dict:
+        """Métricas de los clientes LLM compartidos"""
+        response_cache = _response_cache
+        return {
+            "client_pool": client_registry.get_stats(),
+            "rate_limits": client_registry.get_rate_limit_stats(),
+            "coalescing": inflight_calls.get_stats(),
+            "hedging": client_registry.get_hedge_stats(),
+            "batching": client_registry.get_batch_stats(),
+            "roles": role_latency.get_stats(),
+            "disk_cache": response_cache.get_stats() if response_cache else None
+        }
+
+    def _client_for(self, max_tokens: Optional[int]):
+        """Cliente con el tope de tokens pedido (el del servicio si no se indica)"""
+        if max_tokens is None or max_tokens == self.max_tokens:
+            return self.llm
+        return client_registry.get_client(self.provider, self.model_name, self.temperature, max_tokens)
+
+    async def _invoke(self, prompt: str, max_tokens: Optional[int] = None) -> Tuple[str, Optional[dict]]:
+        """Una llamada al provider: (texto, usage de tokens si el provider lo informa)"""
+        llm = self._client_for(max_tokens)
+        if self.provider == "groq":
+            response = await llm.ainvoke([HumanMessage(content=prompt)])
+            usage = getattr(response, "usage_metadata", None)
+            return response.content, usage if isinstance(usage, dict) else None
+        # Cliente Ollama async nativo (no ocupa threads del executor) o fake: misma interfaz
+        return await llm.generate(prompt), None
+
+    def _call_key(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Identidad byte a byte de una llamada: provider, modelo, parámetros y prompt"""
+        return LLMResponseCache.make_key(
+            self.provider, self.model_name, self.temperature, max_tokens or self.max_tokens, prompt
+        )
+
+    async def generate(
+        self,
+        prompt: str,
+        call_type: str = "generation",
+        max_tokens: Optional[int] = None,
+        batchable: bool = False
+    ) -> str:
+        """
+        Genera contenido basado en el prompt
+
+        Args:
+            prompt: Prompt completo
+            call_type: Tipo de llamada ("routing", "expansion", "hyde",
+                "compression", "extraction" o "generation"). Los tipos listados
+                en LLM_DISK_CACHE_CALL_TYPES se sirven desde la caché en disco.
+            max_tokens: Tope de tokens de salida para esta llamada (p. ej. el
+                de la plataforma); por defecto el del servicio
+            batchable: Tarea auxiliar corta que puede viajar junto a otras en
+                un único prompt multi-tarea (ver LLMBatcher)
+
+        El modelo, la temperatura y el tope de tokens salen del rol (call_type)
+        en LLM_ROLES. Si ya hay en vuelo una llamada idéntica (mismo modelo,
+        parámetros y prompt), se espera su resultado en vez de repetir la petición.
+        Con un deadline de petición activo, DeadlineExceeded si se agota.
+        Se mide como la etapa "llm_<call_type>" de la petición.
+        """
+        service = self.for_role(call_type)
+        if service is not self:
+            return await service.generate(prompt, call_type, max_tokens, batchable)
+
+        with stage(f"llm_{call_type}"):
+            start = time.monotonic()
+            key = self._call_key(prompt, max_tokens)
+            cache = get_response_cache() if call_type in settings.LLM_DISK_CACHE_CALL_TYPES else None
+            if cache is not None:
+                # SQLite (lectura, LRU y descompresión) fuera del event loop
+                cached = await asyncio.to_thread(cache.get, key)
+                if cached is not None:
+                    role_latency.record(call_type, self.model_name, time.monotonic() - start)
+                    return cached
+
+            async def call() -> str:
+                if batchable and max_tokens is None and settings.LLM_BATCHING_ENABLED:
+                    batcher = client_registry.get_batcher(
+                        self.provider, self.model_name, self._batch_executor, self._batch_max_tokens()
+                    )
+                    # Con el tope de su rol: el lote se cierra antes de pasar el del rol batch
+                    content = await batcher.submit(prompt, self.max_tokens)
+                elif self.hedge and self.hedge_service is not None:
+                    content = await self._generate_hedged(prompt, max_tokens, call_type)
+                else:
+                    content = await self._generate(prompt, max_tokens)
+                if cache is not None:
+                    await asyncio.to_thread(cache.set, key, content)
+                return content
+
+            # Nunca se espera más allá del deadline de la petición (si lo hay)
+            content = await required_stage(call_type, inflight_calls.do(key, call))
+            role_latency.record(call_type, self.model_name, time.monotonic() - start)
+            return content
+
+    async def _generate_hedged(self, prompt: str, max_tokens: Optional[int], call_type: str) -> str:
+        """
+        Lanza la petición al provider principal y, si no ha respondido al
+        llegar al percentil de su latencia reciente, otra al de respaldo.
+        Gana la primera respuesta correcta; la otra se cancela.
+        """
+        policy = self.hedge_policy
+        policy.calls += 1
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._generate(prompt, max_tokens))
+        tasks = {primary}
+
+        try:
+            hedged = False
+            delay = policy.hedge_delay(call_type)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and policy.try_hedge():
+                    tasks.add(asyncio.ensure_future(self.hedge_service._generate(prompt, max_tokens)))
+                    hedged = True
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                # Si terminan a la vez, se prefiere la respuesta del principal
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task is primary:
+                        policy.record_latency(call_type, time.monotonic() - start)
+                    if task.exception() is None:
+                        if hedged and task is primary:
+                            policy.primary_wins += 1
+                        elif hedged:
+                            policy.hedge_wins += 1
+                        return task.result()
+                    # Si fallan ambos, se propaga el error del principal
+                    if task is primary or error is None:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    if task is primary:
+                        # Latencia censurada: al menos lo que llevaba esperando
+                        policy.record_latency(call_type, time.monotonic() - start)
+                    task.cancel()
+
+    async def _generate(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Llamada al provider respetando su rate limit (con reintentos ante 429)"""
+        prompt_tokens = _estimate_tokens(prompt)
+        estimated = self.rate_limiter.estimate_tokens(prompt_tokens, max_tokens or self.max_tokens)
+        retries = settings.LLM_RATE_LIMIT_RETRIES
+        retry_after = None
+
+        for attempt in range(retries + 1):
+            async with self.rate_limiter.reserve(estimated) as permit:
+                try:
+                    content, usage = await self._invoke(prompt, max_tokens)
+                except Exception as e:
+                    retry_after = _rate_limit_retry_after(e)
+                    if retry_after is None:
+                        raise Exception(f"Error al generar contenido con {self.provider}:  {str(e)}")
+                    permit.rate_limited = True
+                else:
+                    completion_tokens = (usage or {}).get("output_tokens") or _estimate_tokens(content)
+                    permit.actual_tokens = (usage or {}).get("total_tokens") or prompt_tokens + completion_tokens
+                    self.rate_limiter.observe_completion(completion_tokens)
+                    return content
+
+            # 429: esperar fuera del limiter (sin ocupar plaza) y reintentar
+            if attempt < retries:
+                backoff = retry_after or 0.5 * 2 ** attempt
+                await asyncio.sleep(min(backoff, self.MAX_RETRY_WAIT_SECONDS))
+
+        raise RateLimitError(
+            f"Rate limit de {self.provider} excedido tras {retries + 1} intentos",
+            retry_after=retry_after
+        )
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Genera contenido token a token (deltas de texto) según llegan del provider"""
+        service = self.for_role("generation")
+        if service is not self:
+            async for delta in service.stream(prompt, max_tokens):
+                yield delta
+            return
+
+        start = time.monotonic()
+        prompt_tokens = _estimate_tokens(prompt)
+        estimated = self.rate_limiter.estimate_tokens(prompt_tokens, max_tokens or self.max_tokens)
+        llm = self._client_for(max_tokens)
+
+        async with self.rate_limiter.reserve(estimated) as permit:
+            # Se cuenta al final con el mismo tokenizer que generate(): por
+            # trozos se partirían tokens
+            completion: List[str] = []
+            try:
+                if self.provider == "groq":
+                    chunks = llm.astream([HumanMessage(content=prompt)])
+                    async for chunk in iterate_within_deadline("generation", chunks):
+                        if chunk.content:
+                            completion.append(chunk.content)
+                            yield chunk.content
+                else:
+                    async for chunk in iterate_within_deadline("generation", llm.stream(prompt)):
+                        completion.append(chunk)
+                        yield chunk
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                retry_after = _rate_limit_retry_after(e)
+                if retry_after is not None:
+                    permit.rate_limited = True
+                    raise RateLimitError(f"Rate limit de {self.provider} excedido", retry_after=retry_after)
+                raise Exception(f"Error al generar contenido con {self.provider}:  {str(e)}")
+
+            completion_tokens = _estimate_tokens("".join(completion))
+            permit.actual_tokens = prompt_tokens + completion_tokens
+            self.rate_limiter.observe_completion(completion_tokens)
+        role_latency.record("generation", self.model_name, time.monotonic() - start)
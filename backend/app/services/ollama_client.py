@@ -0,0 +1,120 @@
+"""
+Cliente async nativo para la API HTTP de Ollama
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+import httpx
+
+
+class OllamaAsyncClient:
+    """
+    Cliente async para Ollama sobre httpx (sin threads).
+
+    - Reutiliza un httpx.AsyncClient keep-alive compartido
+    - Streaming real de tokens desde /api/generate
+    - keep_alive para que el modelo no se descargue de memoria entre peticiones
+    - Semáforo de concurrencia alineado con OLLAMA_NUM_PARALLEL del servidor:
+      las peticiones que no caben esperan aquí en lugar de encolarse en Ollama
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        temperature: float = 0.7,
+        num_predict: Optional[int] = None,
+        keep_alive: str = "30m",
+        http_client: Optional[httpx.AsyncClient] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        max_parallel: int = 4
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.temperature = temperature
+        self.num_predict = num_predict
+        self.keep_alive = keep_alive
+        self._http_client = http_client
+        self._semaphore = semaphore or asyncio.Semaphore(max_parallel)
+        self.in_flight = 0
+        self.waiting = 0
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=httpx.Timeout(300.0))
+        return self._http_client
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        options = {"temperature": self.temperature}
+        if self.num_predict:
+            options["num_predict"] = self.num_predict
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def generate(self, prompt: str) -> str:
+        """Genera la respuesta completa (stream=false)"""
+        await self._acquire()
+        try:
+            response = await self.http_client.post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, stream=False)
+            )
+            response.raise_for_status()
+            return response.json().get("response", "")
+        finally:
+            self._release()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Genera la respuesta token a token (NDJSON de /api/generate)"""
+        await self._acquire()
+        try:
+            async with self.http_client.stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, stream=True)
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(data["error"])
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done"):
+                        break
+        finally:
+            self._release()
+
+    async def preload(self) -> bool:
+        """Carga el modelo en memoria (petición sin prompt) para evitar el arranque en frío"""
+        try:
+            response = await self.http_client.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive}
+            )
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def get_stats(self) -> dict:
+        return {"in_flight": self.in_flight, "waiting": self.waiting}
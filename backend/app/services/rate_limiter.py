@@ -0,0 +1,253 @@
+"""
+Rate limiter por provider LLM: presupuestos RPM/TPM y concurrencia adaptativa (AIMD)
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Optional, Tuple
+
+
+class RateLimitError(Exception):
+    """El provider rechazó la petición por límite de uso (HTTP 429) tras agotar los reintentos"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Permit:
+    """Reserva concedida por el limiter para una llamada al LLM"""
+    estimated_tokens: int
+    acquired_at: float = field(default_factory=time.monotonic)
+    actual_tokens: Optional[int] = None
+    rate_limited: bool = False
+
+
+class ProviderRateLimiter:
+    """
+    Limiter de un provider LLM.
+
+    - Presupuestos por ventana deslizante de requests (RPM) y tokens (TPM);
+      0 desactiva el presupuesto correspondiente
+    - Cola FIFO: nadie adelanta al primero de la cola aunque su petición quepa
+    - Concurrencia AIMD: +1/límite por éxito, ×0.5 ante un 429 o un pico de
+      latencia (ms por token > latency_spike_factor × media móvil; se mide por
+      token para que un post largo no cuente como pico frente a un routing)
+    """
+
+    EWMA_ALPHA = 0.2
+    MIN_LATENCY_SAMPLES = 5
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        latency_spike_factor: float = 3.0,
+        window_seconds: float = 60.0,
+        default_completion_tokens: int = 512
+    ):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_spike_factor = latency_spike_factor
+        self.window_seconds = window_seconds
+
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._queue: Deque[object] = deque()
+        self._request_times: Deque[float] = deque()
+        self._token_window: Deque[Tuple[float, int]] = deque()  # (timestamp, tokens)
+        self._window_tokens = 0
+
+        # Estimaciones aprendidas
+        self.avg_completion_tokens = float(default_completion_tokens)
+        self.avg_ms_per_token: Optional[float] = None
+        self._latency_samples = 0
+
+        # Métricas
+        self.total_acquired = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.max_queue_depth = 0
+        self.rate_limited = 0
+        self.latency_spikes = 0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def estimate_tokens(self, prompt_tokens: int, max_tokens: Optional[int] = None) -> int:
+        """Tokens previstos: prompt + completion media observada (acotada por max_tokens)"""
+        completion = int(self.avg_completion_tokens)
+        if max_tokens:
+            completion = min(completion, max_tokens)
+        return prompt_tokens + completion
+
+    def _prune_window(self, now: float):
+        while self._request_times and now - self._request_times[0] >= self.window_seconds:
+            self._request_times.popleft()
+        while self._token_window and now - self._token_window[0][0] >= self.window_seconds:
+            _, tokens = self._token_window.popleft()
+            self._window_tokens -= tokens
+
+    def _admission_delay(self, tokens: int) -> Optional[float]:
+        """
+        0 si la petición puede salir ya, segundos hasta que quepa en el
+        presupuesto, o None si hay que esperar a que termine otra llamada
+        """
+        if self.in_flight >= max(int(self.concurrency_limit), self.min_concurrency):
+            return None
+
+        now = time.monotonic()
+        self._prune_window(now)
+
+        delay = 0.0
+        if self.rpm and len(self._request_times) >= self.rpm:
+            oldest = self._request_times[len(self._request_times) - self.rpm]
+            delay = max(delay, oldest + self.window_seconds - now)
+
+        if self.tpm and self._token_window and self._window_tokens + tokens > self.tpm:
+            # Esperar a que caduquen entradas suficientes para que quepa
+            excess = self._window_tokens + tokens - self.tpm
+            freed = 0
+            for timestamp, entry_tokens in self._token_window:
+                freed += entry_tokens
+                if freed >= excess:
+                    delay = max(delay, timestamp + self.window_seconds - now)
+                    break
+            else:
+                # Ni vaciando la ventana cabe: esperar a que caduque entera
+                delay = max(delay, self._token_window[-1][0] + self.window_seconds - now)
+        return max(delay, 0.0)
+
+    async def acquire(self, estimated_tokens: int) -> Permit:
+        """Espera turno (FIFO) hasta que la llamada quepa en concurrencia y presupuestos"""
+        start = time.monotonic()
+        ticket = object()
+        cond = self.condition
+
+        async with cond:
+            self._queue.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    delay = None
+                    if self._queue[0] is ticket:
+                        delay = self._admission_delay(estimated_tokens)
+                        if delay == 0:
+                            break
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._queue.remove(ticket)
+                cond.notify_all()
+                raise
+
+            self._queue.popleft()
+            self.in_flight += 1
+            now = time.monotonic()
+            self._request_times.append(now)
+            self._token_window.append((now, estimated_tokens))
+            self._window_tokens += estimated_tokens
+            # El siguiente de la cola puede que también quepa
+            cond.notify_all()
+
+        wait_ms = (time.monotonic() - start) * 1000
+        self.total_acquired += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        return Permit(estimated_tokens=estimated_tokens)
+
+    async def release(self, permit: Permit):
+        """Libera la reserva, corrige los tokens reales y ajusta la concurrencia"""
+        latency_ms = (time.monotonic() - permit.acquired_at) * 1000
+        ms_per_token = latency_ms / max(permit.actual_tokens or permit.estimated_tokens, 1)
+        async with self.condition:
+            self.in_flight -= 1
+
+            if permit.actual_tokens is not None:
+                correction = permit.actual_tokens - permit.estimated_tokens
+                if correction:
+                    self._token_window.append((time.monotonic(), correction))
+                    self._window_tokens += correction
+
+            if permit.rate_limited:
+                self.rate_limited += 1
+                self._decrease()
+            elif self._is_latency_spike(ms_per_token):
+                self.latency_spikes += 1
+                self._decrease()
+            else:
+                self._increase()
+                self._observe_latency(ms_per_token)
+
+            self.condition.notify_all()
+
+    def observe_completion(self, completion_tokens: int):
+        """Actualiza la media de tokens de completion usada en las estimaciones"""
+        self.avg_completion_tokens += self.EWMA_ALPHA * (completion_tokens - self.avg_completion_tokens)
+
+    def _observe_latency(self, ms_per_token: float):
+        self._latency_samples += 1
+        if self.avg_ms_per_token is None:
+            self.avg_ms_per_token = ms_per_token
+        else:
+            self.avg_ms_per_token += self.EWMA_ALPHA * (ms_per_token - self.avg_ms_per_token)
+
+    def _is_latency_spike(self, ms_per_token: float) -> bool:
+        return (
+            self._latency_samples >= self.MIN_LATENCY_SAMPLES
+            and self.avg_ms_per_token is not None
+            and ms_per_token > self.avg_ms_per_token * self.latency_spike_factor
+        )
+
+    def _increase(self):
+        # Additive increase: ~+1 por cada "ventana" de límite éxitos
+        self.concurrency_limit = min(
+            self.concurrency_limit + 1.0 / max(self.concurrency_limit, 1.0),
+            float(self.max_concurrency)
+        )
+
+    def _decrease(self):
+        # Multiplicative decrease
+        self.concurrency_limit = max(self.concurrency_limit * 0.5, float(self.min_concurrency))
+
+    @asynccontextmanager
+    async def reserve(self, estimated_tokens: int) -> AsyncIterator[Permit]:
+        """`async with limiter.reserve(n) as permit:` adquiere y libera automáticamente"""
+        permit = await self.acquire(estimated_tokens)
+        try:
+            yield permit
+        finally:
+            await self.release(permit)
+
+    def get_stats(self) -> dict:
+        self._prune_window(time.monotonic())
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.concurrency_limit, 2),
+            "requests_in_window": len(self._request_times),
+            "tokens_in_window": self._window_tokens,
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "total_acquired": self.total_acquired,
+            "avg_wait_ms": round(self.total_wait_ms / max(self.total_acquired, 1), 2),
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "rate_limited": self.rate_limited,
+            "latency_spikes": self.latency_spikes
+        }
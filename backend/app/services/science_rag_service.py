@@ -1,7 +1,11 @@
 """
 Servicio RAG para contenido científico divulgativo
 """
+import asyncio
 from typing import List, Optional
+from app.core.deadline import optional_stage
+from app.core.prompts import get_context_budget, get_max_tokens
+from app.core.tokens import pack_texts
 from app.rag.vector_store import VectorStore
 from app.rag.arxiv_loader import ArxivLoader
 from app.services.llm_service import LLMService
@@ -59,18 +63,24 @@ NO incluyas meta-comentarios sobre el contenido.
         # 1. Buscar papers relevantes en el vector store
         relevant_docs = self.vector_store.search(topic, n_results=5)
         
-        # 2. Si no hay suficientes resultados, indexar desde arXiv
+        # 2. Si no hay suficientes resultados, indexar desde arXiv (en un thread,
+        # para no bloquear el event loop; opcional si el deadline va justo)
         if len(relevant_docs) < 3:
-            self.vector_store.index_from_arxiv(
+            indexed = await optional_stage("arxiv_index", asyncio.to_thread(
+                self.vector_store.index_from_arxiv,
                 query=topic,
                 category=scientific_area,
                 max_papers=15
-            )
+            ), default=0)
             # Buscar de nuevo
-            relevant_docs = self.vector_store.search(topic, n_results=5)
+            if indexed:
+                relevant_docs = self.vector_store.search(topic, n_results=5)
         
-        # 3. Construir contexto
-        context = self._build_context(relevant_docs)
+        # 3. Construir contexto dentro del presupuesto de tokens de la plataforma
+        budget = get_context_budget(
+            platform, self.SCIENCE_PROMPT_TEMPLATE, topic, language, platform, additional_instructions
+        )
+        context = self._build_context(relevant_docs, budget)
         
         # 4. Generar prompt
         prompt = self.SCIENCE_PROMPT_TEMPLATE.format(
@@ -82,7 +92,7 @@ NO incluyas meta-comentarios sobre el contenido.
         )
         
         # 5. Generar contenido
-        content = await self.llm_service.generate(prompt)
+        content = await self.llm_service.generate(prompt, max_tokens=get_max_tokens(platform))
         
         # 6. Retornar con fuentes
         return {
@@ -100,8 +110,8 @@ NO incluyas meta-comentarios sobre el contenido.
             "topic": topic
         }
     
-    def _build_context(self, documents: List[dict]) -> str:
-        """Construye el contexto a partir de los documentos recuperados"""
+    def _build_context(self, documents: List[dict], max_tokens: int) -> str:
+        """Construye el contexto a partir de los documentos recuperados (los más relevantes primero)"""
         context_parts = []
         
         for i, doc in enumerate(documents, 1):
@@ -110,7 +120,7 @@ NO incluyas meta-comentarios sobre el contenido.
 **Autores**:  {doc['metadata']['authors']}
 **Fecha**: {doc['metadata']['published']}
 
-{doc['content'][: 1500]}...
+{doc['content']}
 """)
         
-        return "\n".join(context_parts)
\ No newline at end of file
+        return "\n".join(pack_texts(context_parts, max_tokens, separator="\n"))
\ No newline at end of file
@@ -24,6 +24,54 @@ def mock_llm_service():
     return service
 
 
+# Registro de clientes LLM limpio en cada test (los clientes se comparten por proceso)
+@pytest.fixture(autouse=True)
+def reset_llm_client_registry():
+    """Evita que un cliente creado en un test se reutilice en otro"""
+    from app.services.llm_service import client_registry, role_latency
+    client_registry.clear()
+    role_latency.clear()
+    yield
+    client_registry.clear()
+    role_latency.clear()
+
+
+# Caché de respuestas en disco aislada por test (nunca el fichero real)
+@pytest.fixture(autouse=True)
+def isolated_llm_response_cache(tmp_path, monkeypatch):
+    """Cada test usa su propio fichero SQLite temporal"""
+    from app.services import llm_service
+    monkeypatch.setattr(llm_service.settings, "LLM_DISK_CACHE_PATH", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_service, "_response_cache", None)
+    yield
+    if llm_service._response_cache is not None:
+        llm_service._response_cache.close()
+
+
+# Cola de trabajos aislada por test (nunca el fichero real)
+@pytest.fixture(autouse=True)
+def isolated_job_queue(tmp_path, monkeypatch):
+    """Cada test usa su propio fichero SQLite temporal para la cola de trabajos"""
+    from app.services import job_queue
+    monkeypatch.setattr(job_queue.settings, "JOB_QUEUE_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_queue, "_job_queue", None)
+    yield
+    if job_queue._job_queue is not None:
+        job_queue._job_queue.close()
+
+
+# L2 de la caché de resultados aislado por test (nunca el fichero real)
+@pytest.fixture(autouse=True)
+def isolated_result_cache_l2(tmp_path, monkeypatch):
+    """Cada test usa su propio fichero SQLite temporal como L2"""
+    from app.agents import result_cache
+    monkeypatch.setattr(result_cache.settings, "RESULT_CACHE_L2_PATH", str(tmp_path / "result_cache.db"))
+    monkeypatch.setattr(result_cache, "_shared_backend", None)
+    yield
+    if result_cache._shared_backend is not None:
+        result_cache._shared_backend.close()
+
+
 # Fixture para datos de test
 @pytest.fixture
 def content_request_data():
@@ -53,6 +53,18 @@ class TestContentEndpoints:
                 data = response.json()
                 assert "detail" in data
 
+    
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_prometheus_metrics(self):
+        """Test: Métricas en formato de texto de Prometheus"""
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/content/metrics/prometheus")
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/plain")
+            assert "# TYPE orchestrator_request_duration_seconds histogram" in response.text
+
 
 class TestFinancialEndpoints:
     """Tests de integración para endpoints financieros"""
@@ -0,0 +1,113 @@
+"""
+Tests unitarios para BatchPlanner
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.batch_planner import BatchPlanner
+from app.agents.orchestrator import AgentOrchestrator, AgentType
+
+
+def make_orchestrator(provider: str = "groq") -> AgentOrchestrator:
+    """Orchestrator con agentes mockeados; el financiero comparte contexto de mercado"""
+    with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+         patch('app.agents.orchestrator.FinancialAgent') as mock_financial, \
+         patch('app.agents.orchestrator.ScienceAgent') as mock_science:
+        for mock, name in [(mock_content, "content"), (mock_financial, "financial"), (mock_science, "science")]:
+            instance = MagicMock(spec=["description", "generate"])
+            instance.description = f"{name} agent"
+            instance.generate = AsyncMock(return_value={"content": f"{name} result ({provider})"})
+            mock.return_value = instance
+        orchestrator = AgentOrchestrator(llm_provider=provider, enable_semantic_cache=False)
+    
+    financial = MagicMock()
+    financial.description = "financial agent"
+    financial.generate = AsyncMock(return_value={"content": f"financial result ({provider})"})
+    financial.shared_context_key = MagicMock(return_value="market")
+    financial.fetch_shared_context = AsyncMock(return_value={"market_data": ("summary", "news")})
+    orchestrator.agents[AgentType.FINANCIAL] = financial
+    return orchestrator
+
+
+def item(topic: str, platform: str = "twitter", **extra) -> dict:
+    return {"topic": topic, "platform": platform, "audience": "general", "generate_image": False, **extra}
+
+
+class TestBatchPlanner:
+    """Suite de tests para BatchPlanner"""
+    
+    @pytest.mark.asyncio
+    async def test_identical_items_run_once(self):
+        """Test: Los items idénticos se generan una vez y el resultado se copia en orden"""
+        orchestrator = make_orchestrator()
+        requests = [item("Recetas de cocina")] * 3 + [item("Viajes por Europa")]
+        
+        results = await orchestrator.process_batch(requests)
+        
+        assert len(results) == 4
+        assert orchestrator.agents[AgentType.CONTENT].generate.await_count == 2
+        assert [bool(result.get("deduplicated")) for result in results] == [False, True, True, False]
+        assert results[3]["topic"] == "Viajes por Europa"
+    
+    @pytest.mark.asyncio
+    async def test_financial_group_fetches_market_context_once(self):
+        """Test: Los items financieros del lote comparten una sola obtención de datos de mercado"""
+        orchestrator = make_orchestrator()
+        requests = [
+            item("Evolución de la bolsa", "twitter"),
+            item("Evolución de la bolsa", "linkedin"),
+            item("Acciones de Apple y dividendos", "blog"),
+        ]
+        planner = BatchPlanner(lambda provider: orchestrator)
+        
+        results = await planner.run(requests)
+        
+        financial = orchestrator.agents[AgentType.FINANCIAL]
+        assert all(result["agent_used"] == "financial" for result in results)
+        assert financial.fetch_shared_context.await_count == 1
+        assert financial.generate.await_count == 3
+        for call in financial.generate.await_args_list:
+            assert call.kwargs["shared_context"] == {"market_data": ("summary", "news")}
+        assert planner.stats["groups"] == 1
+        assert planner.stats["shared_context_fetches"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_shared_fetch_falls_back_per_item(self):
+        """Test: Si falla el contexto compartido cada item obtiene el suyo"""
+        orchestrator = make_orchestrator()
+        financial = orchestrator.agents[AgentType.FINANCIAL]
+        financial.fetch_shared_context = AsyncMock(side_effect=RuntimeError("MCP caído"))
+        
+        results = await orchestrator.process_batch([
+            item("Mercado de acciones", "twitter"),
+            item("Mercado de acciones", "blog"),
+        ])
+        
+        assert all("error" not in result for result in results)
+        for call in financial.generate.await_args_list:
+            assert "shared_context" not in call.kwargs
+    
+    @pytest.mark.asyncio
+    async def test_items_use_their_own_provider(self):
+        """Test: Cada item se ejecuta con el orchestrator de su llm_provider"""
+        orchestrators = {"groq": make_orchestrator("groq"), "ollama": make_orchestrator("ollama")}
+        planner = BatchPlanner(orchestrators.__getitem__, default_provider="groq")
+        
+        results = await planner.run([
+            item("Recetas de cocina"),
+            item("Recetas de cocina", llm_provider="ollama"),
+        ])
+        
+        assert results[0]["content"] == "content result (groq)"
+        assert results[1]["content"] == "content result (ollama)"
+        assert planner.stats["unique"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_routed_once_before_generation(self):
+        """Test: El planner enruta cada item y el orchestrator no vuelve a enrutarlo"""
+        orchestrator = make_orchestrator()
+        orchestrator._route = AsyncMock(wraps=orchestrator._route)
+        
+        await orchestrator.process_batch([item("Física cuántica y partículas"), item("Recetas de cocina")])
+        
+        assert orchestrator._route.await_count == 2
+        assert orchestrator.agents[AgentType.SCIENCE].generate.await_count == 1
@@ -0,0 +1,152 @@
+"""
+Tests unitarios para los deadlines por petición
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.deadline import (
+    DeadlineExceeded,
+    current_deadline,
+    deadline_scope,
+    optional_stage,
+    remaining_time,
+    request_deadline_seconds,
+    required_stage,
+)
+
+
+async def _sleep_and_return(seconds: float, value: str) -> str:
+    await asyncio.sleep(seconds)
+    return value
+
+
+class TestDeadline:
+    """Suite de tests para deadline_scope y las etapas opcionales/obligatorias"""
+
+    @pytest.mark.asyncio
+    async def test_without_deadline_stages_run_normally(self):
+        """Test: Sin deadline las etapas se ejecutan sin límite"""
+        assert current_deadline() is None
+        assert remaining_time(60.0) == 60.0
+        assert await optional_stage("image", _sleep_and_return(0, "ok")) == "ok"
+        assert await required_stage("generation", _sleep_and_return(0, "ok")) == "ok"
+
+    @pytest.mark.asyncio
+    async def test_optional_stage_skipped_when_budget_is_low(self):
+        """Test: Una etapa opcional sin su presupuesto mínimo no se lanza y queda como descartada"""
+        started = []
+
+        async def mcp_call():
+            started.append(True)
+            return "market data"
+
+        with deadline_scope(0.5) as deadline:
+            result = await optional_stage("mcp", mcp_call(), default="fallback")
+
+        assert result == "fallback"
+        assert started == []
+        assert deadline.dropped == ["mcp"]
+        assert current_deadline() is None
+
+    @pytest.mark.asyncio
+    async def test_optional_stage_cancelled_when_budget_runs_out(self):
+        """Test: Una etapa opcional se cancela al agotar su presupuesto y devuelve el default"""
+        with deadline_scope(0.2) as deadline:
+            result = await optional_stage("image", _sleep_and_return(5, "url"), reserve=False)
+
+        assert result is None
+        assert deadline.dropped == ["image"]
+
+    @pytest.mark.asyncio
+    async def test_required_stage_raises_deadline_exceeded(self):
+        """Test: Una etapa obligatoria que no termina a tiempo lanza DeadlineExceeded"""
+        with deadline_scope(0.1):
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                await required_stage("generation", _sleep_and_return(5, "content"))
+
+        assert exc_info.value.stage == "generation"
+
+    @pytest.mark.asyncio
+    async def test_nested_scope_keeps_tighter_deadline(self):
+        """Test: Un deadline interior más largo no amplía el de la petición"""
+        with deadline_scope(1.0) as outer:
+            with deadline_scope(30.0) as inner:
+                assert inner is outer
+            assert remaining_time() <= 1.0
+
+    def test_request_deadline_is_strictest_of_field_and_header(self):
+        """Test: El deadline del cliente es el más estricto entre el campo y la cabecera"""
+        assert request_deadline_seconds(5000, 2000) == 2.0
+        assert request_deadline_seconds(None, 3000) == 3.0
+        assert request_deadline_seconds(None, 0) is None
+
+    @pytest.mark.asyncio
+    async def test_required_stage_honours_extension_while_waiting(self):
+        """Test: Ampliar el deadline de un trabajo compartido alarga la espera ya en curso"""
+        with deadline_scope(0.1) as deadline:
+            waiting = asyncio.ensure_future(required_stage("generation", _sleep_and_return(0.3, "content")))
+            await asyncio.sleep(0.01)
+            deadline.extend(None)
+
+            assert await waiting == "content"
+
+
+class TestOrchestratorDeadline:
+    """Suite de tests del deadline en AgentOrchestrator"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent') as mock_financial, \
+             patch('app.agents.orchestrator.ScienceAgent') as mock_science:
+            for mock_agent in (mock_content, mock_financial, mock_science):
+                instance = MagicMock()
+                instance.generate = AsyncMock(return_value={"content": "result"})
+                mock_agent.return_value = instance
+
+            from app.agents.orchestrator import AgentOrchestrator
+            return AgentOrchestrator(llm_provider="groq", enable_semantic_cache=False)
+
+    @pytest.mark.asyncio
+    async def test_dropped_stages_reported_and_not_cached(self, orchestrator):
+        """Test: La imagen que no cabe en el deadline se descarta, se informa y no se cachea"""
+        orchestrator._generate_image_async = AsyncMock(return_value="https://img")
+
+        result = await orchestrator.process_request(
+            topic="Tendencias de marketing",
+            platform="twitter",
+            audience="general",
+            content_type="content",
+            deadline_seconds=0.5
+        )
+
+        assert result["content"] == "result"
+        assert result["image_url"] is None
+        assert result["dropped_stages"] == ["image"]
+        orchestrator._generate_image_async.assert_not_awaited()
+        assert len(orchestrator.cache) == 0
+        assert orchestrator.get_metrics()["dropped_stages"] == {"image": 1}
+
+    @pytest.mark.asyncio
+    async def test_slow_agent_exceeds_deadline_without_fallback(self, orchestrator):
+        """Test: Si la generación agota el deadline no se prueban agentes de fallback"""
+        from app.agents.orchestrator import AgentType
+
+        async def slow_generate(**kwargs):
+            return await _sleep_and_return(5, {"content": "late"})
+
+        orchestrator.agents[AgentType.CONTENT].generate = AsyncMock(side_effect=slow_generate)
+
+        with pytest.raises(DeadlineExceeded):
+            await orchestrator.process_request(
+                topic="Tendencias de marketing",
+                platform="twitter",
+                audience="general",
+                content_type="content",
+                generate_image=False,
+                deadline_seconds=0.2
+            )
+
+        orchestrator.agents[AgentType.FINANCIAL].generate.assert_not_called()
+        orchestrator.agents[AgentType.SCIENCE].generate.assert_not_called()
+        assert orchestrator.get_metrics()["deadline_exceeded"] == 1
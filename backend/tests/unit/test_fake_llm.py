@@ -0,0 +1,113 @@
+"""
+Tests unitarios para el provider LLM fake (sin red)
+"""
+import json
+import time
+import pytest
+from unittest.mock import patch
+from app.services.fake_llm import FakeLLMClient
+from app.services.graph_rag_service import GraphRAGService
+from app.services.llm_batcher import LLMBatcher
+from app.services.llm_service import LLMService, settings
+from app.services.rate_limiter import RateLimitError
+
+
+@pytest.fixture
+def instant_fake(monkeypatch):
+    """Provider fake sin latencia"""
+    monkeypatch.setattr(settings, "FAKE_LLM_PROFILE", "instant")
+
+
+class TestFakeLLM:
+    """Suite de tests para FakeLLMClient"""
+    
+    def test_auxiliary_prompts_get_the_expected_shape(self):
+        """Test: Routing, expansión y extracción devuelven JSON válido"""
+        from app.agents.orchestrator import AgentOrchestrator
+        from app.rag.graph_store import KnowledgeGraph
+        client = FakeLLMClient()
+        
+        routing = json.loads(client.respond(AgentOrchestrator.ROUTING_PROMPT.format(
+            topic="Análisis del mercado de bitcoin", platform="twitter", context=""
+        )))
+        assert routing["agent"] == "FINANCIAL"
+        
+        queries = json.loads(client.respond(GraphRAGService.QUERY_EXPANSION_PROMPT.format(query="quantum computing")))
+        assert len(queries) == 3 and all("quantum computing" in q for q in queries)
+        
+        with patch.object(KnowledgeGraph, "add_entity"), patch.object(KnowledgeGraph, "add_relation"):
+            text = "Transformers and Attention improve Translation."
+            prompt = f"Extract scientific entities and their relationships from this text.\n\nTEXT:\n{text}\n\nRespond ONLY with valid JSON"
+            entities = json.loads(client.respond(prompt))
+        assert [e["name"] for e in entities["entities"]] == ["Transformers", "Attention", "Translation"]
+    
+    def test_outputs_are_deterministic(self):
+        """Test: Mismo prompt, misma respuesta (aunque cambie la semilla de latencia)"""
+        prompt = "Crea contenido sobre:  **Energía solar**"
+        assert FakeLLMClient(seed=1).respond(prompt) == FakeLLMClient(seed=2).respond(prompt)
+        assert FakeLLMClient().respond(prompt).startswith("Energía solar:")
+    
+    def test_batch_prompt_answers_every_task(self):
+        """Test: Un prompt multi-tarea se responde con una clave por tarea"""
+        prompt = LLMBatcher.build_prompt(
+            ["t1", "t2"],
+            [
+                GraphRAGService.QUERY_EXPANSION_PROMPT.format(query="fusion"),
+                GraphRAGService.HYDE_PROMPT.format(query="fusion")
+            ]
+        )
+        answers = LLMBatcher.parse_answers(FakeLLMClient().respond(prompt), ["t1", "t2"])
+        assert len(json.loads(answers["t1"])) == 3
+        assert "fusion" in answers["t2"]
+    
+    @pytest.mark.asyncio
+    async def test_stream_follows_latency_profile(self):
+        """Test: El stream respeta el TTFT y reconstruye la misma respuesta"""
+        client = FakeLLMClient(ttft_ms=50, tokens_per_second=0, jitter=0)
+        prompt = "Crea contenido sobre:  **IA**"
+        
+        start = time.monotonic()
+        chunks = []
+        async for chunk in client.stream(prompt):
+            if not chunks:
+                first_token = time.monotonic() - start
+            chunks.append(chunk)
+        
+        assert first_token >= 0.05
+        assert len(chunks) > 1
+        assert "".join(chunks) == client.respond(prompt)
+    
+    @pytest.mark.asyncio
+    async def test_llm_service_with_fake_provider(self, instant_fake):
+        """Test: LLMService usa el provider fake y respeta max_tokens"""
+        service = LLMService(provider="fake")
+        assert service.model_name == settings.FAKE_LLM_MODEL
+        
+        short = await service.generate("Crea contenido sobre:  **IA**", max_tokens=40)
+        long = await service.generate("Crea contenido sobre:  **IA**")
+        assert len(short) < len(long)
+    
+    @pytest.mark.asyncio
+    async def test_simulated_429_reaches_rate_limit_path(self, instant_fake, monkeypatch):
+        """Test: Errores 429 simulados acaban en RateLimitError"""
+        monkeypatch.setattr(settings, "FAKE_LLM_ERROR_RATE", 1.0)
+        monkeypatch.setattr(settings, "FAKE_LLM_ERROR_STATUS", 429)
+        monkeypatch.setattr(settings, "LLM_RATE_LIMIT_RETRIES", 0)
+        
+        with pytest.raises(RateLimitError):
+            await LLMService(provider="fake").generate("hola")
+    
+    @pytest.mark.asyncio
+    async def test_orchestrator_runs_offline(self, instant_fake):
+        """Test: El orquestador enruta y genera con el provider fake"""
+        with patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'):
+            from app.agents.orchestrator import AgentOrchestrator
+            orchestrator = AgentOrchestrator(llm_provider="fake")
+        
+        result = await orchestrator.process_request(
+            topic="Consejos para teletrabajar", platform="linkedin", audience="general",
+            generate_image=False
+        )
+        assert result["agent_used"] == "content"
+        assert result["content"].startswith("Consejos para teletrabajar:")
@@ -49,3 +49,28 @@ class TestFinancialAgent:
         """Test: Agente tiene descripción"""
         assert FinancialAgent.description is not None
         assert "financiero" in FinancialAgent.description.lower()
+    
+    @pytest.mark.asyncio
+    async def test_shared_market_data_skips_mcp_stage(self, agent):
+        """Test: Con datos compartidos prepare no vuelve a pasar por la etapa (ni el deadline) de MCP"""
+        with patch('app.agents.financial_agent.optional_stage', new_callable=AsyncMock) as stage:
+            await agent.prepare(
+                topic="Bolsa hoy", platform="twitter", audience="general",
+                shared_context={"market_data": ("S&P 500 +1%", "Fed mantiene tipos")}
+            )
+        
+        stage.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_shared_market_data_skips_mcp(self, agent):
+        """Test: Con datos de mercado compartidos (lotes) no se lanza el servidor MCP"""
+        agent._fetch_market_data = AsyncMock(return_value=("S&P 500 +1%", "Fed mantiene tipos"))
+        shared = await agent.fetch_shared_context("Bolsa")
+        
+        first = await agent.prepare(topic="Bolsa hoy", platform="twitter", audience="general", shared_context=shared)
+        second = await agent.prepare(topic="Bolsa hoy", platform="blog", audience="general", shared_context=shared)
+        
+        assert agent._fetch_market_data.await_count == 1
+        assert "S&P 500 +1%" in first["prompt"] and "S&P 500 +1%" in second["prompt"]
+        assert first["market_summary"] == "S&P 500 +1%"
+        assert agent.shared_context_key("Bitcoin") == agent.shared_context_key("Bolsa")
@@ -0,0 +1,123 @@
+"""
+Tests unitarios para el hedging de peticiones LLM
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.hedging import HedgePolicy
+from app.services.llm_service import LLMService
+
+
+def warmed_policy(latency: float, samples: int = 20, **kwargs) -> HedgePolicy:
+    policy = HedgePolicy(min_samples=samples, **kwargs)
+    for _ in range(samples):
+        policy.record_latency("generation", latency)
+    return policy
+
+
+class TestHedgePolicy:
+    """Suite de tests para HedgePolicy"""
+    
+    def test_delay_needs_samples_and_uses_percentile(self):
+        """Test: Sin muestras suficientes no hay hedge; con ellas el retardo es el percentil"""
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay_seconds=0)
+        assert policy.hedge_delay("generation") is None
+        
+        for latency in range(1, 11):
+            policy.record_latency("generation", latency / 10)
+        assert policy.hedge_delay("generation") == pytest.approx(0.9)
+        assert policy.hedge_delay("routing") is None
+    
+    def test_budget_bounds_hedge_rate(self):
+        """Test: No se duplican más llamadas que max_hedge_rate"""
+        policy = HedgePolicy(max_hedge_rate=0.1)
+        policy.calls = 20
+        assert policy.try_hedge()
+        assert policy.try_hedge()
+        assert not policy.try_hedge()
+        assert policy.get_stats()["skipped_budget"] == 1
+
+
+class TestHedgedGeneration:
+    """Suite de tests para LLMService con hedging"""
+    
+    @pytest.fixture
+    def services(self):
+        """Servicio principal (Groq) con hedging y su respaldo con _generate controlables"""
+        with patch('app.services.llm_service.ChatGroq'), \
+             patch('app.services.llm_service.OllamaAsyncClient'):
+            service = LLMService(provider="groq", hedge=True)
+            backup = service.hedge_service
+        assert backup.provider == "ollama"
+        return service, backup
+    
+    @pytest.mark.asyncio
+    async def test_slow_primary_loses_to_hedge_and_is_cancelled(self, services):
+        """Test: Si el principal pasa de su percentil gana el respaldo y el principal se cancela"""
+        service, backup = services
+        service.hedge_policy = warmed_policy(0.01, max_hedge_rate=1.0)
+        primary_cancelled = asyncio.Event()
+        
+        async def slow_primary(prompt, max_tokens=None):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                primary_cancelled.set()
+                raise
+        
+        async def fast_backup(prompt, max_tokens=None):
+            return "respaldo"
+        
+        service._generate = slow_primary
+        backup._generate = fast_backup
+        
+        assert await service.generate("prompt") == "respaldo"
+        assert primary_cancelled.is_set()
+        stats = service.hedge_policy.get_stats()
+        assert stats["hedged"] == 1
+        assert stats["hedge_wins"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_fast_primary_does_not_hedge(self, services):
+        """Test: Una respuesta dentro del percentil no lanza petición de respaldo"""
+        service, backup = services
+        service.hedge_policy = warmed_policy(1.0, max_hedge_rate=1.0)
+        
+        async def fast_primary(prompt, max_tokens=None):
+            return "principal"
+        
+        backup._generate = MagicMock(side_effect=AssertionError("no debería llamarse"))
+        service._generate = fast_primary
+        
+        assert await service.generate("prompt") == "principal"
+        assert service.hedge_policy.hedged == 0
+    
+    @pytest.mark.asyncio
+    async def test_hedge_error_falls_back_to_primary(self, services):
+        """Test: Si el respaldo falla se espera al principal"""
+        service, backup = services
+        service.hedge_policy = warmed_policy(0.01, max_hedge_rate=1.0)
+        
+        async def slow_primary(prompt, max_tokens=None):
+            await asyncio.sleep(0.05)
+            return "principal"
+        
+        async def failing_backup(prompt, max_tokens=None):
+            raise Exception("Ollama caído")
+        
+        service._generate = slow_primary
+        backup._generate = failing_backup
+        
+        assert await service.generate("prompt") == "principal"
+        assert service.hedge_policy.primary_wins == 1
+    
+    def test_backup_uses_role_sampling_settings(self, services):
+        """Test: El respaldo de un rol usa la temperatura y el tope de tokens de ese rol"""
+        service, _ = services
+        with patch('app.services.llm_service.ChatGroq'), \
+             patch('app.services.llm_service.OllamaAsyncClient'):
+            routing = service.for_role("routing")
+            backup = routing.hedge_service
+        
+        assert (backup.temperature, backup.max_tokens) == (0.0, 100)
+        assert (backup.temperature, backup.max_tokens) == (routing.temperature, routing.max_tokens)
@@ -0,0 +1,246 @@
+"""
+Tests unitarios para la cola persistente de trabajos y su pool de workers
+"""
+import asyncio
+import sqlite3
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.job_queue import JobQueue, JobWorkerPool
+
+
+def request(topic: str) -> dict:
+    return {"topic": topic, "platform": "twitter", "audience": "general", "generate_image": False}
+
+
+class TestJobQueue:
+    """Suite de tests para JobQueue"""
+    
+    @pytest.fixture
+    def queue(self, tmp_path):
+        queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2, retry_backoff_seconds=0)
+        yield queue
+        queue.close()
+    
+    def test_submit_claim_complete(self, queue):
+        """Test: Los items se reclaman por trabajo y los resultados salen en orden de finalización"""
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        assert queue.get_job(job_id)["status"] == "queued"
+        
+        items = queue.claim(limit=5)
+        assert [item.position for item in items] == [0, 1]
+        assert queue.claim() == []
+        queue.complete(job_id, 1, {"content": "B"})
+        queue.complete(job_id, 0, {"content": "A"})
+        
+        job = queue.get_job(job_id)
+        assert job["status"] == "completed"
+        assert job["progress"] == 100.0
+        results = queue.results(job_id)
+        assert [item["position"] for item in results] == [1, 0]
+        assert queue.results(job_id, after=results[0]["seq"])[0]["result"] == {"content": "A"}
+    
+    def test_failed_item_retried_until_max_attempts(self, queue):
+        """Test: Un item fallido vuelve a la cola hasta agotar sus intentos"""
+        job_id = queue.submit([request("Tema A")])
+        
+        assert queue.fail(job_id, queue.claim()[0].position, "timeout") is True
+        item = queue.claim()[0]
+        assert item.attempts == 2
+        assert queue.fail(job_id, item.position, "timeout") is False
+        
+        job = queue.get_job(job_id)
+        assert job["status"] == "failed"
+        assert queue.results(job_id)[0]["error"] == "timeout"
+    
+    def test_running_items_recovered_after_restart(self, tmp_path):
+        """Test: Los items en curso al caer el proceso vuelven a la cola al reabrirla"""
+        path = str(tmp_path / "jobs.db")
+        queue = JobQueue(path)
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        queue.claim(limit=2)
+        queue.complete(job_id, 0, {"content": "A"})
+        queue.close()
+        
+        restarted = JobQueue(path)
+        assert restarted.recover() == 1
+        items = restarted.claim(limit=5)
+        assert [item.position for item in items] == [1]
+        assert restarted.get_job(job_id)["counts"]["done"] == 1
+        restarted.close()
+    
+    def test_expired_lease_reclaimed(self, tmp_path):
+        """Test: Un item cuyo lease venció lo puede reclamar otro worker"""
+        queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0)
+        queue.submit([request("Tema A")])
+        
+        assert len(queue.claim()) == 1
+        assert len(queue.claim()) == 1
+        queue.close()
+    
+    def test_cancel_pending_items(self, queue):
+        """Test: Cancelar marca los pendientes; los que están en curso terminan"""
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        item = queue.claim()[0]
+        
+        assert queue.cancel(job_id) is True
+        assert queue.claim() == []
+        queue.complete(job_id, item.position, {"content": "A"})
+        
+        job = queue.get_job(job_id)
+        assert job["status"] == "cancelled"
+        assert job["counts"]["cancelled"] == 1
+        assert queue.cancel("missing") is False
+    
+    def test_cancelled_items_not_claimed_or_finished(self, tmp_path):
+        """Test: Un item cancelado no se marca como hecho y los de un trabajo cancelado no se reclaman"""
+        queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0)
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        queue.claim()
+        
+        assert queue.cancel(job_id) is True
+        queue.complete(job_id, 1, {"content": "B"})
+        assert queue.get_job(job_id)["counts"]["done"] == 0
+        # El lease del item en curso vence: no se reclama, se cancela
+        assert queue.claim() == []
+        
+        job = queue.get_job(job_id)
+        assert job["status"] == "cancelled"
+        assert job["counts"]["cancelled"] == 2
+        assert [item["position"] for item in queue.results(job_id)] == [1, 0]
+        queue.close()
+    
+    def test_sequence_is_per_job(self, queue):
+        """Test: La secuencia de resultados cuenta desde 1 en cada trabajo"""
+        first = queue.submit([request("Tema A")])
+        second = queue.submit([request("Tema B")])
+        for item in queue.claim() + queue.claim():
+            queue.complete(item.job_id, item.position, {"content": "ok"})
+        
+        assert queue.results(first)[0]["seq"] == 1
+        assert queue.results(second)[0]["seq"] == 1
+    
+    def test_purge_removes_only_expired_finished_jobs(self, tmp_path):
+        """Test: purge() borra los trabajos terminados fuera de la retención y conserva los activos"""
+        queue = JobQueue(str(tmp_path / "jobs.db"), retention_seconds=60)
+        finished = queue.submit([request("Tema A")])
+        active = queue.submit([request("Tema B")])
+        queue.complete(finished, queue.claim()[0].position, {"content": "A"})
+        queue._conn.execute("UPDATE jobs SET created_at = created_at - 120")
+        queue._conn.execute("UPDATE job_items SET finished_at = finished_at - 120 WHERE job_id = ?", (finished,))
+        
+        assert queue.purge() == 1
+        assert queue.get_job(finished) is None
+        assert queue.results(finished) == []
+        assert queue.get_job(active)["counts"]["pending"] == 1
+        queue.close()
+    
+    def test_stats_report_depth_and_lag(self, queue):
+        """Test: Las métricas incluyen profundidad, lag y throughput"""
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        queue.complete(job_id, queue.claim()[0].position, {"content": "A"})
+        
+        stats = queue.get_stats()
+        assert stats["items"]["pending"] == 1
+        assert stats["items"]["done"] == 1
+        assert stats["throughput_per_minute"] == 1
+        assert stats["lag"]["count"] >= 1
+
+
+class TestJobWorkerPool:
+    """Suite de tests para JobWorkerPool"""
+    
+    @pytest.mark.asyncio
+    async def test_workers_process_job_with_retries(self, tmp_path):
+        """Test: Los workers procesan el trabajo y reintentan los items que fallan"""
+        queue = JobQueue(str(tmp_path / "jobs.db"), retry_backoff_seconds=0)
+        calls = {}
+        
+        async def process_request(topic, **kwargs):
+            calls[topic] = calls.get(topic, 0) + 1
+            if topic == "Tema inestable" and calls[topic] == 1:
+                raise RuntimeError("provider caído")
+            return {"content": topic}
+        
+        orchestrator = MagicMock()
+        orchestrator.agents = {}
+        orchestrator._route = AsyncMock(return_value=None)
+        orchestrator.process_request = AsyncMock(side_effect=process_request)
+        pool = JobWorkerPool(queue, lambda provider: orchestrator, workers=2, claim_batch=2, poll_interval=0.01)
+        job_id = queue.submit([request("Tema A"), request("Tema inestable"), request("Tema C")])
+        
+        pool.start()
+        try:
+            for _ in range(200):
+                if queue.get_job(job_id)["finished"]:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.stop()
+        
+        job = queue.get_job(job_id)
+        assert job["status"] == "completed"
+        assert job["counts"]["done"] == 3
+        assert calls["Tema inestable"] == 2
+        results = {item["position"]: item for item in queue.results(job_id)}
+        assert results[1]["attempts"] == 2
+        assert results[2]["result"]["content"] == "Tema C"
+        queue.close()
+    
+    @pytest.mark.asyncio
+    async def test_stop_releases_in_flight_items(self, tmp_path):
+        """Test: Al parar, los items en curso de este pool vuelven a la cola sin esperar al lease"""
+        queue = JobQueue(str(tmp_path / "jobs.db"))
+        started = asyncio.Event()
+        
+        async def process_request(**kwargs):
+            started.set()
+            await asyncio.sleep(60)
+        
+        orchestrator = MagicMock()
+        orchestrator.agents = {}
+        orchestrator._route = AsyncMock(return_value=None)
+        orchestrator.process_request = AsyncMock(side_effect=process_request)
+        pool = JobWorkerPool(queue, lambda provider: orchestrator, workers=1, claim_batch=2, poll_interval=0.01)
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        
+        pool.start()
+        await asyncio.wait_for(started.wait(), timeout=5)
+        await pool.stop()
+        
+        assert queue.get_job(job_id)["counts"]["pending"] == 2
+        assert len(queue.claim(limit=5)) == 2
+        queue.close()
+    
+    @pytest.mark.asyncio
+    async def test_worker_survives_queue_errors(self, tmp_path):
+        """Test: Si anotar un resultado falla, el worker sigue y el item vuelve a la cola al parar"""
+        queue = JobQueue(str(tmp_path / "jobs.db"))
+        complete = queue.complete
+        
+        def flaky_complete(job_id, position, result):
+            if queue.complete.call_count == 1:
+                raise sqlite3.OperationalError("database is locked")
+            complete(job_id, position, result)
+        
+        queue.complete = MagicMock(side_effect=flaky_complete)
+        
+        orchestrator = MagicMock()
+        orchestrator.agents = {}
+        orchestrator._route = AsyncMock(return_value=None)
+        orchestrator.process_request = AsyncMock(return_value={"content": "ok"})
+        pool = JobWorkerPool(queue, lambda provider: orchestrator, workers=1, claim_batch=1, poll_interval=0.01)
+        job_id = queue.submit([request("Tema A"), request("Tema B")])
+        
+        pool.start()
+        try:
+            for _ in range(200):
+                if queue.complete.call_count >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert pool.running
+        finally:
+            await pool.stop()
+        
+        assert queue.complete.call_count == 2
+        assert queue.get_job(job_id)["counts"]["pending"] == 1
+        queue.close()
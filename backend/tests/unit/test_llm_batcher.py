@@ -0,0 +1,110 @@
+"""
+Tests unitarios para el micro-batching de llamadas LLM auxiliares
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.llm_batcher import LLMBatcher
+from app.services.llm_service import LLMService
+from app.services.rate_limiter import RateLimitError
+
+
+class TestLLMBatcher:
+    """Suite de tests para LLMBatcher"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_tasks_share_one_call(self):
+        """Test: Tareas que llegan en la misma ventana viajan en un solo prompt"""
+        prompts = []
+        
+        async def execute(prompt):
+            prompts.append(prompt)
+            return json.dumps({"t1": "resumen", "t2": ["q1", "q2"]})
+        
+        batcher = LLMBatcher(execute, window_ms=5)
+        text, queries = await asyncio.gather(batcher.submit("Resume esto"), batcher.submit("Expande esto"))
+        
+        assert len(prompts) == 1
+        assert "### TASK t1\nResume esto" in prompts[0]
+        assert text == "resumen"
+        assert json.loads(queries) == ["q1", "q2"]
+        assert batcher.get_stats()["round_trips_saved"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_single_task_uses_original_prompt(self):
+        """Test: Una tarea sola se envía tal cual"""
+        execute = AsyncMock(return_value="respuesta")
+        batcher = LLMBatcher(execute, window_ms=1)
+        
+        assert await batcher.submit("Prompt original") == "respuesta"
+        execute.assert_awaited_once_with("Prompt original")
+    
+    @pytest.mark.asyncio
+    async def test_missing_answers_are_retried_individually(self):
+        """Test: Si falta la respuesta de una tarea se repite sola"""
+        async def execute(prompt):
+            if prompt.startswith("Complete each"):
+                return '{"t1": "uno"}'
+            return "dos (individual)"
+        
+        batcher = LLMBatcher(execute, window_ms=5)
+        results = await asyncio.gather(batcher.submit("uno"), batcher.submit("dos"))
+        
+        assert results == ["uno", "dos (individual)"]
+        assert batcher.fallbacks == 1
+    
+    @pytest.mark.asyncio
+    async def test_rate_limit_reaches_every_task(self):
+        """Test: Un 429 del lote se propaga a todas sus tareas"""
+        execute = AsyncMock(side_effect=RateLimitError("429", retry_after=1))
+        batcher = LLMBatcher(execute, window_ms=5)
+        
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        assert all(isinstance(r, RateLimitError) for r in results)
+        assert execute.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_max_tasks_flushes_immediately(self):
+        """Test: Al llegar a max_tasks se envía sin esperar a la ventana"""
+        execute = AsyncMock(return_value='{"t1": "a", "t2": "b"}')
+        batcher = LLMBatcher(execute, window_ms=10_000, max_tasks=2)
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("a"), batcher.submit("b")), timeout=1
+        )
+        assert results == ["a", "b"]
+    
+    @pytest.mark.asyncio
+    async def test_batch_closes_before_exceeding_max_tokens(self):
+        """Test: Una tarea que haría pasar la suma de topes del lote sobre max_tokens va en otro lote"""
+        execute = AsyncMock(side_effect=['{"t1": "a", "t2": "b"}', "c"])
+        batcher = LLMBatcher(execute, window_ms=5, max_tokens=1000)
+        
+        results = await asyncio.gather(
+            batcher.submit("a", 350), batcher.submit("b", 150), batcher.submit("c", 800)
+        )
+        
+        assert results == ["a", "b", "c"]
+        assert execute.await_count == 2
+        assert execute.await_args_list[1].args == ("c",)
+    
+    @pytest.mark.asyncio
+    async def test_llm_service_batches_auxiliary_calls(self):
+        """Test: Dos llamadas auxiliares concurrentes cuestan una sola petición al provider"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(return_value=MagicMock(
+                content='{"t1": "Resumen hipotético", "t2": ["consulta 1", "consulta 2"]}'
+            ))
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            hyde, expansion = await asyncio.gather(
+                service.generate("HyDE prompt", call_type="hyde", batchable=True),
+                service.generate("Expansion prompt", call_type="expansion", batchable=True)
+            )
+            
+            assert mock_llm.ainvoke.call_count == 1
+            assert hyde == "Resumen hipotético"
+            assert json.loads(expansion) == ["consulta 1", "consulta 2"]
@@ -0,0 +1,72 @@
+"""
+Tests unitarios para la caché persistente de respuestas LLM
+"""
+import sqlite3
+import time
+import pytest
+from app.services.llm_cache import LLMResponseCache
+
+
+class TestLLMResponseCache:
+    """Suite de tests para LLMResponseCache"""
+    
+    def test_roundtrip_survives_reopen(self, tmp_path):
+        """Test: Una respuesta guardada sigue disponible tras reabrir el fichero"""
+        path = str(tmp_path / "cache.db")
+        key = LLMResponseCache.make_key("groq", "llama", 0.7, 4096, "prompt")
+        
+        cache = LLMResponseCache(path)
+        cache.set(key, "respuesta ñ" * 50)
+        cache.close()
+        
+        reopened = LLMResponseCache(path)
+        assert reopened.get(key) == "respuesta ñ" * 50
+        assert reopened.get_stats()["hits"] == 1
+        reopened.close()
+    
+    def test_key_depends_on_model_and_parameters(self):
+        """Test: Cambiar modelo, temperatura o max_tokens cambia la clave"""
+        base = LLMResponseCache.make_key("groq", "llama", 0.7, 4096, "prompt")
+        assert base != LLMResponseCache.make_key("ollama", "llama", 0.7, 4096, "prompt")
+        assert base != LLMResponseCache.make_key("groq", "mistral", 0.7, 4096, "prompt")
+        assert base != LLMResponseCache.make_key("groq", "llama", 0.2, 4096, "prompt")
+        assert base != LLMResponseCache.make_key("groq", "llama", 0.7, 512, "prompt")
+    
+    def test_expired_entries_are_misses(self, tmp_path):
+        """Test: Una entrada más antigua que el TTL no se devuelve"""
+        cache = LLMResponseCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+        cache.set("k", "valor")
+        cache._conn.execute("UPDATE llm_cache SET created_at = ?", (time.time() - 120,))
+        
+        assert cache.get("k") is None
+        assert cache.get_stats()["entries"] == 0
+        cache.close()
+    
+    def test_size_cap_evicts_least_recently_used(self, tmp_path):
+        """Test: Al superar max_bytes se expulsan primero las menos usadas"""
+        cache = LLMResponseCache(str(tmp_path / "cache.db"))
+        cache.set("a", "x" * 1000)
+        entry_size = cache.get_stats()["bytes"]
+        cache.max_bytes = entry_size * 2
+        
+        cache.set("b", "y" * 1000)
+        time.sleep(0.01)
+        cache.get("a")  # "a" pasa a ser la más reciente
+        cache.set("c", "z" * 1000)
+        
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+        assert cache.get_stats()["bytes"] <= cache.max_bytes
+        assert cache.evictions == 1
+        cache.close()
+    
+    def test_values_are_stored_compressed(self, tmp_path):
+        """Test: El valor en disco ocupa menos que el texto original"""
+        path = str(tmp_path / "cache.db")
+        cache = LLMResponseCache(path)
+        cache.set("k", "contenido repetido " * 200)
+        cache.close()
+        
+        size = sqlite3.connect(path).execute("SELECT size FROM llm_cache").fetchone()[0]
+        assert size < len("contenido repetido " * 200) / 5
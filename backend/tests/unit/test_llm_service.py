@@ -20,7 +20,7 @@ class TestLLMService:
     @pytest.mark.asyncio
     async def test_ollama_provider_initialization(self):
         """Test: Inicialización con Ollama"""
-        with patch('app.services.llm_service.Ollama') as mock_ollama:
+        with patch('app.services.llm_service.OllamaAsyncClient') as mock_ollama:
             service = LLMService(provider="ollama")
             assert service.provider == "ollama"
             mock_ollama.assert_called_once()
@@ -57,3 +57,172 @@ class TestLLMService:
         """Test: Provider inválido lanza excepción"""
         with pytest.raises(ValueError):
             LLMService(provider="invalid_provider")
+    
+    def test_services_share_pooled_client(self):
+        """Test: Servicios con la misma configuración reutilizan el cliente"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            first = LLMService(provider="groq")
+            second = LLMService(provider="groq")
+            
+            assert first.llm is second.llm
+            mock_groq.assert_called_once()
+            
+            stats = LLMService.get_stats()["client_pool"]
+            assert stats["clients_created"] == 1
+            assert stats["clients_reused"] == 1
+    
+    def test_registry_keys_by_client_config(self):
+        """Test: Distinta temperatura o max_tokens implica otro cliente"""
+        from app.services.llm_service import client_registry
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_groq.side_effect = lambda **kwargs: MagicMock()
+            a = client_registry.get_client("groq", "model", 0.7, 4096)
+            b = client_registry.get_client("groq", "model", 0.0, 4096)
+            c = client_registry.get_client("groq", "model", 0.7, 256)
+            
+            assert a is not b and a is not c
+            assert mock_groq.call_count == 3
+            # Todos comparten el mismo pool HTTP async
+            pools = {id(call.kwargs["http_async_client"]) for call in mock_groq.call_args_list}
+            assert len(pools) == 1
+    
+    @pytest.mark.asyncio
+    async def test_stream_with_groq(self):
+        """Test: Stream de tokens con Groq"""
+        async def fake_astream(messages):
+            for delta in ["Hola", "", " mundo"]:
+                yield MagicMock(content=delta)
+        
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.astream = fake_astream
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            deltas = [delta async for delta in service.stream("Test prompt")]
+            
+            assert deltas == ["Hola", " mundo"]
+    
+    @pytest.mark.asyncio
+    async def test_stream_counts_tokens_like_generate(self):
+        """Test: El stream cuenta los tokens de la respuesta completa con el mismo tokenizer que generate()"""
+        async def fake_astream(messages):
+            for delta in ["Hola", " mundo"]:
+                yield MagicMock(content=delta)
+        
+        with patch('app.services.llm_service.ChatGroq') as mock_groq, \
+             patch('app.services.llm_service.count_tokens', side_effect=lambda text: len(text.split())) as mock_count:
+            mock_llm = MagicMock()
+            mock_llm.astream = fake_astream
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            with patch.object(service.rate_limiter, 'observe_completion') as observe:
+                [delta async for delta in service.stream("Test prompt")]
+            
+            mock_count.assert_any_call("Hola mundo")
+            observe.assert_called_once_with(2)
+    
+    @pytest.mark.asyncio
+    async def test_generate_with_ollama_is_native_async(self):
+        """Test: Ollama usa el cliente async nativo (sin run_in_executor)"""
+        with patch('app.services.llm_service.OllamaAsyncClient') as mock_ollama:
+            mock_client = MagicMock()
+            mock_client.generate = AsyncMock(return_value="Respuesta local")
+            mock_ollama.return_value = mock_client
+            
+            service = LLMService(provider="ollama")
+            result = await service.generate("Test prompt")
+            
+            assert result == "Respuesta local"
+            mock_client.generate.assert_awaited_once_with("Test prompt")
+    
+    @pytest.mark.asyncio
+    async def test_identical_concurrent_prompts_are_coalesced(self):
+        """Test: N llamadas idénticas simultáneas cuestan una sola petición"""
+        import asyncio
+        
+        async def slow_response(messages):
+            await asyncio.sleep(0.05)
+            return MagicMock(content="Respuesta compartida")
+        
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(side_effect=slow_response)
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            coalesced_before = LLMService.get_stats()["coalescing"]["coalesced"]
+            results = await asyncio.gather(
+                *[service.generate("Mismo prompt") for _ in range(5)],
+                service.generate("Otro prompt")
+            )
+            
+            assert results[:5] == ["Respuesta compartida"] * 5
+            assert mock_llm.ainvoke.call_count == 2
+            assert LLMService.get_stats()["coalescing"]["coalesced"] - coalesced_before == 4
+    
+    @pytest.mark.asyncio
+    async def test_auxiliary_calls_are_served_from_disk_cache(self):
+        """Test: Las llamadas auxiliares se repiten desde disco; la generación final no"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content="[\"q1\", \"q2\"]"))
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            first = await service.generate("Expande la consulta", call_type="expansion")
+            second = await service.generate("Expande la consulta", call_type="expansion")
+            assert first == second
+            assert mock_llm.ainvoke.call_count == 1
+            
+            await service.generate("Escribe el post")
+            await service.generate("Escribe el post")
+            assert mock_llm.ainvoke.call_count == 3
+            
+            disk_stats = LLMService.get_stats()["disk_cache"]
+            assert disk_stats["hits"] == 1
+            assert disk_stats["writes"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_per_call_max_tokens_uses_capped_client(self):
+        """Test: Un max_tokens por llamada usa el cliente compartido con ese tope"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            default_llm, capped_llm = MagicMock(), MagicMock()
+            default_llm.ainvoke = AsyncMock(return_value=MagicMock(content="largo"))
+            capped_llm.ainvoke = AsyncMock(return_value=MagicMock(content="corto"))
+            mock_groq.side_effect = [default_llm, capped_llm]
+            
+            service = LLMService(provider="groq")
+            assert await service.generate("prompt", max_tokens=150) == "corto"
+            assert await service.generate("prompt") == "largo"
+            assert mock_groq.call_args_list[1].kwargs["max_tokens"] == 150
+    
+    @pytest.mark.asyncio
+    async def test_auxiliary_roles_use_their_own_model(self):
+        """Test: El routing usa el modelo, temperatura y tope de su rol; la generación el grande"""
+        from app.services.llm_service import settings
+        
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content='{"agent": "CONTENT"}'))
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            await service.generate("Route this", call_type="routing")
+            await service.generate("Write the post")
+            
+            routing_role = settings.LLM_ROLES["routing"]
+            created = [call.kwargs for call in mock_groq.call_args_list]
+            assert {
+                "model": routing_role["groq_model"],
+                "temperature": routing_role["temperature"],
+                "max_tokens": routing_role["max_tokens"]
+            }.items() <= created[-1].items()
+            assert created[0]["model"] == settings.DEFAULT_GROQ_MODEL
+            
+            roles = LLMService.get_stats()["roles"]
+            assert roles["routing"]["model"] == routing_role["groq_model"]
+            assert roles["generation"]["model"] == settings.DEFAULT_GROQ_MODEL
+            assert roles["routing"]["calls"] == roles["generation"]["calls"] == 1
+
@@ -0,0 +1,92 @@
+"""
+Tests unitarios para los histogramas de latencia y la exposición Prometheus
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.metrics import Histogram, MetricsRegistry
+
+
+class TestHistogram:
+    """Suite de tests para Histogram"""
+
+    def test_percentiles_from_buckets(self):
+        """Test: Los percentiles se estiman dentro del bucket y reflejan la cola"""
+        histogram = Histogram(buckets=(0.1, 0.5, 1.0, 5.0))
+        for _ in range(98):
+            histogram.observe(0.05)
+        histogram.observe(0.8)
+        histogram.observe(4.0)
+
+        assert histogram.count == 100
+        assert histogram.percentile(50) <= 0.1
+        assert 1.0 <= histogram.percentile(99.5) <= 5.0
+        stats = histogram.get_stats()
+        assert stats["p50_ms"] <= 100
+        assert stats["p99_ms"] > stats["p50_ms"]
+
+    def test_values_above_last_bucket(self):
+        """Test: Los valores por encima del último límite van al bucket +Inf"""
+        histogram = Histogram(buckets=(0.1,))
+        histogram.observe(3.0)
+
+        assert histogram.cumulative_counts() == [0, 1]
+        assert histogram.percentile(99) == 0.1
+        assert Histogram().percentile(50) is None
+
+
+class TestMetricsRegistry:
+    """Suite de tests para la exposición en formato Prometheus"""
+
+    def test_render_histogram_and_counter(self):
+        """Test: Buckets acumulados con le, _sum, _count y contadores etiquetados"""
+        registry = MetricsRegistry()
+        latency = registry.histogram("demo_seconds", "Demo latency", ("stage",), buckets=(0.1, 1.0))
+        requests = registry.counter("demo_total", "Demo requests", ("outcome",))
+        latency.observe(0.05, "routing")
+        latency.observe(0.5, "routing")
+        requests.inc("ok")
+        requests.inc("ok")
+
+        text = registry.render()
+
+        assert "# TYPE demo_seconds histogram" in text
+        assert 'demo_seconds_bucket{stage="routing",le="0.1",worker="' in text
+        assert 'le="+Inf"' in text
+        assert 'demo_seconds_count{stage="routing",worker="' in text
+        assert "# TYPE demo_total counter" in text
+        lines = text.splitlines()
+        assert any(line.startswith('demo_seconds_bucket{stage="routing",le="1.0"') and line.endswith(" 2") for line in lines)
+        assert any(line.startswith('demo_total{outcome="ok"') and line.endswith(" 2.0") for line in lines)
+
+
+class TestOrchestratorHistograms:
+    """Suite de tests de los histogramas del orquestador"""
+
+    @pytest.mark.asyncio
+    async def test_request_and_stage_latencies_recorded(self):
+        """Test: Cada petición alimenta el histograma por agente y los de sus etapas"""
+        from app.core.metrics import REQUEST_LATENCY, STAGE_LATENCY, registry
+
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'):
+            instance = MagicMock()
+            instance.description = "content agent"
+            instance.generate = AsyncMock(return_value={"content": "result"})
+            mock_content.return_value = instance
+
+            from app.agents.orchestrator import AgentOrchestrator
+            orchestrator = AgentOrchestrator(llm_provider="groq", enable_semantic_cache=False)
+
+        registry.clear()
+        await orchestrator.process_request(
+            topic="Tendencias", platform="twitter", audience="general",
+            content_type="content", generate_image=False
+        )
+
+        assert REQUEST_LATENCY.labels("content", "generated").count == 1
+        assert STAGE_LATENCY.labels("agent").count == 1
+        assert STAGE_LATENCY.labels("routing").count == 1
+        latency = orchestrator.get_metrics()["latency"]
+        assert latency["requests"]["content/generated"]["count"] == 1
+        assert "orchestrator_requests_total" in registry.render()
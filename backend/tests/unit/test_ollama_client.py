@@ -0,0 +1,115 @@
+"""
+Tests unitarios para OllamaAsyncClient contra un servidor HTTP stub local
+"""
+import json
+import threading
+import time
+import asyncio
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.ollama_client import OllamaAsyncClient
+
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    """Imita /api/generate de Ollama (JSON y NDJSON en streaming)"""
+    
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append(body)
+        
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            self.send_response(200)
+            if "prompt" not in body:
+                # Preload: sin prompt, solo carga el modelo
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"done": True}).encode())
+            elif body.get("stream"):
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for token in ["Hola", " desde", " Ollama"]:
+                    self.wfile.write((json.dumps({"response": token, "done": False}) + "\n").encode())
+                self.wfile.write((json.dumps({"response": "", "done": True}) + "\n").encode())
+            else:
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"response": f"eco: {body['prompt']}", "done": True}).encode())
+        finally:
+            with server.lock:
+                server.active -= 1
+    
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Servidor HTTP local que responde como Ollama"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllamaHandler)
+    server.requests = []
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    server.delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs) -> OllamaAsyncClient:
+    host, port = server.server_address
+    return OllamaAsyncClient(model="llama3.2", base_url=f"http://{host}:{port}", **kwargs)
+
+
+class TestOllamaAsyncClient:
+    """Suite de tests para OllamaAsyncClient"""
+    
+    @pytest.mark.asyncio
+    async def test_generate(self, stub_server):
+        """Test: Generación completa sin streaming"""
+        client = _client(stub_server, temperature=0.2, num_predict=64, keep_alive="10m")
+        
+        result = await client.generate("hola")
+        
+        assert result == "eco: hola"
+        sent = stub_server.requests[0]
+        assert sent["stream"] is False
+        assert sent["keep_alive"] == "10m"
+        assert sent["options"] == {"temperature": 0.2, "num_predict": 64}
+    
+    @pytest.mark.asyncio
+    async def test_stream(self, stub_server):
+        """Test: Streaming de tokens NDJSON"""
+        client = _client(stub_server)
+        
+        tokens = [token async for token in client.stream("hola")]
+        
+        assert tokens == ["Hola", " desde", " Ollama"]
+        assert stub_server.requests[0]["stream"] is True
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_limited_by_num_parallel(self, stub_server):
+        """Test: Nunca hay más peticiones en curso que max_parallel"""
+        stub_server.delay = 0.05
+        client = _client(stub_server, max_parallel=2)
+        
+        results = await asyncio.gather(*[client.generate(f"p{i}") for i in range(6)])
+        
+        assert len(results) == 6
+        assert stub_server.max_active <= 2
+        assert client.get_stats() == {"in_flight": 0, "waiting": 0}
+    
+    @pytest.mark.asyncio
+    async def test_preload(self, stub_server):
+        """Test: Preload envía una petición sin prompt"""
+        client = _client(stub_server)
+        
+        assert await client.preload() is True
+        assert "prompt" not in stub_server.requests[0]
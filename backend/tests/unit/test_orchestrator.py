@@ -1,9 +1,10 @@
 """
 Tests unitarios para Orchestrator
 """
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
-from app.agents.orchestrator import AgentOrchestrator
+from app.agents.orchestrator import AgentOrchestrator, AgentType
 
 
 class TestAgentOrchestrator:
@@ -141,3 +142,265 @@ class TestAgentOrchestrator:
             language="Spanish"
         )
         assert result["agent_used"] == "science"
+    
+    @pytest.mark.asyncio
+    async def test_stream_request_emits_events(self, orchestrator):
+        """Test: El stream emite routing, sources, tokens, imagen y resultado"""
+        async def fake_stream(prompt, max_tokens=None):
+            for delta in ["Hola", " mundo"]:
+                yield delta
+        
+        agent = orchestrator.agents[AgentType.CONTENT]
+        agent.prepare = AsyncMock(return_value={"prompt": "p", "sources": [{"title": "s"}]})
+        agent.stream = fake_stream
+        orchestrator._generate_image_async = AsyncMock(return_value="http://img")
+        
+        events = [
+            event async for event in orchestrator.stream_request(
+                topic="Recetas de cocina",
+                platform="twitter",
+                audience="general",
+                content_type="content"
+            )
+        ]
+        names = [name for name, _ in events]
+        
+        assert names == ["routing", "sources", "token", "token", "image", "result"]
+        assert events[-1][1]["content"] == "Hola mundo"
+        assert events[-1][1]["image_url"] == "http://img"
+    
+    @pytest.mark.asyncio
+    async def test_speculative_routing_keeps_agreeing_result(self, orchestrator):
+        """Test: Si keywords y LLM coinciden se usa la ejecución especulativa (sin repetirla)"""
+        from app.agents.orchestrator import RoutingDecision
+        
+        async def slow_route(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return RoutingDecision(AgentType.FINANCIAL, 0.9, "LLM", [AgentType.CONTENT])
+        
+        orchestrator.enable_speculative_routing = True
+        orchestrator._smart_route = slow_route
+        
+        result = await orchestrator.process_request(
+            topic="Evolución del bitcoin en bolsa",
+            platform="twitter",
+            audience="general",
+            generate_image=False
+        )
+        
+        assert result["agent_used"] == "financial"
+        assert orchestrator.agents[AgentType.FINANCIAL].generate.await_count == 1
+        speculation = orchestrator.get_metrics()["speculation"]
+        assert speculation["runs"] == 1
+        assert speculation["agreement_rate"] == 100.0
+        assert speculation["saved_ms_total"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_speculative_routing_restarts_on_disagreement(self, orchestrator):
+        """Test: Si el LLM elige otro agente se cancela la especulación y se relanza"""
+        from app.agents.orchestrator import RoutingDecision
+        
+        cancelled = asyncio.Event()
+        
+        async def slow_financial(**kwargs):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        async def slow_route(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return RoutingDecision(AgentType.SCIENCE, 0.9, "LLM", [AgentType.CONTENT])
+        
+        orchestrator.enable_speculative_routing = True
+        orchestrator._smart_route = slow_route
+        orchestrator.agents[AgentType.FINANCIAL].generate = AsyncMock(side_effect=slow_financial)
+        
+        result = await orchestrator.process_request(
+            topic="Impacto del bitcoin en el mercado energético",
+            platform="blog",
+            audience="general",
+            generate_image=False
+        )
+        
+        assert result["agent_used"] == "science"
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        speculation = orchestrator.get_metrics()["speculation"]
+        assert speculation["runs"] == 1
+        assert speculation["agreement_rate"] == 0.0
+        assert speculation["wasted_ms_total"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_share_one_execution(self, orchestrator):
+        """Test: Peticiones idénticas concurrentes esperan la misma ejecución"""
+        release = asyncio.Event()
+        
+        async def slow_generate(**kwargs):
+            await release.wait()
+            return {"content": "viral"}
+        
+        agent = orchestrator.agents[AgentType.CONTENT]
+        agent.generate = AsyncMock(side_effect=slow_generate)
+        request = dict(
+            topic="Tema viral", platform="twitter", audience="general",
+            content_type="content", generate_image=False
+        )
+        
+        tasks = [asyncio.create_task(orchestrator.process_request(**request)) for _ in range(5)]
+        # Esperar a que los cinco se hayan unido (la búsqueda en caché es asíncrona)
+        for _ in range(200):
+            if orchestrator.inflight.coalesced == 4:
+                break
+            await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        
+        assert agent.generate.await_count == 1
+        assert all(result["content"] == "viral" for result in results)
+        assert sum(bool(result.get("coalesced")) for result in results) == 4
+        assert orchestrator.get_metrics()["single_flight"]["coalesced"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_work(self, orchestrator):
+        """Test: Cancelar al líder o a un seguidor no cancela el trabajo de los demás"""
+        release = asyncio.Event()
+        
+        async def slow_generate(**kwargs):
+            await release.wait()
+            return {"content": "viral"}
+        
+        orchestrator.agents[AgentType.CONTENT].generate = AsyncMock(side_effect=slow_generate)
+        request = dict(
+            topic="Tema viral", platform="twitter", audience="general",
+            content_type="content", generate_image=False
+        )
+        
+        leader = asyncio.create_task(orchestrator.process_request(**request))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(orchestrator.process_request(**request))
+        other = asyncio.create_task(orchestrator.process_request(**request))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        follower.cancel()
+        release.set()
+        
+        assert (await other)["content"] == "viral"
+        assert leader.cancelled() and follower.cancelled()
+    
+    @pytest.mark.asyncio
+    async def test_shared_work_uses_loosest_waiter_deadline(self, orchestrator):
+        """Test: Un seguidor con más tiempo no hereda el deadline corto del líder ni sus tiempos"""
+        from app.core.deadline import DeadlineExceeded, required_stage
+        
+        async def slow_generate(**kwargs):
+            # Como una llamada LLM: limitada por el deadline en curso
+            await required_stage("generation", asyncio.sleep(0.3))
+            return {"content": "viral"}
+        
+        orchestrator.agents[AgentType.CONTENT].generate = AsyncMock(side_effect=slow_generate)
+        request = dict(
+            topic="Tema viral", platform="twitter", audience="general",
+            content_type="content", generate_image=False
+        )
+        
+        leader = asyncio.create_task(orchestrator.process_request(**request, deadline_seconds=0.1))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(orchestrator.process_request(**request, deadline_seconds=5))
+        
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        result = await follower
+        assert result["content"] == "viral"
+        assert result["coalesced"] is True
+        assert result["dropped_stages"] == []
+        assert "coalesced_wait" in result["stage_timings_ms"]
+        assert "agent" not in result["stage_timings_ms"]
+
+    
+    @pytest.mark.asyncio
+    async def test_image_runs_concurrently_with_agent(self, orchestrator):
+        """Test: La imagen arranca con la petición y se solapa con la generación del agente"""
+        async def slow_generate(**kwargs):
+            await asyncio.sleep(0.2)
+            return {"content": "content result"}
+        
+        async def slow_image(topic, platform):
+            await asyncio.sleep(0.2)
+            return "https://img"
+        
+        orchestrator.agents[AgentType.CONTENT].generate = AsyncMock(side_effect=slow_generate)
+        orchestrator._generate_image_async = slow_image
+        
+        result = await orchestrator.process_request(
+            topic="Tendencias de marketing",
+            platform="twitter",
+            audience="general",
+            content_type="content",
+            use_cache=False,
+            deadline_seconds=0
+        )
+        
+        timings = result["stage_timings_ms"]
+        assert result["image_url"] == "https://img"
+        assert result["processing_time_ms"] < 350
+        assert timings["image"]["start_ms"] < timings["agent"]["end_ms"]
+        assert timings["agent"]["start_ms"] < timings["image"]["end_ms"]
+    
+    @pytest.mark.asyncio
+    async def test_slow_image_dropped_after_join_timeout(self, orchestrator):
+        """Test: Una imagen que no termina en IMAGE_JOIN_TIMEOUT_SECONDS se cancela y se descarta"""
+        cancelled = asyncio.Event()
+        
+        async def hanging_image(topic, platform):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        orchestrator._generate_image_async = hanging_image
+        
+        with patch('app.agents.orchestrator.settings.IMAGE_JOIN_TIMEOUT_SECONDS', 0.05):
+            result = await orchestrator.process_request(
+                topic="Tendencias de marketing",
+                platform="twitter",
+                audience="general",
+                content_type="content",
+                use_cache=False
+            )
+        
+        assert result["content"] == "content result"
+        assert result["image_url"] is None
+        assert result["dropped_stages"] == ["image"]
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+class TestMetricsAcrossProviders:
+    """Suite de tests de /metrics con un orquestador por provider"""
+    
+    @pytest.mark.asyncio
+    async def test_metrics_cover_every_provider(self, monkeypatch):
+        """Test: Los totales suman todos los providers y cada uno aparece desglosado"""
+        from app.agents.orchestrator import OrchestrationMetrics
+        from app.api.routes import content
+        
+        orchestrators = {}
+        for provider, times in (("groq", [100.0, 300.0]), ("ollama", [600.0])):
+            orchestrator = MagicMock()
+            orchestrator.metrics = OrchestrationMetrics()
+            for ms in times:
+                orchestrator.metrics.record_request(AgentType.CONTENT, ms, cache_hit=provider == "ollama")
+            orchestrator.get_metrics.return_value = orchestrator.metrics.get_stats()
+            orchestrators[provider] = orchestrator
+        monkeypatch.setattr(content, "_orchestrators", orchestrators)
+        monkeypatch.setattr(content.get_settings(), "DEFAULT_LLM_PROVIDER", "groq")
+        
+        metrics = await content.get_metrics()
+        
+        assert metrics["total_requests"] == 3
+        assert metrics["avg_processing_time_ms"] == pytest.approx(1000.0 / 3, abs=0.01)
+        assert metrics["agent_usage"] == {"content": 3}
+        assert metrics["cache_hit_rate"] == pytest.approx(33.33)
+        assert set(metrics["providers"]) == {"groq", "ollama"}
+        assert metrics["providers"]["ollama"]["total_requests"] == 1
@@ -0,0 +1,109 @@
+"""
+Tests unitarios para ProviderRateLimiter y su integración en LLMService
+"""
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.rate_limiter import ProviderRateLimiter, RateLimitError
+from app.services.llm_service import LLMService
+
+
+class _TooManyRequests(Exception):
+    """Imita el error 429 de los SDKs (status_code + response con headers)"""
+    status_code = 429
+    response = MagicMock(status_code=429, headers={"retry-after": "0"})
+
+
+class TestProviderRateLimiter:
+    """Suite de tests para ProviderRateLimiter"""
+    
+    @pytest.mark.asyncio
+    async def test_rpm_budget_delays_excess_requests(self):
+        """Test: Superado el RPM, la siguiente petición espera a que caduque la ventana"""
+        limiter = ProviderRateLimiter("test", rpm=2, window_seconds=0.2)
+        
+        start = time.monotonic()
+        for _ in range(3):
+            async with limiter.reserve(10):
+                pass
+        
+        assert time.monotonic() - start >= 0.18
+        assert limiter.get_stats()["max_wait_ms"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_tpm_budget(self):
+        """Test: Una petición que no cabe en el TPM espera"""
+        limiter = ProviderRateLimiter("test", tpm=100, window_seconds=0.2)
+        
+        async with limiter.reserve(80):
+            pass
+        start = time.monotonic()
+        async with limiter.reserve(50):
+            pass
+        
+        assert time.monotonic() - start >= 0.15
+    
+    @pytest.mark.asyncio
+    async def test_fifo_order(self):
+        """Test: Los que esperan salen en orden de llegada"""
+        limiter = ProviderRateLimiter("test", max_concurrency=1)
+        order = []
+        
+        async def call(i):
+            async with limiter.reserve(1):
+                order.append(i)
+                await asyncio.sleep(0.01)
+        
+        await asyncio.gather(*[call(i) for i in range(5)])
+        
+        assert order == [0, 1, 2, 3, 4]
+        assert limiter.get_stats()["max_queue_depth"] >= 4
+    
+    @pytest.mark.asyncio
+    async def test_aimd_concurrency(self):
+        """Test: 429 reduce a la mitad la concurrencia y los éxitos la recuperan"""
+        limiter = ProviderRateLimiter("test", max_concurrency=8)
+        
+        async with limiter.reserve(1) as permit:
+            permit.rate_limited = True
+        assert limiter.concurrency_limit == 4
+        
+        for _ in range(10):
+            async with limiter.reserve(1):
+                pass
+        assert 4 < limiter.concurrency_limit <= 8
+        assert limiter.get_stats()["rate_limited"] == 1
+
+
+class TestLLMServiceRateLimit:
+    """Integración del limiter en LLMService"""
+    
+    @pytest.mark.asyncio
+    async def test_retries_after_429(self):
+        """Test: Un 429 se reintenta y penaliza la concurrencia del provider"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq:
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(side_effect=[_TooManyRequests(), MagicMock(content="ok")])
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            result = await service.generate("Test prompt")
+            
+            assert result == "ok"
+            assert mock_llm.ainvoke.call_count == 2
+            assert LLMService.get_stats()["rate_limits"]["groq"]["rate_limited"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_raises_rate_limit_error_when_exhausted(self):
+        """Test: Agotados los reintentos se lanza RateLimitError (no un Exception genérico)"""
+        with patch('app.services.llm_service.ChatGroq') as mock_groq, \
+             patch('app.services.llm_service.settings.LLM_RATE_LIMIT_RETRIES', 1):
+            mock_llm = MagicMock()
+            mock_llm.ainvoke = AsyncMock(side_effect=_TooManyRequests())
+            mock_groq.return_value = mock_llm
+            
+            service = LLMService(provider="groq")
+            with pytest.raises(RateLimitError):
+                await service.generate("Test prompt")
+            assert mock_llm.ainvoke.call_count == 2
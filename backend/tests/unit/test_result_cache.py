@@ -0,0 +1,155 @@
+"""
+Tests unitarios para ResultCache
+"""
+import pytest
+from unittest.mock import patch
+from app.agents.result_cache import ResultCache
+
+
+class TestResultCache:
+    """Suite de tests para la caché LRU + TTL de resultados"""
+    
+    def test_key_covers_every_generation_field(self):
+        """Test: Peticiones que sólo difieren en tono, contexto, tipo o provider no colisionan"""
+        base = dict(topic="IA", platform="blog", audience="general", language="Spanish")
+        keys = {
+            ResultCache.make_key(**base),
+            ResultCache.make_key(**base, tone="formal"),
+            ResultCache.make_key(**base, additional_context="para niños"),
+            ResultCache.make_key(**base, content_type="science"),
+            ResultCache.make_key(**base, llm_provider="ollama"),
+        }
+        assert len(keys) == 5
+        assert ResultCache.make_key(**base) == ResultCache.make_key(**dict(reversed(base.items())))
+    
+    def test_get_returns_copy_and_compresses_large_results(self):
+        """Test: Los resultados grandes se guardan comprimidos y get devuelve una copia"""
+        cache = ResultCache(compress_min_bytes=100)
+        result = {"content": "texto repetido " * 500, "sources": [{"title": "a"}]}
+        cache.set("k", result)
+        
+        cached = cache.get("k")
+        cached["from_cache"] = True
+        
+        assert cached["content"] == result["content"]
+        assert "from_cache" not in cache.get("k")
+        assert cache.get_stats()["bytes"] < len(result["content"])
+    
+    def test_lru_eviction_by_byte_budget(self):
+        """Test: Al superar el presupuesto de bytes se expulsa el menos usado recientemente"""
+        cache = ResultCache(compress=False)
+        cache.set("a", {"content": "x" * 1000})
+        entry_size = cache.get_stats()["bytes"]
+        cache.max_bytes = entry_size * 2
+        cache.set("b", {"content": "y" * 1000})
+        
+        cache.get("a")  # "b" pasa a ser el menos reciente
+        cache.set("c", {"content": "z" * 1000})
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.get_stats()["evictions"] == 1
+    
+    def test_ttl_expiration(self):
+        """Test: Las entradas caducan con su TTL"""
+        cache = ResultCache(early_refresh_beta=0)
+        with patch("app.agents.result_cache.time.monotonic", return_value=1000.0):
+            cache.set("k", {"content": "c"}, ttl_seconds=10)
+        with patch("app.agents.result_cache.time.monotonic", return_value=1005.0):
+            assert cache.get("k") == {"content": "c"}
+        with patch("app.agents.result_cache.time.monotonic", return_value=1011.0):
+            assert cache.get("k") is None
+        assert len(cache) == 0
+    
+    def test_probabilistic_early_refresh_near_expiry(self):
+        """Test: Cerca de caducar, algunas lecturas fuerzan un recálculo sin borrar la entrada"""
+        cache = ResultCache()
+        with patch("app.agents.result_cache.time.monotonic", return_value=1000.0):
+            cache.set("k", {"content": "c"}, compute_seconds=5.0, ttl_seconds=60)
+        
+        with patch("app.agents.result_cache.time.monotonic", return_value=1001.0):
+            fresh = [cache.get("k") for _ in range(200)]
+        with patch("app.agents.result_cache.time.monotonic", return_value=1059.0):
+            near_expiry = [cache.get("k") for _ in range(200)]
+        
+        assert all(result is not None for result in fresh)
+        refreshes = sum(result is None for result in near_expiry)
+        assert 0 < refreshes < 200
+        assert cache.get_stats()["early_refreshes"] == refreshes
+        assert len(cache) == 1
+
+
+class TestTieredResultCache:
+    """Suite de tests para la caché L1 + L2 compartida"""
+    
+    @pytest.mark.asyncio
+    async def test_l2_shared_between_workers_and_promoted_to_l1(self, tmp_path):
+        """Test: Lo que guarda un worker lo sirve otro desde el L2 y pasa a su L1"""
+        from app.agents.result_cache import SQLiteResultBackend, TieredResultCache
+        
+        path = str(tmp_path / "shared.db")
+        worker_a = TieredResultCache(ResultCache(), l2=SQLiteResultBackend(path))
+        worker_b = TieredResultCache(ResultCache(), l2=SQLiteResultBackend(path))
+        
+        await worker_a.set("k", {"content": "post"}, compute_seconds=2.0)
+        
+        assert await worker_b.get("k") == {"content": "post"}
+        assert await worker_b.get("k") == {"content": "post"}
+        stats = worker_b.get_stats()
+        assert stats["l2"]["hits"] == 1
+        assert stats["l1"]["hits"] == 1
+        assert stats["l1"]["misses"] == 1
+        assert await worker_b.get("otra") is None
+        assert worker_b.get_stats()["l2"]["misses"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_l2_survives_restart(self, tmp_path):
+        """Test: Tras un reinicio (L1 vacío) el resultado sigue en el L2"""
+        from app.agents.result_cache import SQLiteResultBackend, TieredResultCache
+        
+        path = str(tmp_path / "shared.db")
+        backend = SQLiteResultBackend(path)
+        await TieredResultCache(ResultCache(), l2=backend).set("k", {"content": "post"})
+        backend.close()
+        
+        restarted = TieredResultCache(ResultCache(), l2=SQLiteResultBackend(path))
+        assert await restarted.get("k") == {"content": "post"}
+    
+    @pytest.mark.asyncio
+    async def test_expired_l2_entries_are_misses(self, tmp_path):
+        """Test: Una entrada caducada en el L2 no se sirve ni se promueve"""
+        from app.agents.result_cache import SQLiteResultBackend, TieredResultCache
+        
+        backend = SQLiteResultBackend(str(tmp_path / "shared.db"))
+        writer = TieredResultCache(ResultCache(), l2=backend)
+        await writer.set("k", {"content": "post"}, ttl_seconds=-1)
+        
+        reader = TieredResultCache(ResultCache(), l2=backend)
+        assert await reader.get("k") is None
+        assert len(reader) == 0
+    
+    @pytest.mark.asyncio
+    async def test_l2_never_unpickles(self, tmp_path):
+        """Test: Una entrada con pickle en el L2 compartido no se ejecuta: es una entrada ilegible"""
+        import pickle
+        import time
+        from app.agents.result_cache import SQLiteResultBackend, TieredResultCache
+        
+        class Payload:
+            def __reduce__(self):
+                return (exec, ("raise SystemExit('pickle ejecutado')",))
+        
+        backend = SQLiteResultBackend(str(tmp_path / "shared.db"))
+        backend.set("k", b"r" + pickle.dumps(Payload()), time.time() + 60, 0.0)
+        cache = TieredResultCache(ResultCache(), l2=backend)
+        
+        assert await cache.get("k") is None
+        assert cache.get_stats()["l2"]["errors"] == 1
+    
+    def test_backend_is_abstract(self):
+        """Test: ResultCacheBackend no se puede instanciar sin implementar sus métodos"""
+        from app.agents.result_cache import ResultCacheBackend
+        
+        with pytest.raises(TypeError):
+            ResultCacheBackend()
@@ -0,0 +1,313 @@
+"""
+Tests unitarios para la normalización de temas y la caché de routing
+"""
+import hashlib
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.routing import CentroidRouter, RoutingCache, normalize_topic
+
+
+def bag_of_words(texts):
+    """Embedding determinista de juguete (acepta un texto o una lista)"""
+    if isinstance(texts, list):
+        return np.stack([bag_of_words(text) for text in texts])
+    vector = np.zeros(1024, dtype=np.float32)
+    for word in texts.split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 1024] += 1
+    return vector
+
+
+class TestNormalizeTopic:
+    """Suite de tests para normalize_topic"""
+
+    def test_case_accents_and_punctuation(self):
+        """Test: Minúsculas, sin acentos y con puntuación/espacios colapsados"""
+        assert normalize_topic("¿Qué es la  Computación Cuántica?") == "que es la computacion cuantica"
+        assert normalize_topic("  IA -- generativa!!  ") == normalize_topic("ia generativa")
+
+    def test_optional_stemming(self):
+        """Test: Con stemming los plurales y derivaciones comunes coinciden"""
+        assert normalize_topic("Mercados emergentes", stem=True) == normalize_topic("mercado emergente", stem=True)
+        assert normalize_topic("Mercados", stem=False) != normalize_topic("mercado", stem=False)
+
+
+class TestRoutingCache:
+    """Suite de tests para RoutingCache"""
+
+    def test_variants_share_decision(self):
+        """Test: Variantes triviales del tema comparten la decisión cacheada"""
+        from app.agents.orchestrator import AgentType, RoutingDecision
+
+        cache = RoutingCache(ttl_seconds=60, max_entries=10)
+        cache.set("Computación cuántica", RoutingDecision(AgentType.SCIENCE, 0.9, "LLM"))
+
+        cached = cache.get("computacion  CUANTICA.")
+        assert cached.agent_type == AgentType.SCIENCE
+        assert cached.reason == "LLM (cached)"
+        assert cache.get("computación cuántica", context="mercados") is None
+        assert cache.get_stats()["hits"] == 1
+
+    def test_ttl_and_lru_eviction(self):
+        """Test: Las entradas caducan por TTL y se expulsa la menos usada"""
+        from app.agents.orchestrator import AgentType, RoutingDecision
+
+        decision = RoutingDecision(AgentType.CONTENT, 0.7, "LLM")
+        cache = RoutingCache(ttl_seconds=60, max_entries=2)
+        cache.set("a", decision)
+        cache.set("b", decision)
+        cache.get("a")
+        cache.set("c", decision)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+        with patch("app.agents.routing.time.monotonic", return_value=10 ** 9):
+            assert cache.get("a") is None
+
+
+class TestOrchestratorRoutingCache:
+    """Suite de tests de la caché de routing en AgentOrchestrator"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent') as mock_financial, \
+             patch('app.agents.orchestrator.ScienceAgent') as mock_science:
+            for name, mock_agent in (("content", mock_content), ("financial", mock_financial), ("science", mock_science)):
+                instance = MagicMock()
+                instance.description = f"{name} agent"
+                instance.generate = AsyncMock(return_value={"content": f"{name} result"})
+                mock_agent.return_value = instance
+
+            from app.agents.orchestrator import AgentOrchestrator
+            orchestrator = AgentOrchestrator(llm_provider="groq", enable_semantic_cache=False)
+            orchestrator.router_llm = MagicMock()
+            orchestrator.router_llm.generate = AsyncMock(
+                return_value='{"agent": "SCIENCE", "confidence": 0.9, "reason": "physics"}'
+            )
+            return orchestrator
+
+    @pytest.mark.asyncio
+    async def test_routing_reused_across_platforms(self, orchestrator):
+        """Test: Otra plataforma falla en la caché de resultados pero no vuelve a llamar al router"""
+        first = await orchestrator.process_request(
+            topic="Computación cuántica", platform="twitter", audience="general", generate_image=False
+        )
+        second = await orchestrator.process_request(
+            topic="computacion cuantica", platform="linkedin", audience="general", generate_image=False
+        )
+
+        assert first["agent_used"] == second["agent_used"] == "science"
+        assert orchestrator.router_llm.generate.await_count == 1
+        assert not second.get("from_cache")
+        assert orchestrator.get_metrics()["routing_cache"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_spelling_variants_hit_result_cache(self, orchestrator):
+        """Test: La clave de la caché de resultados usa el tema normalizado"""
+        await orchestrator.process_request(
+            topic="Computación cuántica", platform="twitter", audience="general", generate_image=False
+        )
+        result = await orchestrator.process_request(
+            topic="  computacion CUANTICA ", platform="twitter", audience="general", generate_image=False
+        )
+
+        assert result["from_cache"] is True
+
+    @pytest.mark.asyncio
+    async def test_chain_without_sequence_skips_routing(self, orchestrator):
+        """Test: chain_agents sin secuencia usa ciencia y contenido sin llamar al router"""
+        result = await orchestrator.chain_agents(
+            topic="tipos de interes", platform="blog", audience="general", agent_sequence=[]
+        )
+
+        assert result["agent_chain"] == ["science", "content"]
+        orchestrator.router_llm.generate.assert_not_awaited()
+
+
+class TestKeywordMatcher:
+    """Suite de tests para el router de keywords compilado"""
+
+    def test_word_boundaries(self):
+        """Test: Las keywords cortas no casan dentro de otras palabras"""
+        from app.agents.orchestrator import AgentOrchestrator, AgentType
+
+        matcher = AgentOrchestrator.KEYWORD_MATCHER
+        assert matcher.scores("He said the HTML layout is broken") == {}
+        assert matcher.scores("El futuro de la AI y el ML") == {AgentType.SCIENCE: 2.0}
+
+    def test_plurals_accents_and_phrases(self):
+        """Test: Plurales y acentos casan; las frases pesan más que una palabra"""
+        from app.agents.routing import KeywordMatcher
+
+        matcher = KeywordMatcher({"fin": ["mercado", "inversión"], "sci": ["machine learning", "ai"]})
+        assert matcher.scores("Mercados e INVERSION") == {"fin": 2.0}
+        assert matcher.scores("machine learning y ai") == {"sci": 2.5}
+
+    def test_overlapping_patterns(self):
+        """Test: Patrones solapados se encuentran en una sola pasada (enlaces de fallo)"""
+        from app.agents.routing import KeywordMatcher
+
+        matcher = KeywordMatcher({"a": ["deep learning"], "b": ["learning rate", "rate"]})
+        assert matcher.scores("deep learning rate") == {"a": 1.5, "b": 2.5}
+
+    def test_keyword_route_uses_matcher(self):
+        """Test: _keyword_route ya no confunde 'said' con 'ai'"""
+        from app.agents.orchestrator import AgentOrchestrator, AgentType
+
+        with patch('app.agents.orchestrator.ContentAgent'), \
+             patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'):
+            orchestrator = AgentOrchestrator(llm_provider="groq")
+
+        assert orchestrator._keyword_route("What the CEO said about HTML").agent_type == AgentType.CONTENT
+        assert orchestrator._keyword_route("Acciones del IBEX y dividendos").agent_type == AgentType.FINANCIAL
+
+    @pytest.mark.slow
+    def test_microbenchmark_vs_substring_loop(self):
+        """Test: Coste por tema independiente del nº de keywords (vs el bucle de subcadenas)"""
+        import random
+        import timeit
+        from app.agents.orchestrator import AgentOrchestrator
+        from app.agents.routing import KeywordMatcher
+
+        def substring_loop(keywords_by_label, topics):
+            for topic in topics:
+                topic_lower = topic.lower()
+                for keywords in keywords_by_label.values():
+                    sum(1 for kw in keywords if kw in topic_lower)
+
+        def per_topic_us(func, topics):
+            return min(timeit.repeat(func, number=3, repeat=3)) / (3 * len(topics)) * 1e6
+
+        rng = random.Random(0)
+        vocabulary = [
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+            for _ in range(1000)
+        ]
+        topics = [" ".join(rng.choice(vocabulary) for _ in range(12)) for _ in range(300)]
+        keywords = {label: vocabulary[label::3] for label in range(3)}
+        matcher = KeywordMatcher(keywords)
+
+        loop_us = per_topic_us(lambda: substring_loop(keywords, topics), topics)
+        matcher_us = per_topic_us(lambda: [matcher.scores(t) for t in topics], topics)
+        capabilities_us = per_topic_us(
+            lambda: [AgentOrchestrator.KEYWORD_MATCHER.scores(t) for t in topics], topics
+        )
+        print(
+            f"\n1000 keywords: substring loop {loop_us:.1f}us/topic, matcher {matcher_us:.1f}us/topic; "
+            f"AGENT_CAPABILITIES matcher {capabilities_us:.1f}us/topic"
+        )
+
+        assert matcher_us < loop_us
+        assert capabilities_us < 500
+
+
+class TestCentroidRouter:
+    """Suite de tests para el router por centroides de embeddings"""
+
+    SEEDS = {
+        "financial": ["bolsa", "acciones", "dividendos"],
+        "science": ["física", "biología", "genética"],
+    }
+
+    def test_confident_and_ambiguous_topics(self):
+        """Test: Un tema cercano a un centroide se enruta localmente; uno ambiguo no"""
+        router = CentroidRouter(bag_of_words, self.SEEDS, threshold=0.4, margin=0.1)
+
+        label, similarity, margin = router.classify(router.embed("Bolsa y dividendos"))
+        assert label == "financial"
+        assert similarity >= 0.4 and margin >= 0.1
+        assert router.classify(router.embed("bolsa genética")) is None
+        assert router.get_stats()["local_routes"] == 1
+        assert router.get_stats()["ambiguous"] == 1
+
+    def test_online_updates_move_centroid(self):
+        """Test: Las decisiones del router LLM acercan el centroide al tema"""
+        router = CentroidRouter(bag_of_words, self.SEEDS, threshold=0.4, margin=0.1)
+        vector = router.embed("exoplanetas")
+        assert router.classify(vector) is None
+
+        for _ in range(5):
+            router.update(vector, "science")
+
+        assert router.classify(vector)[0] == "science"
+        assert router.get_stats()["updates"] == 5
+
+    def test_update_before_centroids_does_not_embed_seeds(self):
+        """Test: Una actualización antes de construir los centroides no embebe las semillas"""
+        encode = MagicMock(side_effect=bag_of_words)
+        router = CentroidRouter(encode, self.SEEDS)
+
+        router.update(np.ones(1024, dtype=np.float32), "science")
+
+        encode.assert_not_called()
+        assert router.get_stats()["updates"] == 0
+
+
+class TestOrchestratorCentroidRouting:
+    """Suite de tests del router por centroides en AgentOrchestrator"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent') as mock_financial, \
+             patch('app.agents.orchestrator.ScienceAgent') as mock_science, \
+             patch('app.agents.orchestrator.get_embedding_model') as mock_model:
+            for name, mock_agent in (("content", mock_content), ("financial", mock_financial), ("science", mock_science)):
+                instance = MagicMock()
+                instance.description = f"{name} agent"
+                instance.generate = AsyncMock(return_value={"content": f"{name} result"})
+                mock_agent.return_value = instance
+            mock_model.return_value.encode = bag_of_words
+
+            from app.agents.orchestrator import AgentOrchestrator
+            orchestrator = AgentOrchestrator(llm_provider="groq", enable_semantic_cache=False)
+            # Umbral acorde al embedding de juguete
+            orchestrator.centroid_router.threshold = 0.25
+            orchestrator.router_llm = MagicMock()
+            orchestrator.router_llm.generate = AsyncMock(
+                return_value='{"agent": "SCIENCE", "confidence": 0.9, "reason": "astronomy"}'
+            )
+            with patch('app.agents.orchestrator.is_embedding_model_loaded', return_value=True):
+                yield orchestrator
+
+    @pytest.mark.asyncio
+    async def test_confident_topic_skips_llm_router(self, orchestrator):
+        """Test: Un tema inequívoco se enruta sin llamar al router LLM"""
+        routing = await orchestrator._route("bitcoin crypto trading", "twitter")
+
+        assert routing.agent_type.value == "financial"
+        assert routing.reason.startswith("Embedding centroid")
+        orchestrator.router_llm.generate.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_ambiguous_topic_uses_llm_and_updates_centroid(self, orchestrator):
+        """Test: Un tema ambiguo va al router LLM y su decisión actualiza el centroide"""
+        routing = await orchestrator._route("exoplanetas habitables", "twitter")
+
+        assert routing.agent_type.value == "science"
+        orchestrator.router_llm.generate.assert_awaited_once()
+        assert orchestrator.get_metrics()["centroid_router"]["updates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_route_with_context_does_not_update_centroid(self, orchestrator):
+        """Test: Una decisión del router LLM con contexto adicional no mueve los centroides"""
+        routing = await orchestrator._route("exoplanetas habitables", "twitter", None, "Enfoque en astrobiología")
+
+        assert routing.agent_type.value == "science"
+        assert orchestrator.get_metrics()["centroid_router"]["updates"] == 0
+
+    @pytest.mark.asyncio
+    async def test_process_request_without_semantic_cache(self, orchestrator):
+        """Test: Sin caché semántica, process_request usa el embedding sólo para enrutar"""
+        request = dict(
+            topic="bitcoin crypto trading", platform="twitter", audience="general", generate_image=False
+        )
+        result = await orchestrator.process_request(**request)
+        cached = await orchestrator.process_request(**request)
+
+        assert orchestrator.semantic_cache is None
+        assert result["agent_used"] == "financial"
+        assert result["routing_reason"].startswith("Embedding centroid")
+        assert cached["from_cache"] is True
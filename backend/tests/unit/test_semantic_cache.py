@@ -0,0 +1,128 @@
+"""
+Tests unitarios para la caché semántica de peticiones
+"""
+import time
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.semantic_cache import SemanticCache
+
+
+def bag_of_words(text: str) -> np.ndarray:
+    """Embedding determinista de juguete: conteo de palabras por hash"""
+    vector = np.zeros(64, dtype=np.float32)
+    for word in text.split():
+        vector[sum(map(ord, word)) % 64] += 1
+    return vector
+
+
+class TestSemanticCache:
+    """Suite de tests para SemanticCache"""
+    
+    def test_embed_uses_routing_normalization(self):
+        """Test: Mayúsculas, acentos, puntuación y espacios no cambian el embedding (como en las claves exactas)"""
+        texts = []
+        cache = SemanticCache(embed=lambda text: texts.append(text) or bag_of_words(text))
+        
+        first = cache.embed("  ¿Bitcoin   Precio\nPrevisión? ")
+        second = cache.embed("bitcoin precio prevision")
+        
+        assert texts == ["bitcoin precio prevision"] * 2
+        assert np.array_equal(first, second)
+    
+    def test_near_duplicate_topic_hits(self):
+        """Test: Un tema casi idéntico reutiliza el resultado previo"""
+        cache = SemanticCache(embed=bag_of_words, threshold=0.7)
+        vector = cache.embed("Bitcoin price outlook")
+        cache.set(vector, "Bitcoin price outlook", "twitter/general/Spanish", {"content": "post"})
+        
+        match = cache.get(cache.embed("bitcoin price outlook for this week"), "twitter/general/Spanish")
+        assert match is not None
+        assert match.result == {"content": "post"}
+        assert match.topic == "Bitcoin price outlook"
+        assert match.similarity >= 0.7
+    
+    def test_other_platform_or_unrelated_topic_misses(self):
+        """Test: Sólo compara dentro del mismo ámbito y sobre el umbral"""
+        cache = SemanticCache(embed=bag_of_words, threshold=0.7)
+        vector = cache.embed("Bitcoin price outlook")
+        cache.set(vector, "Bitcoin price outlook", "twitter/general/Spanish", {"content": "post"})
+        
+        assert cache.get(vector, "linkedin/general/Spanish") is None
+        assert cache.get(cache.embed("recetas de cocina mediterránea"), "twitter/general/Spanish") is None
+        
+        stats = cache.get_stats()
+        assert stats["lookups"] == 2
+        assert stats["hits"] == 0
+        assert sum(stats["similarity_histogram"].values()) == 1
+    
+    def test_ttl_and_max_entries(self):
+        """Test: Las entradas caducan y al llenarse se expulsa la más antigua"""
+        cache = SemanticCache(embed=bag_of_words, threshold=0.99, max_entries=2, ttl_seconds=60)
+        for topic in ["uno", "dos", "tres"]:
+            cache.set(cache.embed(topic), topic, "blog/general/Spanish", {"content": topic})
+        
+        assert cache.get_stats()["entries"] == 2
+        assert cache.evictions == 1
+        assert cache.get(cache.embed("uno"), "blog/general/Spanish") is None
+        
+        bucket = cache._buckets["blog/general/Spanish"]
+        bucket.timestamps[:] = [time.time() - 120] * len(bucket.timestamps)
+        assert cache.get(cache.embed("dos"), "blog/general/Spanish") is None
+        assert cache.get_stats()["entries"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_orchestrator_serves_near_duplicate_from_semantic_cache(self):
+        """Test: El orquestador no vuelve a generar para un tema casi idéntico"""
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'), \
+             patch('app.agents.orchestrator.is_embedding_model_loaded', return_value=True):
+            from app.agents.orchestrator import AgentOrchestrator
+            
+            mock_content.return_value.generate = AsyncMock(return_value={"content": "post"})
+            orchestrator = AgentOrchestrator(llm_provider="groq")
+            orchestrator.semantic_cache = SemanticCache(embed=bag_of_words, threshold=0.7)
+            
+            first = await orchestrator.process_request(
+                topic="Bitcoin price outlook", platform="twitter", audience="general",
+                content_type="content", generate_image=False
+            )
+            second = await orchestrator.process_request(
+                topic="bitcoin price outlook for this week", platform="twitter", audience="general",
+                content_type="content", generate_image=False
+            )
+            
+            assert mock_content.return_value.generate.await_count == 1
+            assert second["content"] == first["content"]
+            assert second["from_cache"] is True
+            assert second["semantic_match"]["topic"] == "Bitcoin price outlook"
+            assert orchestrator.get_metrics()["semantic_cache"]["hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_orchestrator_does_not_match_across_tone_or_context(self):
+        """Test: Un tema casi idéntico con otro tono o contexto adicional no reutiliza el resultado"""
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'), \
+             patch('app.agents.orchestrator.is_embedding_model_loaded', return_value=True):
+            from app.agents.orchestrator import AgentOrchestrator
+            
+            mock_content.return_value.generate = AsyncMock(return_value={"content": "post"})
+            orchestrator = AgentOrchestrator(llm_provider="groq")
+            orchestrator.semantic_cache = SemanticCache(embed=bag_of_words, threshold=0.7)
+            
+            common = dict(platform="twitter", audience="general", content_type="content", generate_image=False)
+            await orchestrator.process_request(topic="Bitcoin price outlook", tone="formal", **common)
+            other_tone = await orchestrator.process_request(
+                topic="bitcoin price outlook for this week", tone="humorous", **common
+            )
+            other_context = await orchestrator.process_request(
+                topic="bitcoin price outlook for this week", tone="formal",
+                additional_context="Focus on ETF flows", **common
+            )
+            
+            assert mock_content.return_value.generate.await_count == 3
+            assert "semantic_match" not in other_tone
+            assert "semantic_match" not in other_context
+            assert orchestrator.get_metrics()["semantic_cache"]["hits"] == 0
@@ -0,0 +1,67 @@
+"""
+Tests unitarios para SingleFlight
+"""
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Suite de tests para SingleFlight"""
+    
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_waiter_and_are_not_cached(self):
+        """Test: Un error llega a todos y la siguiente llamada vuelve a ejecutar"""
+        flight = SingleFlight()
+        calls = 0
+        
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+        
+        results = await asyncio.gather(
+            flight.do("k", failing), flight.do("k", failing), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+        assert calls == 1
+        
+        with pytest.raises(ValueError):
+            await flight.do("k", failing)
+        assert calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_follower_cancellation_keeps_leader_running(self):
+        """Test: Cancelar a uno de los que esperan no cancela el trabajo"""
+        flight = SingleFlight()
+        
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+        
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        
+        assert await leader == "done"
+        assert follower.cancelled()
+    
+    @pytest.mark.asyncio
+    async def test_work_cancelled_when_all_waiters_leave(self):
+        """Test: Si nadie espera ya el resultado, el trabajo se cancela"""
+        flight = SingleFlight()
+        started = asyncio.Event()
+        
+        async def work():
+            started.set()
+            await asyncio.sleep(10)
+        
+        waiter = asyncio.create_task(flight.do("k", work))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.sleep(0)
+        
+        assert flight.in_flight() == 0
@@ -0,0 +1,151 @@
+"""
+Tests unitarios para los tiempos por etapa de una petición
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.metrics import STAGE_LATENCY
+from app.core.timing import current_timings, stage, timed_stage, timing_scope, timings_tree
+
+
+class TestStageTimings:
+    """Suite de tests para timing_scope y stage"""
+
+    def test_nested_stages_recorded_by_path(self):
+        """Test: Las etapas anidadas se guardan con su ruta y tree() las anida"""
+        with timing_scope() as timings:
+            with stage("agent"):
+                with stage("prepare"):
+                    with stage("rerank"):
+                        pass
+
+        flat = timings.to_dict()
+        assert set(flat) == {"agent", "agent.prepare", "agent.prepare.rerank"}
+        tree = timings.tree()
+        assert "rerank" in tree["agent"]["stages"]["prepare"]["stages"]
+        assert tree["agent"]["duration_ms"] >= tree["agent"]["stages"]["prepare"]["duration_ms"]
+        assert current_timings() is None
+
+    def test_repeated_stage_accumulates_calls(self):
+        """Test: Una etapa repetida suma su duración y cuenta las llamadas"""
+        with timing_scope() as timings:
+            for _ in range(3):
+                with stage("embedding"):
+                    pass
+
+        assert timings.to_dict()["embedding"]["calls"] == 3
+
+    def test_inner_scope_reuses_outer(self):
+        """Test: Un timing_scope anidado (orquestador dentro de la ruta) reutiliza el exterior"""
+        with timing_scope() as outer:
+            with timing_scope() as inner:
+                with stage("routing"):
+                    pass
+
+        assert inner is outer
+        assert "routing" in outer.to_dict()
+
+    def test_stage_without_scope_feeds_histogram(self):
+        """Test: Fuera de un scope la etapa sigue alimentando el histograma"""
+        before = STAGE_LATENCY.labels("orphan_stage").count
+        with stage("orphan_stage"):
+            pass
+
+        assert STAGE_LATENCY.labels("orphan_stage").count == before + 1
+
+    @pytest.mark.asyncio
+    async def test_tasks_nest_under_current_stage(self):
+        """Test: Las tasks y threads lanzados dentro de una etapa se anidan bajo ella"""
+        def search():
+            with stage("vector_query"):
+                return "docs"
+
+        async def prepare():
+            return await asyncio.to_thread(search)
+
+        with timing_scope() as timings:
+            with stage("agent"):
+                await asyncio.create_task(timed_stage("prepare", prepare()))
+
+        assert "agent.prepare.vector_query" in timings.to_dict()
+
+    def test_timings_tree_keeps_parent_values(self):
+        """Test: timings_tree conserva los valores del padre junto a sus subetapas"""
+        tree = timings_tree({
+            "agent.llm_generation": {"start_ms": 2.0, "end_ms": 9.0, "duration_ms": 7.0},
+            "agent": {"start_ms": 1.0, "end_ms": 10.0, "duration_ms": 9.0},
+        })
+
+        assert tree["agent"]["duration_ms"] == 9.0
+        assert tree["agent"]["stages"]["llm_generation"]["duration_ms"] == 7.0
+
+
+class TestOrchestratorStageTimings:
+    """Suite de tests de los tiempos por etapa en el orquestador"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        with patch('app.agents.orchestrator.ContentAgent') as mock_content, \
+             patch('app.agents.orchestrator.FinancialAgent'), \
+             patch('app.agents.orchestrator.ScienceAgent'):
+            async def generate(**kwargs):
+                with stage("prepare"):
+                    await asyncio.sleep(0)
+                return {"content": "result"}
+
+            instance = MagicMock()
+            instance.description = "content agent"
+            instance.generate = AsyncMock(side_effect=generate)
+            mock_content.return_value = instance
+
+            from app.agents.orchestrator import AgentOrchestrator
+            return AgentOrchestrator(llm_provider="groq", enable_semantic_cache=False)
+
+    @pytest.mark.asyncio
+    async def test_result_includes_nested_stages(self, orchestrator):
+        """Test: El resultado incluye routing, agent y las subetapas del agente"""
+        result = await orchestrator.process_request(
+            topic="Tendencias", platform="twitter", audience="general",
+            content_type="content", generate_image=False, use_cache=False
+        )
+
+        timings = result["stage_timings_ms"]
+        assert {"routing", "agent", "agent.prepare"} <= set(timings)
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_reports_its_own_timings(self, orchestrator):
+        """Test: Un acierto de caché devuelve sus propios tiempos, no los de la generación original"""
+        request = dict(
+            topic="Tendencias", platform="twitter", audience="general",
+            content_type="content", generate_image=False
+        )
+        await orchestrator.process_request(**request)
+        cached = await orchestrator.process_request(**request)
+
+        assert cached["from_cache"] is True
+        assert "cache_lookup" in cached["stage_timings_ms"]
+        assert "agent" not in cached["stage_timings_ms"]
+
+
+class TestDebugResponse:
+    """Suite de tests de stage_timings_ms en la respuesta de la API"""
+
+    def _build(self, debug: bool):
+        from app.api.routes.content import _build_response
+        from app.models.schemas import ContentRequest
+
+        request = ContentRequest(topic="Tendencias", platform="twitter", llm_provider="groq", debug=debug)
+        result = {
+            "content": "texto",
+            "stage_timings_ms": {
+                "agent": {"start_ms": 0.0, "end_ms": 5.0, "duration_ms": 5.0},
+                "agent.prepare": {"start_ms": 0.0, "end_ms": 1.0, "duration_ms": 1.0},
+            }
+        }
+        return _build_response(request, result, MagicMock(score=1.0))
+
+    def test_timings_only_with_debug(self):
+        """Test: Sólo con debug=true la respuesta lleva los tiempos, anidados"""
+        assert self._build(debug=False).stage_timings_ms is None
+        timings = self._build(debug=True).stage_timings_ms
+        assert timings["agent"]["stages"]["prepare"]["duration_ms"] == 1.0
@@ -0,0 +1,75 @@
+"""
+Tests unitarios para el conteo y presupuesto de tokens
+"""
+import pytest
+from app.core.prompts import build_content_prompt, get_context_budget, get_max_tokens, PLATFORM_CONFIGS
+from app.core.tokens import TokenBudgeter, count_tokens, pack_texts, template_tokens, truncate_to_tokens
+
+
+class TestTokens:
+    """Suite de tests para app.core.tokens"""
+    
+    def test_count_tokens(self):
+        """Test: Texto vacío son 0 tokens y más texto son más tokens"""
+        assert count_tokens("") == 0
+        assert 0 < count_tokens("hola mundo") < count_tokens("hola mundo " * 20)
+    
+    def test_template_tokens_ignore_placeholders(self):
+        """Test: Los {placeholders} no cuentan, las llaves escapadas sí"""
+        assert template_tokens("Tema: {topic}") == count_tokens("Tema: ")
+        assert template_tokens('{{"agent": 1}} {topic}') == count_tokens('{{"agent": 1}} ')
+    
+    def test_truncate_to_tokens(self):
+        """Test: El texto recortado respeta el presupuesto y lo corto no se toca"""
+        text = "Una frase sobre transformers. " * 100
+        truncated = truncate_to_tokens(text, 50)
+        assert count_tokens(truncated) <= 51
+        assert truncate_to_tokens("corto", 50) == "corto"
+    
+    def test_pack_texts_keeps_order_and_budget(self):
+        """Test: Entran los primeros textos enteros y el siguiente recortado"""
+        texts = ["a " * 100, "b " * 100, "c " * 100]
+        budget = count_tokens(texts[0]) + 60
+        packed = pack_texts(texts, budget)
+        assert packed[0] == texts[0]
+        assert len(packed) == 2 and packed[1].startswith("b")
+        assert sum(count_tokens(t) for t in packed) <= budget + 1
+    
+    def test_budgeter_redistributes_unused_share(self):
+        """Test: Lo que una sección no usa pasa a las demás"""
+        allocation = TokenBudgeter(1000).allocate(
+            {"graph": 100, "vector": 5000}, {"graph": 1.0, "vector": 1.0}
+        )
+        assert allocation == {"graph": 100, "vector": 900}
+        
+        allocation = TokenBudgeter(900).allocate(
+            {"graph": 5000, "vector": 5000}, {"graph": 1.0, "vector": 2.0}
+        )
+        assert allocation == {"graph": 300, "vector": 600}
+    
+    def test_platform_caps(self):
+        """Test: Un tweet tiene menos presupuesto de salida y de contexto que un blog"""
+        assert get_max_tokens("twitter") < get_max_tokens("linkedin") < get_max_tokens("blog")
+        assert get_max_tokens("desconocida") == PLATFORM_CONFIGS["blog"]["max_tokens"]
+        assert get_context_budget("twitter", "{topic}") < get_context_budget("blog", "{topic}")
+    
+    def test_content_prompt_fits_platform_budget(self):
+        """Test: Un contexto adicional enorme se recorta al presupuesto del prompt"""
+        prompt = build_content_prompt(
+            topic="IA", platform="twitter", audience="general",
+            additional_context="contexto muy largo " * 2000
+        )
+        assert count_tokens(prompt) <= PLATFORM_CONFIGS["twitter"]["prompt_tokens"] + 5
+    
+    @pytest.mark.asyncio
+    async def test_agent_passes_platform_max_tokens(self, mock_llm_service):
+        """Test: El agente pide al LLM el tope de tokens de la plataforma"""
+        from unittest.mock import patch
+        from app.agents.content_agent import ContentAgent
+        
+        with patch('app.agents.content_agent.LLMService', return_value=mock_llm_service):
+            agent = ContentAgent(llm_provider="groq")
+        result = await agent.generate(topic="IA", platform="twitter", audience="general")
+        
+        assert mock_llm_service.generate.call_args.kwargs["max_tokens"] == get_max_tokens("twitter")
+        assert "max_tokens" not in result